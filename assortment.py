@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+import re
+
+import numpy as np
+
+from globals import RW_TEMP_FOLDER
+
+
+ASSORTMENT_INDEX_FILE = os.path.join(RW_TEMP_FOLDER, "assortment_index.pickle")
+INDEX_VERSION = 1
+DEFAULT_MIN_SCORE = 0.8
+
+
+def normalize_name(name) -> str:
+    return re.sub(r"\s+", " ", str(name).upper()).strip()
+
+
+def get_trigrams(name: str) -> set:
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class AssortmentIndex():
+    """
+    Assortment names with their warehouse indexes. Names not found exactly are matched
+    to the most similar name by trigrams (Dice coefficient of trigram sets, 0..1).
+    """
+
+    def __init__(self, assortment: dict, min_score: float = DEFAULT_MIN_SCORE) -> None:
+        self.assortment = assortment
+        self.min_score = min_score
+        self.names = [name for name in assortment if isinstance(name, str) and name.strip()]
+        postings = {}
+        lengths = []
+        for name_id, name in enumerate(self.names):
+            trigrams = get_trigrams(normalize_name(name))
+            lengths.append(len(trigrams))
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(name_id)
+        self.postings = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+        self.lengths = np.array(lengths, dtype=np.float64)
+        self.matches = {}
+
+
+    def __getstate__(self) -> dict:
+        state = self.__dict__.copy()
+        state["matches"] = {}
+        return state
+
+
+    def match(self, name) -> tuple:
+        """
+        Most similar assortment name and its score, or (None, 0.0). Results are memoized.
+        """
+        if name in self.matches:
+            return self.matches[name]
+        trigrams = get_trigrams(normalize_name(name))
+        ids = [self.postings[trigram] for trigram in trigrams if trigram in self.postings]
+        result = (None, 0.0)
+        if ids:
+            common = np.bincount(np.concatenate(ids), minlength=len(self.names))
+            scores = 2 * common / (len(trigrams) + self.lengths)
+            best = int(np.argmax(scores))
+            result = (self.names[best], float(scores[best]))
+        self.matches[name] = result
+        return result
+
+
+    def get(self, name, default=0):
+        """
+        Index of the name, like dict.get; names with a best match below min_score get default.
+        """
+        if name in self.assortment:
+            return self.assortment[name]
+        matched_name, score = self.match(name)
+        if matched_name is None or score < self.min_score:
+            return default
+        return self.assortment[matched_name]
+
+
+def hash_file(filename: str) -> str:
+    with open(filename, "rb") as stream:
+        return hashlib.sha256(stream.read()).hexdigest()
+
+
+def get_assortment_index(xls_file: str, read_assortment, cache_file: str = ASSORTMENT_INDEX_FILE,
+                         min_score: float = DEFAULT_MIN_SCORE) -> tuple:
+    """
+    Index of the assortment workbook, loaded from cache_file when the workbook hash is unchanged.
+    read_assortment(xls_file) gives the name -> index dict when the index has to be built.
+    Returns the index and True when it was loaded from the cache.
+    """
+    workbook_hash = hash_file(xls_file)
+    try:
+        with open(cache_file, "rb") as stream:
+            cached = pickle.load(stream)
+        if cached["version"] == INDEX_VERSION and cached["hash"] == workbook_hash:
+            cached["index"].min_score = min_score
+            return cached["index"], True
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, AttributeError):
+        pass
+    index = AssortmentIndex(read_assortment(xls_file), min_score)
+    os.makedirs(os.path.dirname(cache_file) or ".", exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, "wb") as stream:
+        pickle.dump({"version": INDEX_VERSION, "hash": workbook_hash, "index": index}, stream)
+    os.replace(tmp_file, cache_file)
+    return index, False
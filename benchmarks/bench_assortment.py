@@ -0,0 +1,41 @@
+import random
+import time
+
+import click
+
+import assortment
+
+
+WORDS = ["PŁYTA", "KOSTKA", "KRAWĘŻNIK", "LATARNIA", "SŁUPEK", "RURA", "KRATKA", "OBRZEŻE", "STUDNIA", "POKRYWA"]
+
+
+def make_names(count: int, rng: random.Random) -> dict:
+    return {f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 999)}X{rng.randint(1, 99)}": float(i) for i in range(count)}
+
+
+@click.command()
+@click.option("--names", type=click.IntRange(min=1), show_default=True, default=30_000, help="Liczba pozycji asortymentu.")
+@click.option("--queries", type=click.IntRange(min=1), show_default=True, default=200, help="Liczba wyszukiwanych nazw.")
+@click.option("--seed", type=int, show_default=True, default=0, help="Ziarno generatora nazw.")
+def main(names: int, queries: int, seed: int):
+    """
+    Mierzy czas budowy indeksu asortymentu i wyszukiwania podobnych nazw (AssortmentIndex.match).\n
+    Przykład:\n
+    >python -m benchmarks.bench_assortment\n
+    >python -m benchmarks.bench_assortment --names 100000 --queries 1000
+    """
+    rng = random.Random(seed)
+    assortment_names = make_names(names, rng)
+    start = time.perf_counter()
+    index = assortment.AssortmentIndex(assortment_names)
+    build = time.perf_counter() - start
+    lookups = [name.lower().replace("X", " X") for name in rng.sample(list(assortment_names), min(queries, names))]
+    start = time.perf_counter()
+    results = [index.match(query) for query in lookups]
+    per_query = (time.perf_counter() - start) / len(lookups)
+    print(f"Pozycji: {names}, budowa indeksu: {build:.2f} s, wyszukiwanie: {per_query * 1000:.2f} ms/nazwę, "
+          f"dopasowań z wynikiem > 0.7: {sum(score > 0.7 for _, score in results)}/{len(results)}")
+
+
+if __name__ == "__main__":
+    main()
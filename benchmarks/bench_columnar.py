@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+
+import click
+
+import columnar
+import docstore
+from rwchecker import CompareSet, RWComparator, sort_references
+import synthdata
+
+
+def compare_objects(store: docstore.SQLiteStore) -> list:
+    comparator = RWComparator([], [])
+    comparator.load_from_store(store)
+    comparator.get_dependencies()
+    return [list(CompareSet(wz_list, rw_list, comparator.wz_data, comparator.rw_data).rows())
+            for wz_list, rw_list in sort_references(comparator.references, comparator.wz_data)]
+
+
+def compare_columnar(store: docstore.SQLiteStore) -> list:
+    return [list(result.rows()) for result in columnar.compare_groups(store.connection)[1]]
+
+
+def best_of(repeat: int, function, *args) -> tuple:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times), output
+
+
+@click.command()
+@click.option("--size", type=click.IntRange(min=1), show_default=True, default=20_000, help="Liczba dokumentów RW.")
+@click.option("--repeat", type=click.IntRange(min=1), show_default=True, default=3, help="Liczba powtórzeń (liczy się najlepszy czas).")
+@click.option("--seed", type=int, show_default=True, default=0, help="Ziarno generatora danych.")
+def main(size: int, repeat: int, seed: int):
+    """
+    Mierzy czas porównania wszystkich grup dokumentów bazy SQLite: wczytanie, grupowanie i CompareSet
+    (--engine objects) wobec compare_groups z modułu columnar (--engine columnar).\n
+    Przykład:\n
+    >python -m benchmarks.bench_columnar\n
+    >python -m benchmarks.bench_columnar --size 100000 --repeat 1
+    """
+    dataset = synthdata.Dataset(size, seed)
+    with tempfile.TemporaryDirectory() as folder:
+        store = docstore.SQLiteStore(os.path.join(folder, "bench.sqlite"))
+        for wz in dataset.wz_documents:
+            store.put_wz(wz)
+        for rw in dataset.rw_documents:
+            store.put_rw(rw)
+        store.commit()
+        objects_time, expected = best_of(repeat, compare_objects, store)
+        columnar_time, compared = best_of(repeat, compare_columnar, store)
+        store.close()
+    print(f"RW: {size}, WZ: {len(dataset.wz_documents)}, grup: {len(expected)}")
+    print(f"  objects   {objects_time:>7.3f} s")
+    print(f"  columnar  {columnar_time:>7.3f} s  ({objects_time / columnar_time:.2f}x)")
+    print(f"  wyniki {'zgodne' if compared == expected else 'RÓŻNE'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+
+import click
+import cv2
+
+import rwimage2txt
+import synthdata
+
+
+def count_ink(page, detected_lines, backend: str = rwimage2txt.DEFAULT_BACKEND, roi: str = "off") -> str:
+    """
+    Stands in for tesseract: reads every pixel of the page once.
+    """
+    return f"{cv2.countNonZero(page)}\n"
+
+
+def get_pss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup", "r") as stream:
+            for line in stream:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def sample_memory(peak: list, stop: threading.Event) -> None:
+    """
+    Peak of the summed proportional set size (shared pages split between processes) of this process and its workers.
+    """
+    while not stop.wait(0.02):
+        pids = [os.getpid()] + [child.pid for child in multiprocessing.active_children()]
+        peak[0] = max(peak[0], sum(get_pss_kb(pid) for pid in pids))
+
+
+def run_mode(handoff: str, filenames: list, workers: int, preprocess_workers: int, slots: int, ocr: bool, connection) -> None:
+    if not ocr:
+        rwimage2txt.page_to_text = count_ink
+    peak, stop = [0], threading.Event()
+    sampler = threading.Thread(target=sample_memory, args=(peak, stop), daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = [result for _, result in rwimage2txt.recognize_staged(
+            filenames, pool, preprocess_workers, slots if handoff == "shm" else 0, target_dpi=0, in_flight=slots)]
+    elapsed = time.perf_counter() - start
+    stop.set()
+    sampler.join()
+    connection.send({
+        "handoff": handoff,
+        "pages": len(results),
+        "errors": sum(status == "error" for status, _ in results),
+        "seconds": elapsed,
+        "pages_per_s": len(results) / elapsed,
+        "peak_pss_mb": peak[0] / 1024,
+        "main_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "worker_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    })
+
+
+@click.command()
+@click.option("--pages", type=click.IntRange(min=1), show_default=True, default=24, help="Liczba stron.")
+@click.option("--dpi", type=click.IntRange(min=75), show_default=True, default=600, help="Rozdzielczość syntetycznych skanów.")
+@click.option("--workers", "-w", type=click.IntRange(min=1), show_default=True, default=2, help="Liczba procesów OCR.")
+@click.option("--preprocess-workers", type=click.IntRange(min=1), show_default=True, default=2, help="Liczba procesów przygotowujących strony.")
+@click.option("--slots", type=click.IntRange(min=1), show_default=True, default=4, help="Liczba stron w drodze (miejsc w pamięci współdzielonej).")
+@click.option("--ocr", is_flag=True, default=False, help="Rozpoznaje strony tesseractem zamiast samego odczytu pikseli.")
+def main(pages: int, dpi: int, workers: int, preprocess_workers: int, slots: int, ocr: bool):
+    """
+    Porównuje przekazywanie stron pomiędzy procesami przygotowującymi strony a procesami OCR
+    w pamięci współdzielonej (shmpool) i przez kopiowanie (pickle): przepustowość oraz szczytowe zużycie pamięci.
+    Każdy wariant uruchamiany jest w osobnym procesie. Bez --ocr tesseract zastąpiony jest odczytem wszystkich pikseli strony,
+    więc mierzony jest głównie koszt przekazania stron.\n
+    Przykład:\n
+    >python -m benchmarks.bench_handoff\n
+    >python -m benchmarks.bench_handoff --pages 100 --dpi 300 --workers 4 --slots 8 --ocr
+    """
+    rng = random.Random(0)
+    dataset = synthdata.Dataset(pages, seed=0)
+    with tempfile.TemporaryDirectory() as folder:
+        filenames = []
+        for i, text in zip(range(pages), dataset.rw_texts()):
+            filenames.append(os.path.join(folder, f"Scan_{i:06}.jpg"))
+            with open(filenames[-1], "wb") as stream:
+                stream.write(synthdata.make_scan(text, dpi=dpi, rng=rng))
+        print(f"{pages} stron {dpi} dpi, {preprocess_workers} + {workers} procesów, {slots} stron w drodze")
+        print(f"  {'PRZEKAZANIE':12} {'STRON/S':>8} {'CZAS [s]':>9} {'PSS [MB]':>9} {'RSS GŁÓWNY':>11} {'RSS PROCESU':>12}")
+        context = multiprocessing.get_context("fork")
+        for handoff in ("copy", "shm"):
+            receiver, sender = context.Pipe(duplex=False)
+            process = context.Process(target=run_mode, args=(handoff, filenames, workers, preprocess_workers, slots, ocr, sender))
+            process.start()
+            result = receiver.recv()
+            process.join()
+            print(f"  {handoff:12} {result['pages_per_s']:>8.2f} {result['seconds']:>9.2f} {result['peak_pss_mb']:>9.0f} "
+                  f"{result['main_rss_mb']:>11.0f} {result['worker_rss_mb']:>12.0f}" + (f"  błędy: {result['errors']}" if result["errors"] else ""))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import time
+
+import click
+
+from docstore import get_files
+from ocrbackend import BACKENDS, get_backend
+from preprocess import decode_grey, prepare_page
+from rwimage2txt import read_raw_bytes
+
+
+def benchmark_backend(name: str, images: list, repeat: int) -> dict:
+    start = time.perf_counter()
+    backend = get_backend(name)
+    backend.recognize(images[0])
+    first = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for image in images:
+            backend.recognize(image)
+    pages = repeat * len(images)
+    steady = (time.perf_counter() - start) / pages
+    return {"backend": name, "first_ms": first * 1000, "page_ms": steady * 1000, "pages_per_s": 1 / steady if steady > 0 else 0}
+
+
+@click.command()
+@click.option("--backend", "-b", "backends", multiple=True, type=click.Choice(list(BACKENDS)), help="Silniki do porównania (domyślnie wszystkie zainstalowane).")
+@click.option("--repeat", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba powtórzeń zestawu obrazów.")
+@click.argument("filenames", nargs=-1, required=True)
+def main(backends: tuple, repeat: int, filenames: tuple):
+    """
+    Porównuje czas rozpoznawania tych samych, wstępnie przetworzonych obrazów przez różne silniki OCR.\n
+    Przykład:\n
+    >python -m benchmarks.bench_ocr_backends RW_jpeg/Scan_000*.jpg
+    """
+    input_files = []
+    for filename in filenames:
+        input_files.extend(get_files(filename))
+    images = [prepare_page(decode_grey(read_raw_bytes(fn)))[0] for fn in input_files]
+    if not backends:
+        backends = [name for name, backend in BACKENDS.items() if backend.is_available()]
+    print("SILNIK        1. OBRAZ [ms]  OBRAZ [ms]  OBRAZ/s")
+    for name in backends:
+        result = benchmark_backend(name, images, repeat)
+        print("{backend:12}  {first_ms:>13.1f}  {page_ms:>10.1f}  {pages_per_s:>7.2f}".format(**result))
+
+
+if __name__ == "__main__":
+    main()
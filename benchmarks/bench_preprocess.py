@@ -0,0 +1,119 @@
+import time
+
+import click
+import cv2
+import numpy as np
+
+from docstore import get_files
+import preprocess
+import rwimage2txt
+from synthdata import A4_INCHES, set_jpeg_dpi
+
+
+def make_synthetic_scan(dpi: int) -> bytes:
+    width, height = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    scale = dpi / 300
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(page, "RW/U00054/22  DWS 060/22  WZ 244/04/22/6", (int(100 * scale), int(200 * scale)),
+                cv2.FONT_HERSHEY_SIMPLEX, 1.5 * scale, (0, 0, 0), int(3 * scale))
+    for row in range(40):
+        y = int((600 + row * 60) * scale)
+        cv2.line(page, (int(80 * scale), y), (width - int(80 * scale), y), (0, 0, 0), max(int(2 * scale), 1))
+        cv2.putText(page, f"{2100 + row} J00171ANOD PLYTA PW-95 {row % 7 + 1} SZT 24.60 49.20", (int(100 * scale), y + int(45 * scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.0 * scale, (0, 0, 0), int(2 * scale))
+    raw = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+    return set_jpeg_dpi(raw, dpi)
+
+
+def detect_horizontal_lines(thresh):
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, preprocess.HORIZONTAL_KERNEL_SIZE)
+    return cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=preprocess.HORIZONTAL_ITERATIONS)
+
+
+def remove_horizontal(image, thresh):
+    """
+    Rulings removal of rwimage2txt before preprocess.prepare_page, the reference for run_legacy and tests/test_preprocess.py.
+    """
+    img = image.copy()
+    cnts = cv2.findContours(detect_horizontal_lines(thresh), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+    for c in cnts:
+        cv2.drawContours(img, [c], -1, (0, 0, 0), preprocess.HORIZONTAL_LINE_THICKNESS)
+    return img
+
+
+def thresholding_inv(image):
+    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+
+
+def get_greyscale(image):
+    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+
+def timed(results: dict, step: str, function, *args):
+    start = time.perf_counter()
+    output = function(*args)
+    results[step] = results.get(step, 0) + time.perf_counter() - start
+    return output
+
+
+def decode_colour(raw: bytes):
+    return cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+
+def run_legacy(raw: bytes, results: dict) -> None:
+    image = timed(results, "decode (colour)", decode_colour, raw)
+    grey = timed(results, "greyscale", get_greyscale, image)
+    thresh = timed(results, "otsu", thresholding_inv, grey)
+    img = timed(results, "remove_horizontal", remove_horizontal, thresh, thresh)
+    timed(results, "otsu (2nd)", thresholding_inv, img)
+
+
+def run_engine(raw: bytes, results: dict, target_dpi: int) -> None:
+    grey = timed(results, "decode_grey", preprocess.decode_grey, raw, target_dpi)
+    thresh = timed(results, "binarize_inv", preprocess.binarize_inv, grey)
+    detected_lines = timed(results, "detect_rulings", preprocess.detect_rulings, thresh)
+    timed(results, "erase_rulings", preprocess.erase_rulings, thresh, detected_lines)
+    timed(results, "invert", cv2.bitwise_not, thresh, thresh)
+
+
+def print_results(title: str, results: dict, pages: int) -> None:
+    print(f"\n{title}")
+    for step, seconds in results.items():
+        print(f"  {step:20} {seconds * 1000 / pages:>9.1f} ms/strona")
+    print(f"  {'RAZEM':20} {sum(results.values()) * 1000 / pages:>9.1f} ms/strona")
+
+
+@click.command()
+@click.option("--dpi", "dpis", multiple=True, type=int, default=[300, 600], show_default=True, help="Rozdzielczość syntetycznych skanów.")
+@click.option("--target-dpi", type=int, default=preprocess.TARGET_DPI, show_default=True, help="Rozdzielczość docelowa przetwarzania.")
+@click.option("--repeat", type=click.IntRange(min=1), default=5, show_default=True, help="Liczba powtórzeń.")
+@click.argument("filenames", nargs=-1, required=False)
+def main(dpis: tuple, target_dpi: int, repeat: int, filenames: tuple):
+    """
+    Mierzy czas kolejnych kroków wstępnego przetwarzania obrazu (ms/strona): dotychczasowego
+    łańcucha z rwimage2txt (zachowanego w tym pliku) oraz silnika z modułu preprocess.\n
+    Bez argumentów używa syntetycznych stron A4 w rozdzielczościach podanych w --dpi.\n
+    Przykład:\n
+    >python -m benchmarks.bench_preprocess --dpi 300 --dpi 600\n
+    >python -m benchmarks.bench_preprocess RW_jpeg/Scan_000*.jpg
+    """
+    if filenames:
+        sets = {"pliki": []}
+        for filename in filenames:
+            sets["pliki"].extend(rwimage2txt.read_raw_bytes(fn) for fn in get_files(filename))
+    else:
+        sets = {f"{dpi} DPI": [make_synthetic_scan(dpi)] for dpi in dpis}
+    for name, scans in sets.items():
+        legacy, engine = {}, {}
+        for _ in range(repeat):
+            for raw in scans:
+                run_legacy(raw, legacy)
+                run_engine(raw, engine, target_dpi)
+        pages = repeat * len(scans)
+        print_results(f"{name}: dotychczasowy łańcuch", legacy, pages)
+        print_results(f"{name}: preprocess (docelowo {target_dpi} DPI)", engine, pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import datetime
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import click
+
+from decodetxt2rw import compose_rw
+import decodexls2wz
+from rwchecker import CompareSet, RWComparator, sort_references
+import rwimage2txt
+import synthdata
+
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+
+
+def measure(results: list, stage: str, size: int, items: int, function, *args):
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    output = function(*args)
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    results.append({"stage": stage, "size": size, "items": items, "wall_s": wall, "cpu_s": cpu,
+                    "us_per_item": wall * 1e6 / max(items, 1)})
+    print(f"  {stage:28} {items:>8}  {wall:>9.3f} s  {wall * 1e6 / max(items, 1):>10.1f} us/szt.")
+    return output
+
+
+def bench_process_image(results: list, dataset: synthdata.Dataset, scans: int) -> None:
+    """
+    OCR of the first scans, in a temporary folder because process_image writes to RW_txt/.
+    """
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as folder:
+        os.chdir(folder)
+        try:
+            filenames = []
+            for i, text in zip(range(scans), dataset.rw_texts()):
+                filenames.append(f"Scan_{i:06}.jpg")
+                with open(filenames[-1], "wb") as stream:
+                    stream.write(synthdata.make_scan(text, rng=dataset.rng))
+            os.makedirs("RW_txt", exist_ok=True)
+
+            def run():
+                return [rwimage2txt.process_image(filename) for filename in filenames]
+
+            measure(results, "process_image", len(dataset.rw_documents), len(filenames), run)
+        except Exception as e:
+            print(f"  {'process_image':28} pominięto: {e}")
+        finally:
+            os.chdir(cwd)
+
+
+def bench_size(results: list, size: int, scans: int, seed: int) -> None:
+    print(f"\n{size} dokumentów RW")
+    dataset = synthdata.Dataset(size, seed)
+    if scans > 0:
+        bench_process_image(results, dataset, scans)
+    texts = list(dataset.rw_texts())
+    measure(results, "compose_rw", size, len(texts), lambda: [compose_rw(text) for text in texts])
+
+    book = synthdata.make_dws_book(dataset.wz_documents)
+    assortment = decodexls2wz.get_assortment(synthdata.make_assortment_book(dataset.assortment))
+    sheets = [book.sheet_by_name(name) for name in decodexls2wz.get_dws_sheet_list(book)]
+    wz_count = len(dataset.wz_documents)
+    measure(results, "get_wz_content", size, wz_count, lambda: [decodexls2wz.get_wz_content(assortment, sheet, start_row=sr)
+                                                                 for sheet in sheets for sr in decodexls2wz.get_wz_start(sheet)])
+    measure(results, "scan_dws_sheet", size, wz_count, lambda: [decodexls2wz.scan_dws_sheet(assortment, sheet) for sheet in sheets])
+
+    comparator = RWComparator([], [])
+    comparator.wz_data, comparator.rw_data = dataset.wz_data(), dataset.rw_data()
+    measure(results, "get_dependencies", size, size + wz_count, comparator.get_dependencies)
+    references = sort_references(comparator.references, comparator.wz_data)
+    measure(results, "CompareSet.compare", size, len(references),
+            lambda: [CompareSet(wz_list, rw_list, comparator.wz_data, comparator.rw_data).compare() for wz_list, rw_list in references])
+
+
+def compare_results(results: list, previous_file: str) -> None:
+    with open(previous_file, "r", encoding="utf-8") as stream:
+        previous = {(item["stage"], item["size"]): item for item in json.load(stream)["results"]}
+    print(f"\nPorównanie z {previous_file} (czas obecny / poprzedni):")
+    for item in results:
+        before = previous.get((item["stage"], item["size"]))
+        if before and before["wall_s"] > 0:
+            print(f"  {item['stage']:28} {item['size']:>8}  {item['wall_s'] / before['wall_s']:>6.2f}x")
+
+
+@click.command()
+@click.option("--size", "sizes", multiple=True, type=click.IntRange(min=1), default=DEFAULT_SIZES, show_default=True, help="Liczba dokumentów RW.")
+@click.option("--scans", type=click.IntRange(min=0), default=3, show_default=True, help="Liczba skanów rozpoznawanych przez process_image (0 - bez OCR).")
+@click.option("--seed", type=int, default=0, show_default=True, help="Ziarno generatora danych.")
+@click.option("--output", "-o", default=None, help="Plik json z wynikami (domyślnie bench_stages_<data>.json).")
+@click.option("--compare", "previous_file", default=None, help="Plik json z wynikami poprzedniego pomiaru do porównania.")
+def main(sizes: tuple, scans: int, seed: int, output: str, previous_file: str):
+    """
+    Mierzy czas etapów przetwarzania na syntetycznych danych z modułu synthdata:
+    process_image, compose_rw, get_wz_content (i scan_dws_sheet), RWComparator.get_dependencies
+    oraz CompareSet.compare, dla podanych liczb dokumentów.\n
+    Przykład:\n
+    >python -m benchmarks.bench_stages\n
+    >python -m benchmarks.bench_stages --size 1000 --scans 0 --compare bench_stages_poprzedni.json
+    """
+    created = datetime.datetime.now()
+    results = []
+    for size in sizes:
+        bench_size(results, size, scans, seed)
+    output = output or f"bench_stages_{created:%Y%m%d_%H%M%S}.json"
+    with open(output, "w", encoding="utf-8") as stream:
+        json.dump({
+            "created": created.isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": seed,
+            "results": results,
+        }, stream, indent=2)
+    print(f"\nWyniki zapisano w {output}.")
+    if previous_file:
+        compare_results(results, previous_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import importlib
+
+import click
+
+
+# name: (module, help); a module is imported only when its subcommand is run
+COMMANDS = {
+    "ocr": ("rwimage2txt", "Rozpoznaje tekst skanów RW (rwimage2txt.py)."),
+    "decode": ("decodetxt2rw", "Odczytuje dokumenty RW z tekstu skanów (decodetxt2rw.py)."),
+    "extract-wz": ("decodexls2wz", "Odczytuje dokumenty WZ ze skoroszytu DWSygn (decodexls2wz.py)."),
+    "check": ("rwchecker", "Porównuje dokumenty RW z dokumentami WZ (rwchecker.py)."),
+    "queue": ("workqueue", "Pokazuje stan wspólnej kolejki zadań rozproszonych procesów (workqueue.py)."),
+    "pipeline": ("pipeline", "Rozpoznaje, odczytuje i porównuje skany RW w jednym przebiegu (pipeline.py)."),
+    "synth": ("synthdata", "Generuje syntetyczne dane testowe (synthdata.py)."),
+}
+
+
+class LazyGroup(click.Group):
+    """
+    Group of subcommands defined as main commands of the scripts, imported on first use,
+    so heavy dependencies (cv2, pandas, xlrd...) are loaded only by subcommands which need them.
+    """
+
+    def list_commands(self, ctx: click.Context) -> list:
+        return list(COMMANDS)
+
+
+    def get_command(self, ctx: click.Context, name: str) -> click.Command:
+        if name not in COMMANDS:
+            return None
+        module_name, _ = COMMANDS[name]
+        return importlib.import_module(module_name).main
+
+
+    def format_commands(self, ctx: click.Context, formatter: click.HelpFormatter) -> None:
+        with formatter.section("Polecenia"):
+            formatter.write_dl([(name, help_text) for name, (_, help_text) in COMMANDS.items()])
+
+
+@click.group(cls=LazyGroup)
+def main():
+    """
+    Weryfikacja zgodności dokumentów RW i WZ. Każde polecenie odpowiada jednemu skryptowi
+    i przyjmuje te same opcje (pomoc: cli.py POLECENIE --help).\n
+    Przykład:\n
+    >python cli.py ocr RW_jpeg/Scan_*.jpg\n
+    >python cli.py decode\n
+    >python cli.py extract-wz "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"\n
+    >python cli.py check --format csv --output result.csv
+    """
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+import numpy as np
+
+from reportwriter import GroupResult
+from rwchecker import DisjointSet
+
+
+MISSING_WZ_LABEL = "Nie znaleziono WZ: "
+
+
+class ColumnarGroups():
+    """
+    Groups of linked documents of a SQLite store, found from document numbers and links alone.
+    The order of groups and of documents within them is the one of RWComparator.get_dependencies
+    followed by sort_references: WZ in table order and then unknown WZ in the order of links,
+    groups by their first WZ, stably sorted by DWS numbers.
+    """
+
+    def __init__(self, connection) -> None:
+        wz_rows = connection.execute("SELECT number, dws FROM wz ORDER BY rowid").fetchall()
+        rw_numbers = [number for number, in connection.execute("SELECT number FROM rw ORDER BY rowid")]
+        links = connection.execute("SELECT l.rw, l.wz FROM rw_wz l JOIN rw ON rw.number = l.rw ORDER BY rw.rowid, l.rowid").fetchall()
+        self.wz_ids = {number: i for i, (number, _) in enumerate(wz_rows)}
+        self.known = len(self.wz_ids)
+        for _, wz in links:
+            self.wz_ids.setdefault(wz, len(self.wz_ids))
+        self.rw_ids = {number: len(self.wz_ids) + j for j, number in enumerate(rw_numbers)}
+        sets = DisjointSet(len(self.wz_ids) + len(self.rw_ids))
+        for rw, wz in links:
+            sets.union(self.rw_ids[rw], self.wz_ids[wz])
+        roots = {}
+        node_group = [roots.setdefault(sets.find(i), len(roots)) for i in range(len(self.wz_ids))]
+        node_group += [roots.get(sets.find(i), -1) for i in range(len(self.wz_ids), len(self.wz_ids) + len(self.rw_ids))]
+        wz_lists, rw_lists = [[] for _ in roots], [[] for _ in roots]
+        for number, i in self.wz_ids.items():
+            wz_lists[node_group[i]].append(number)
+        for number, i in self.rw_ids.items():
+            if node_group[i] >= 0:
+                rw_lists[node_group[i]].append(number)
+        dws = [d for _, d in wz_rows]
+        keys = [sorted(dws[self.wz_ids[wz]] for wz in wz_list if self.wz_ids[wz] < self.known) for wz_list in wz_lists]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        position = np.empty(len(order) + 1, dtype=np.int64)
+        position[order] = np.arange(len(order))
+        position[-1] = -1
+        # Position of the group of each document in the report, -1 for RW without WZ and,
+        # in the last entry, for items of documents missing from the store.
+        self.node_position = position[node_group + [-1]]
+        self.references = [(wz_lists[group], rw_lists[group]) for group in order]
+        self.keys = [keys[group] for group in order]
+
+
+    def load_items(self, connection) -> tuple:
+        """
+        WZ and RW item rows of all groups stacked into columns: group, index, quantity, whether the row
+        is a WZ item and the name order (rank of the WZ number, then position of the item), plus the names.
+        Rows of RW without WZ are left out.
+        """
+        # A full scan keeps the order of items within a document, which decides the name of repeated indexes.
+        wz_rows = connection.execute("SELECT number, idx, quantity, name FROM item NOT INDEXED WHERE kind = 'WZ'").fetchall()
+        rw_rows = connection.execute("SELECT number, idx, quantity FROM item NOT INDEXED WHERE kind = 'RW'").fetchall()
+        rank = {number: r for r, number in enumerate(sorted(self.wz_ids))}
+        nodes = [self.wz_ids[row[0]] for row in wz_rows] + [self.rw_ids.get(row[0], -1) for row in rw_rows]
+        columns = {
+            "group": self.node_position[np.array(nodes, dtype=np.int64)],
+            "index": np.array([row[1] for row in wz_rows] + [row[1] for row in rw_rows], dtype=np.int64),
+            "quantity": np.array([row[2] for row in wz_rows] + [row[2] for row in rw_rows], dtype=np.int64),
+            "is_wz": np.arange(len(nodes)) < len(wz_rows),
+            "rank": np.array([rank[row[0]] for row in wz_rows] + [-1] * len(rw_rows), dtype=np.int64),
+        }
+        keep = columns["group"] >= 0
+        return {name: column[keep] for name, column in columns.items()}, [row[3] for row in wz_rows]
+
+
+    def results(self, totals: dict, names: list) -> list:
+        rows = list(zip(totals["status"].tolist(), totals["index"].tolist(), totals["wz_quantity"].tolist(), totals["rw_quantity"].tolist(),
+                        [names[row] if on_wz else "" for row, on_wz in zip(totals["name_row"].tolist(), totals["on_wz"].tolist())]))
+        bounds = np.searchsorted(totals["group"], np.arange(len(self.references) + 1)).tolist()
+        results = []
+        for position, ((wz_list, rw_list), key) in enumerate(zip(self.references, self.keys)):
+            wz_list = sorted(wz_list)
+            wz_numbers = [wz for wz in wz_list if self.wz_ids[wz] < self.known] + [MISSING_WZ_LABEL + wz for wz in wz_list if self.wz_ids[wz] >= self.known]
+            results.append(GroupResult(wz_numbers, key, sorted(rw_list), rows[bounds[position]:bounds[position + 1]]))
+        return results
+
+
+def aggregate(columns: dict) -> dict:
+    """
+    One grouped aggregation of the stacked item rows over (group, index): WZ and RW totals, whether
+    the index is on a WZ of the group and the row of its name, which is the last one in name order
+    as in CompareSet.compose_wz_dict. Result rows are sorted by group and index.
+    """
+    row = np.arange(len(columns["index"]))
+    order = np.lexsort((row, columns["rank"], columns["index"], columns["group"]))
+    group, index, quantity, is_wz = (columns[name][order] for name in ("group", "index", "quantity", "is_wz"))
+    starts = np.flatnonzero(np.r_[True, (group[1:] != group[:-1]) | (index[1:] != index[:-1])]) if len(order) else order
+    ends = np.r_[starts[1:], len(order)] - 1 if len(order) else order
+    wz_quantity = np.add.reduceat(np.where(is_wz, quantity, 0), starts)
+    rw_quantity = np.add.reduceat(np.where(is_wz, 0, quantity), starts)
+    on_wz = np.maximum.reduceat(is_wz, starts)
+    return {
+        "group": group[starts],
+        "index": index[starts],
+        "wz_quantity": wz_quantity,
+        "rw_quantity": rw_quantity,
+        "on_wz": on_wz,
+        "status": np.where(on_wz & (wz_quantity == rw_quantity), "OK", "RÓŻNICA"),
+        "name_row": row[order][ends],
+    }
+
+
+def compare_groups(connection) -> tuple:
+    """
+    Compares all groups of documents of a SQLite store at once. Returns the groups (as sort_references)
+    and their results with the interface of CompareSet used by report writers.
+    """
+    groups = ColumnarGroups(connection)
+    columns, names = groups.load_items(connection)
+    return groups.references, groups.results(aggregate(columns), names)
+
+
+def get_group_key(compare_set) -> tuple:
+    return (compare_set.wz_dict["WZ_numbers"], compare_set.wz_dict["DWS_numbers"], compare_set.rw_dict["RW_numbers"], list(compare_set.rows()))
+
+
+def verify_groups(compared: list, reference: list) -> list:
+    """
+    Positions of groups whose columnar result differs from the reference result (CompareSet).
+    """
+    differences = [position for position, (group, compare_set) in enumerate(zip(compared, reference))
+                   if get_group_key(group) != get_group_key(compare_set)]
+    if len(compared) != len(reference):
+        differences.append(min(len(compared), len(reference)))
+    return differences
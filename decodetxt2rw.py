@@ -1,13 +1,17 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import os
-import glob
-import json
-from operator import itemgetter
 import re
 
 import click
 from tqdm import tqdm
-from globals import RW_TXT_FOLDER,\
-                    RW_JSON_FOLDER
+from docstore import STORE_KINDS, get_store, open_store, test_and_touch_dir
+from globals import RW_DB_FILE, \
+                    RW_TXT_FOLDER,\
+                    RW_TEMP_FOLDER
+from manifest import Manifest, hash_text
+import metrics
+from workqueue import DEFAULT_LEASE, DEFAULT_QUEUE_FILE, WorkQueue
 
 
 PATTERN_RW = r"RW/U\d+/2[0-9]"
@@ -15,15 +19,19 @@ PATTERN_DWS = r"(?<=DWS)\s?\d\d\d/2[0-9]"
 PATTERN_WZ = r"(?<=WZ)\s?\d\d\d/\d\d/2[0-9]/6"
 PATTERN_INDEX = r"[0-9]{4}\s"
 PATTERN_COUNT = r"\d+\s?SZT"
+PATTERN_ITEMS_HEADER = r"INDEKS|NAZWA|CENA"
+MANIFEST_FILE = os.path.join(RW_TEMP_FOLDER, "rw_manifest.json")
+QUEUE_BATCH = 100
 
-
-def get_files(path: str) -> list:
-    return glob.glob(path)
-
-
-def test_and_touch_dir(dir_name: str) -> None:
-    if not os.path.exists(os.path.join(dir_name)):
-        os.mkdir(os.path.join(dir_name))
+# One pattern for all header numbers. Matches of the three patterns can't overlap,
+# so a single scan gives the same results as three separate findall calls.
+HEADER_REGEX = re.compile(
+    r"(?P<rw>RW/U\d+/2[0-9])|(?<=DWS)(?P<dws>\s?\d\d\d/2[0-9])|(?<=WZ)(?P<wz>\s?\d\d\d/\d\d/2[0-9]/6)",
+    re.IGNORECASE
+)
+ITEMS_HEADER_REGEX = re.compile(PATTERN_ITEMS_HEADER)
+INDEX_REGEX = re.compile(PATTERN_INDEX)
+COUNT_REGEX = re.compile(r"(\d+)\s?SZT")
 
 
 def get_text_from_file(filename: str) -> str:
@@ -35,15 +43,6 @@ def get_text_from_file(filename: str) -> str:
     return text
 
 
-def get_json_file_name(out_dir: str, out_number: str) -> str:
-    return os.path.join(out_dir, out_number.replace("/","_")+".json")
-
-
-def save_json(_dict: dict, filename: str):
-    with open(filename, "w", encoding='utf-8') as json_file:
-        json.dump(_dict, json_file)
-
-
 def decode_rw_number(source: str) -> str:
     rw_number = re.findall(PATTERN_RW, source, re.IGNORECASE)
     try:
@@ -113,15 +112,79 @@ def decode_item(source_line: str) -> dict:
     return item
 
 
+def decode_items(raw_text: str) -> list:
+    """
+    Items of the RW table (lines with index after the INDEKS|NAZWA|CENA header line),
+    decoded with one search for index and one for count per line.
+    """
+    items = []
+    in_table = False
+    for line in raw_text.splitlines():
+        if not in_table:
+            if ITEMS_HEADER_REGEX.search(line) is None:
+                continue
+            in_table = True
+        index = INDEX_REGEX.search(line)
+        if index is None:
+            continue
+        count = COUNT_REGEX.search(line)
+        items.append({"index": int(index.group()[:4]), "quantity": int(count.group(1)) if count else 0})
+    return items
+
+
 def compose_rw(rw_raw_text: str) -> dict:
+    """
+    Same result as decode_rw_number, decode_dws_numbers, decode_wz_numbers and decode_item
+    of item_lines_generator lines, but the text is scanned once for header numbers and once for items.
+    """
+    rw_number = None
+    dws_numbers = []
+    wz_numbers = []
+    for match in HEADER_REGEX.finditer(rw_raw_text):
+        kind = match.lastgroup
+        if kind == "rw":
+            if rw_number is None:
+                rw_number = match.group().upper()
+        elif kind == "dws":
+            dws_numbers.append(match.group().lstrip().upper())
+        else:
+            wz_numbers.append(match.group().lstrip().upper())
     rw_item = {}
-    rw_item["RW_document"] = decode_rw_number(rw_raw_text)
-    rw_item["DWS_documents"] = decode_dws_numbers(rw_raw_text)
-    rw_item["WZ_documents"] = decode_wz_numbers(rw_raw_text)
-    rw_item["items"] = [decode_item(line) for line in item_lines_generator(rw_raw_text)]
+    rw_item["RW_document"] = rw_number
+    rw_item["DWS_documents"] = dws_numbers
+    rw_item["WZ_documents"] = wz_numbers
+    rw_item["items"] = decode_items(rw_raw_text)
     return rw_item
 
 
+def decode_text(raw_text: str) -> tuple:
+    with metrics.stage("hash_text"):
+        content_hash = hash_text(raw_text)
+    with metrics.stage("compose_rw"):
+        rw = compose_rw(raw_text)
+    return content_hash, raw_text == '', rw
+
+
+def decode_file(filename: str) -> tuple:
+    return decode_text(get_text_from_file(filename))
+
+
+def decode_stored(store, source: str) -> tuple:
+    with metrics.stage("read"):
+        text = store.get_text(source)
+    return decode_text(text)
+
+
+def decode_source(source: str, store_kind: str = "files", db_file: str = RW_DB_FILE) -> tuple:
+    return decode_stored(get_store(store_kind, db_file), source)
+
+
+def get_manifest_file(store_kind: str, db_file: str) -> str:
+    if store_kind == "sqlite":
+        return db_file + ".manifest.json"
+    return MANIFEST_FILE
+
+
 def verify_rw(rw : dict, file: str) -> dict:
     result = {}
     result["RW_document"] = rw["RW_document"]
@@ -133,54 +196,160 @@ def verify_rw(rw : dict, file: str) -> dict:
 
 
 def print_report(report: list) -> str:
-    output = "Dokument RW   Dokumenty DWS  Dokumenty WZ  POZYCJI  Z PLIKU\n"
+    output = "Dokument RW   Dokumenty DWS  Dokumenty WZ  POZYCJI  STAN          Z PLIKU\n"
     for item in sort_report(report):
-        output += "{:12}  {:^13}  {:^12}  {:>7}  {}\n".format(
-            item["RW_document"], item["DWS_documents"], item["WZ_documents"], item["items"], item["filename"]
+        output += "{:12}  {:^13}  {:^12}  {:>7}  {:12}  {}\n".format(
+            item["RW_document"] or "NO RW", item["DWS_documents"], item["WZ_documents"], item["items"],
+            item.get("status", ""), item["filename"]
         )
     return output
 
 def sort_report(report: list) -> list:
-    return sorted(report, key=itemgetter("RW_document"))
+    return sorted(report, key=lambda item: item["RW_document"] or "")
 
 
 @click.command()
 @click.option("--report", "-r", "_report", is_flag=True, show_default=True, default=False, help="Wyświetla raport przetwarzania.")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba procesów dekodujących pliki.")
+@click.option("--force", "-f", is_flag=True, show_default=True, default=False, help="Przetwarza ponownie również pliki niezmienione od poprzedniego uruchomienia.")
+@click.option("--store", "store_kind", type=click.Choice(STORE_KINDS), show_default=True, default="files", help="Źródło tekstów i miejsce zapisu dokumentów RW: pliki w katalogach RW_txt i RW_json lub baza SQLite.")
+@click.option("--db", "db_file", show_default=True, default=RW_DB_FILE, help="Plik bazy SQLite (dla --store sqlite).")
+@click.option("--queue", "use_queue", is_flag=True, show_default=True, default=False, help="Pobiera pliki partiami ze wspólnej kolejki zadań, z której mogą równocześnie korzystać inne procesy i komputery.")
+@click.option("--queue-file", show_default=True, default=DEFAULT_QUEUE_FILE, help="Plik SQLite wspólnej kolejki zadań (dla --queue).")
+@click.option("--lease", type=click.FloatRange(min=1), show_default=True, default=DEFAULT_LEASE, help="Czas dzierżawy partii plików w sekundach; nieukończone w tym czasie pliki przejmują inne procesy.")
+@click.option("--batch", type=click.IntRange(min=1), show_default=True, default=QUEUE_BATCH, help="Liczba plików pobieranych z kolejki naraz.")
 @click.argument("filenames", nargs=-1, required=False)
-def main(_report: bool, filenames: list):
+@metrics.instrumented("decodetxt2rw")
+def main(_report: bool, jobs: int, force: bool, store_kind: str, db_file: str,
+         use_queue: bool, queue_file: str, lease: float, batch: int, filenames: list):
     """
     Program formatuje pliki tekstowe RW na pliki w formacie json.
     Gdy wywołany bez argumentów, przetwarza wszystkie pliki txt z podkatalogu RW_txt a pliki wynikowe zapisuje w podkatalogu RW_json.
     Jako argumenty wywołania wprowadza się nazwy plików do przetwarzania.
-    Opcja -r lub --report powoduje wyświetlenie raportu z przetwarzania plików.\n
+    Opcja -r lub --report powoduje wyświetlenie raportu z przetwarzania plików.
+    Pliki niezmienione od poprzedniego uruchomienia są pomijane, a pliki json, których plik źródłowy
+    zniknął lub zawiera już inny dokument RW, są usuwane.
+    Z opcją --queue pliki dzielone są z innymi procesami przez wspólną kolejkę zadań; przetworzone pliki,
+    ich wersje i utworzone dokumenty RW pamięta kolejka, a nie plik manifestu.\n
     Przykład:\n
     >python decodetxt2rw.py       <- przetwarza wszystkie pliki\n
     >python decodetxt2rw.py --report      <- przetwarza wszystkie pliki i wyświetla raport.\n
     >python rwimage2txt.py -r RW_txt/Scan_0001.txt   <- przetwarza tylko konkretny plik i wyświetla raport.\n
+    >python decodetxt2rw.py --jobs 8      <- przetwarza wszystkie pliki w 8 procesach.\n
+    >python decodetxt2rw.py --force      <- przetwarza ponownie wszystkie pliki.\n
+    >python decodetxt2rw.py --queue      <- dzieli pliki z innymi procesami uruchomionymi z --queue, także na innych komputerach.\n
+    >python decodetxt2rw.py --store sqlite      <- przetwarza teksty zapisane w bazie SQLite, dokumenty RW zapisuje w tej samej bazie.\n
+    >python decodetxt2rw.py --metrics metryki.json      <- zapisuje czasy etapów i plików.\n
     v1.0.0
     """
-    if len(filenames) > 0:
-        files_list = []
-        for filename in filenames:
-            files_list.extend(get_files(filename))
-    else:
+    store = open_store(store_kind, db_file)
+    if store_kind == "files" and len(filenames) == 0:
         test_and_touch_dir(RW_TXT_FOLDER)
-        files_list = get_files(os.path.join(RW_TXT_FOLDER, "*.txt"))
+    files_list = store.list_texts(filenames)
     report = []
-    test_and_touch_dir(RW_JSON_FOLDER)
-    t = tqdm(total=len(files_list), unit=" RW", desc="Przetwarzanie RW")
-    for file in files_list:
-        raw_text = get_text_from_file(file)
-        if raw_text == '':
-            print(f"\n\n\n\nPlik {file} nie zawiera poprawnych danych.")
-        rw_dict = compose_rw(raw_text)
-        save_json(rw_dict, get_json_file_name(RW_JSON_FOLDER, rw_dict["RW_document"]))
-        report.append(verify_rw(rw_dict, file)) 
+    removed = []
+    manifest = Manifest(get_manifest_file(store_kind, db_file))
+
+    def output_exists(rw_number: str) -> bool:
+        return rw_number is None or store.rw_exists(rw_number)
+
+    to_decode = []
+    if use_queue:
+        work_queue = WorkQueue(queue_file, "decode", lease=lease)
+        # Texts in a database have no mtime, their version is the hash of the text.
+        versions = None if store_kind == "files" else [hash_text(store.get_text(file)) for file in files_list]
+        added = work_queue.add(files_list, versions, force)
+        print(f"Kolejka {queue_file}: dodano {added} z {len(files_list)} plików, proces {work_queue.worker}.")
+        batches = work_queue.batches(batch)
+    else:
+        work_queue = None
+        with metrics.stage("manifest", items=len(files_list)):
+            for file in files_list:
+                if not force and manifest.is_unchanged(file) and output_exists(manifest.get_output(file)):
+                    report.append(dict(manifest.get_report(file), status="pominięty"))
+                else:
+                    to_decode.append(file)
+        batches = [to_decode]
+    t = tqdm(total=None if use_queue else len(to_decode), unit=" RW", desc="Przetwarzanie RW")
+    if jobs > 1:
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        worker = metrics.worker(partial(decode_source, store_kind=store_kind, db_file=db_file))
+    else:
+        pool = None
+        worker = metrics.worker(partial(decode_stored, store))
+
+    def decoded():
+        for files in batches:
+            if pool is not None:
+                results = pool.map(worker, files, chunksize=max(len(files) // (jobs * 4), 1))
+            else:
+                results = map(worker, files)
+            yield from zip(files, results)
+            if work_queue is not None:
+                # Files are done only once their documents are committed.
+                store.commit()
+                for file in files:
+                    work_queue.record(file, "done", output=outputs.pop(file, None))
+
+    def is_output_used(output: str, source: str) -> bool:
+        if work_queue is None:
+            return manifest.is_output_used(output)
+        return output in outputs.values() or work_queue.is_output_used(output, source)
+
+    outputs = {}
+    for file, output in decoded():
+        content_hash, empty, rw_dict = metrics.collect(output, file)
         t.update(n=1)
+        rw_number = rw_dict["RW_document"]
+        previous_output = manifest.get_output(file) if work_queue is None else work_queue.get_output(file)
+        # Queued files are decoded only when new or changed, the queue holds their versions.
+        if work_queue is None and not force and content_hash == manifest.get_hash(file) and rw_number == previous_output and output_exists(rw_number):
+            manifest.update(file, content_hash, rw_number, manifest.get_report(file))
+            report.append(dict(manifest.get_report(file), status="pominięty"))
+            continue
+        if empty:
+            print(f"\n\n\n\nPlik {file} nie zawiera poprawnych danych.")
+        if rw_number is not None:
+            with metrics.stage("store"):
+                store.put_rw(rw_dict)
+        else:
+            print(f"\nPlik {file} nie zawiera numeru RW.")
+        verification = verify_rw(rw_dict, file)
+        if work_queue is None:
+            manifest.update(file, content_hash, rw_number, verification)
+        else:
+            outputs[file] = rw_number
+        report.append(dict(verification, status="przetworzony"))
+        if previous_output is not None and previous_output != rw_number and not is_output_used(previous_output, file):
+            if store.delete_rw(previous_output):
+                removed.append(previous_output)
     t.close()
+    if pool is not None:
+        pool.shutdown()
+    if len(filenames) == 0 and work_queue is not None:
+        for source, previous_output in work_queue.remove_vanished(files_list):
+            if previous_output is not None and not work_queue.is_output_used(previous_output):
+                if store.delete_rw(previous_output):
+                    removed.append(previous_output)
+    if work_queue is not None:
+        work_queue.close()
+    if len(filenames) == 0 and work_queue is None:
+        for source in manifest.vanished_sources(files_list):
+            previous_output = manifest.get_output(source)
+            manifest.remove(source)
+            if previous_output is not None and not manifest.is_output_used(previous_output):
+                if store.delete_rw(previous_output):
+                    removed.append(previous_output)
+    store.close()
+    if work_queue is None:
+        # Other processes sharing the queue would overwrite each other's manifest.
+        manifest.save()
     if _report:
         print(print_report(report))
-        print(f"Razem przetworzonych dokumentów RW: {len(files_list)}")
+        for rw_number in sorted(removed):
+            print(f"Usunięto nieaktualny dokument: {rw_number}")
+        skipped = sum(1 for item in report if item["status"] == "pominięty")
+        print(f"Razem dokumentów RW: {len(report)}, pominiętych: {skipped}, przetworzonych: {len(report) - skipped}, usuniętych: {len(removed)}")
 
 
 if __name__ == "__main__":
@@ -1,13 +1,23 @@
+import bisect
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 import os
 import re
 import sys
+import time
 
 import click
 from tqdm import tqdm
 import xlrd
 
-from decodetxt2rw import test_and_touch_dir, get_json_file_name, save_json
-from globals import WZ_JSON_FOLDER
+from assortment import DEFAULT_MIN_SCORE, get_assortment_index
+from docstore import STORE_KINDS, open_store
+from globals import RW_DB_FILE
+import metrics
+
+
+WZ_COUNT_LABEL = "Liczba dokumentów WZ :"
+WZ_NUMBER_REGEX = re.compile(r"\d\d\d/[0-1][0-9]/2[0-9]/6")
 
 
 def get_assortment(xls_book: xlrd.book.Book, names_col_number=3, indexes_col_number=12) -> dict:
@@ -17,8 +27,15 @@ def get_assortment(xls_book: xlrd.book.Book, names_col_number=3, indexes_col_num
     return dict(zip(names, indexes))
 
 
-def get_xls_book(xls_file_name: str) -> xlrd.book.Book:
-    book = xlrd.open_workbook(xls_file_name)
+def read_assortment(xls_file_name: str) -> dict:
+    return get_assortment(get_xls_book(xls_file_name))
+
+
+def get_xls_book(xls_file_name: str, on_demand: bool = False) -> xlrd.book.Book:
+    """
+    With on_demand sheets are loaded only when requested and can be released with unload_sheet.
+    """
+    book = xlrd.open_workbook(xls_file_name, on_demand=on_demand)
     if isinstance(book,xlrd.book.Book):
         return book
     else:
@@ -95,10 +112,107 @@ def get_wz_content(assortment_dict: dict, dws_sheet: xlrd.sheet.Sheet, start_row
     return result
 
 
+def scan_dws_sheet(assortment_dict: dict, dws_sheet: xlrd.sheet.Sheet, start_col=6, end_col=15,
+                   count_col=8, count_start_row=41, mark_col=11) -> list:
+    """
+    All WZ documents of a sheet in one pass over rows read once. Gives the same result as
+    get_wz_content for every row yielded by get_wz_start, without scanning the sheet cell by cell.
+    """
+    rows = [dws_sheet.row_values(row_number) for row_number in range(dws_sheet.nrows)]
+    # Columns of row_values(row, start_col, end_col)[-1], [-2] and [1] used by get_wz_content.
+    count_cell = min(end_col, dws_sheet.ncols) - 1
+    number_cell = count_cell - 1
+    name_cell = start_col + 1
+    wz_count = None
+    starts = []
+    ends = []
+    for row_number, row in enumerate(rows):
+        if wz_count is None and row_number >= count_start_row and row[count_col] == WZ_COUNT_LABEL:
+            wz_count = int(row[count_col + 1])
+        if row[mark_col] == "Wz":
+            starts.append(row_number)
+        if row[count_cell] == "EOWZ":
+            ends.append(row_number)
+    wz_count = wz_count or 0
+    if len(starts) < wz_count:
+        raise IndexError("Brak znacznika Wz w arkuszu " + dws_sheet.name)
+    dws_number = dws_sheet.name.replace('_', '/')
+    result = []
+    for start in starts[:wz_count]:
+        end_index = bisect.bisect_left(ends, start)
+        if end_index == len(ends):
+            raise IndexError("Brak znacznika EOWZ w arkuszu " + dws_sheet.name)
+        wz_number = None
+        items = []
+        for row in rows[start:ends[end_index]]:
+            number = row[number_cell]
+            if isinstance(number, str) and WZ_NUMBER_REGEX.fullmatch(number) is not None:
+                wz_number = number
+            try:
+                items.append(compose_wz_item(assortment_dict, str(row[name_cell]), int(row[count_cell])))
+            except ValueError:
+                pass
+        if wz_number is None:
+            raise ValueError("Brak numeru WZ w arkuszu " + dws_sheet.name)
+        result.append({"WZ_number": wz_number, "DWS_number": dws_number, "items": items})
+    return result
+
+
+def extract_sheet_wz(assortment_dict: dict, xls_book: xlrd.book.Book, sheet_name: str) -> list:
+    """
+    All WZ documents of one DWS sheet. The sheet is released afterwards when the book is opened on demand.
+    """
+    with metrics.stage("load_sheet"):
+        dws_sheet = get_dws_sheet(xls_book, sheet_name)
+    with metrics.stage("scan_dws_sheet"):
+        wz_list = scan_dws_sheet(assortment_dict, dws_sheet)
+    if xls_book.on_demand:
+        xls_book.unload_sheet(sheet_name)
+    return wz_list
+
+
+_worker_book = None
+_worker_assortment = None
+
+
+def init_worker(dws_xls_file: str, assortment_dict: dict) -> None:
+    """
+    Every worker process opens its own on demand copy of the workbook.
+    """
+    global _worker_book, _worker_assortment
+    _worker_book = get_xls_book(dws_xls_file, on_demand=True)
+    _worker_assortment = assortment_dict
+
+
+def extract_worker_sheet(sheet_name: str) -> list:
+    return extract_sheet_wz(_worker_assortment, _worker_book, sheet_name)
+
+
+def get_peak_memory_mb() -> tuple:
+    """
+    Peak resident memory of this process and of the largest finished child process, in MB;
+    None where the resource module is missing (Windows).
+    """
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # ru_maxrss is given in kilobytes on Linux.
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    return own, children
+
+
 @click.command()
+@click.option("--store", "store_kind", type=click.Choice(STORE_KINDS), show_default=True, default="files", help="Miejsce zapisu dokumentów WZ: pliki w katalogu WZ_json lub baza SQLite.")
+@click.option("--db", "db_file", show_default=True, default=RW_DB_FILE, help="Plik bazy SQLite (dla --store sqlite).")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba procesów rozpakowujących arkusze DWS.")
+@click.option("--on-demand/--full-load", show_default=True, default=True, help="Wczytuje arkusze DWS pojedynczo i zwalnia je po rozpakowaniu zamiast wczytywać cały skoroszyt.")
+@click.option("--fuzzy-min-score", type=click.FloatRange(0, 1), show_default=True, default=DEFAULT_MIN_SCORE, help="Najmniejsze podobieństwo nazwy towaru spoza asortymentu do nazwy z asortymentu, przy którym przypisywany jest jej indeks (1 - tylko nazwy o tych samych trigramach, np. różniące się wielkością liter lub odstępami).")
 @click.argument("assortment-xls-file", nargs=1)
 @click.argument("dws-xls-file", nargs=1)
-def main(assortment_xls_file: str, dws_xls_file: str):
+@metrics.instrumented("decodexls2wz")
+def main(store_kind: str, db_file: str, jobs: int, on_demand: bool, fuzzy_min_score: float, assortment_xls_file: str, dws_xls_file: str):
     """
     Program rozpakowuje WZty dyspozycji DWSygn do plików w formacie json (do podkatalogu WZ_json/). 
     Argumenty:\n
@@ -106,36 +220,66 @@ def main(assortment_xls_file: str, dws_xls_file: str):
         dws-xls-file: plik w formacie xls zawierający dyspozycje DWSygn oraz dokumenty WZ\n
     Przykład:\n
     >python decodexls2wz.py "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"\n
+    >python decodexls2wz.py --store sqlite "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"   <- zapisuje WZ w bazie SQLite.\n
+    >python decodexls2wz.py --jobs 4 "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"   <- rozpakowuje arkusze w 4 procesach.\n
+    >python decodexls2wz.py --fuzzy-min-score 1 "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"   <- bez przybliżonego dopasowania nazw towarów.\n
+    >python decodexls2wz.py --metrics metryki.json "DWS_xls/asortyment.xls" "DWS_xls/DWSygn.xls"   <- zapisuje czasy etapów i arkuszy.\n
     v1.0.0
     """
     print("Wczytanie listy asortymentu...", end="")
     try:
-        assortment_book = get_xls_book(os.path.join(assortment_xls_file))
+        with metrics.stage("assortment"):
+            assortment_dict, from_cache = get_assortment_index(os.path.join(assortment_xls_file), read_assortment, min_score=fuzzy_min_score)
     except Exception as e:
         print(f"\nBłąd podczas wczytywania listy. {e}")
         sys.exit(1)
     else:
-        assortment_dict = get_assortment(assortment_book)
-        print("gotowe.")
+        print("gotowe (z pamięci podręcznej)." if from_cache else "gotowe.")
     print("Wczytywanie listy DWSygn...", end="")
     try:
-        dws_book = get_xls_book(os.path.join(dws_xls_file))
+        with metrics.stage("open_workbook"):
+            dws_book = get_xls_book(os.path.join(dws_xls_file), on_demand=on_demand or jobs > 1)
     except Exception as e:
         print(f"\nBłąd podczas wczytywania listy. {e}")
         sys.exit(1)
     else:
         dws_list = get_dws_sheet_list(dws_book)
         print("gotowe.")
-    test_and_touch_dir(WZ_JSON_FOLDER)
+    start_time = time.perf_counter()
+    store = open_store(store_kind, db_file)
     t = tqdm(total=len(dws_list), unit=" DWS", desc="Rozpakowywanie WZ")
-    for dws_name in dws_list:
-        dws_sheet = get_dws_sheet(dws_book, dws_name)
-        wz_list = [get_wz_content(assortment_dict, dws_sheet, start_row=sr) for sr in get_wz_start(dws_sheet)]
+    if jobs > 1:
+        dws_book.release_resources()
+        pool = ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(dws_xls_file, assortment_dict))
+        sheets_wz = pool.map(metrics.worker(extract_worker_sheet), dws_list, chunksize=max(len(dws_list) // (jobs * 4), 1))
+    else:
+        pool = None
+        sheets_wz = map(metrics.worker(partial(extract_sheet_wz, assortment_dict, dws_book)), dws_list)
+    wz_count = 0
+    unknown_names = set()
+    for dws_name, output in zip(dws_list, sheets_wz):
+        wz_list = metrics.collect(output, dws_name)
         for wz in wz_list:
-            save_json(wz, get_json_file_name(WZ_JSON_FOLDER,"WZ_"+wz["WZ_number"]))
+            with metrics.stage("store"):
+                store.put_wz(wz)
+            unknown_names.update(item["name"] for item in wz["items"] if item["name"] not in assortment_dict.assortment)
+        wz_count += len(wz_list)
         t.update(n=1)
     t.close()
-
+    if pool is not None:
+        pool.shutdown()
+    else:
+        dws_book.release_resources()
+    store.close()
+    elapsed = time.perf_counter() - start_time
+    own_memory, workers_memory = get_peak_memory_mb()
+    print(f"Rozpakowano {wz_count} WZ z {len(dws_list)} arkuszy w {elapsed:.1f} s ({len(dws_list) / max(elapsed, 1e-9):.1f} arkuszy/s).")
+    for name in sorted(unknown_names):
+        matched_name, score = assortment_dict.match(name)
+        status = "przypisano indeks" if matched_name is not None and score >= fuzzy_min_score else "indeks 0"
+        print(f"Nazwa spoza asortymentu: {name!r}, najbliższa: {matched_name!r} ({score:.2f}, {status}).")
+    if own_memory is not None:
+        print(f"Szczytowe zużycie pamięci: {own_memory:.0f} MB" + (f", proces roboczy: {workers_memory:.0f} MB." if pool is not None else "."))
 
 if __name__ == "__main__":
     main()
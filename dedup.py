@@ -0,0 +1,150 @@
+import cv2
+import numpy as np
+
+from preprocess import decode_grey
+
+
+HASH_DPI = 150
+HASH_SAMPLE_SIZE = 128
+HASH_DCT_SIZE = 16
+HASH_BITS = HASH_DCT_SIZE * HASH_DCT_SIZE - 1
+DEFAULT_MAX_DISTANCE = 8
+# Pages with a smaller standard deviation of grey levels (blank or uniform, e.g. separator sheets,
+# scanner noise only) get no hash; a page with a single line of text is about 11.
+MIN_PAGE_STD = 4.0
+MAX_SKEW = 3.0
+SKEW_POINTS = 20000
+
+
+def get_row_energy(x, y, angle: float) -> float:
+    rows = np.round(y * np.cos(angle) - x * np.sin(angle)).astype(np.int64)
+    counts = np.bincount(rows - rows.min())
+    return float(np.dot(counts, counts))
+
+
+def estimate_skew(points) -> float:
+    """
+    Skew of the page in degrees: the angle at which ink points fall into the fewest, fullest rows.
+    Searched in 0.5 degree steps up to MAX_SKEW, then in 0.05 degree steps around the best one.
+    """
+    points = points[::max(1, len(points) // SKEW_POINTS)]
+    x, y = points[:, 0].astype(np.float64), points[:, 1].astype(np.float64)
+    best = 0.0
+    for step, span in ((0.5, MAX_SKEW), (0.05, 0.5)):
+        angles = best + np.arange(-span, span + step / 2, step)
+        best = max(angles, key=lambda angle: get_row_energy(x, y, np.radians(angle)))
+    return float(best)
+
+
+def deskew(ink):
+    """
+    Ink image (white on black) rotated by the estimated skew around the centre of the page,
+    so ink near the edges stays on the page. None when there is no ink.
+    """
+    thresh = cv2.threshold(ink, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    points = cv2.findNonZero(thresh)
+    if points is None:
+        return None
+    rotation = cv2.getRotationMatrix2D((ink.shape[1] / 2, ink.shape[0] / 2), estimate_skew(points[:, 0, :]), 1.0)
+    return cv2.warpAffine(ink, rotation, (ink.shape[1], ink.shape[0]))
+
+
+def get_page_hash(grey) -> int:
+    """
+    Perceptual hash of a greyscale page, HASH_BITS bits. The page is deskewed and cropped to its ink,
+    so rescans which are shifted or slightly rotated give close hashes, shrunk to HASH_SAMPLE_SIZE
+    square and described by signs of low frequency DCT coefficients against their median.
+    None for blank or uniform pages (below MIN_PAGE_STD), which would all get the same hash.
+    """
+    if grey.std() < MIN_PAGE_STD:
+        return None
+    ink = deskew(cv2.bitwise_not(grey))
+    if ink is None:
+        return None
+    points = cv2.findNonZero(cv2.threshold(ink, 127, 255, cv2.THRESH_BINARY)[1])
+    if points is None:
+        return None
+    x, y, width, height = cv2.boundingRect(points)
+    sample = cv2.resize(ink[y:y + height, x:x + width], (HASH_SAMPLE_SIZE, HASH_SAMPLE_SIZE), interpolation=cv2.INTER_AREA)
+    coefficients = cv2.dct(sample.astype(np.float32))[:HASH_DCT_SIZE, :HASH_DCT_SIZE].flatten()[1:]
+    bits = coefficients > np.median(coefficients)
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def get_scan_hash(raw: bytes, source_dpi: int = 0) -> int:
+    """
+    Perceptual hash of a jpeg scan decoded at HASH_DPI, None when it can't be decoded or the page is blank.
+    """
+    if not raw:
+        return None
+    grey = decode_grey(raw, HASH_DPI, source_dpi)
+    if grey is None:
+        return None
+    return get_page_hash(grey)
+
+
+def hamming(first: int, second: int) -> int:
+    # bin().count instead of int.bit_count, which needs Python 3.10.
+    return bin(first ^ second).count("1")
+
+
+class DuplicateIndex():
+    """
+    Hashes of representative pages. Hashes within max_distance bits of each other are equal
+    on at least one of max_distance + 1 bands (pigeonhole principle), so a new hash is compared
+    only with hashes sharing a band with it.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_DISTANCE, bits: int = HASH_BITS) -> None:
+        self.max_distance = max_distance
+        count = min(max_distance + 1, bits)
+        bounds = [bits * i // count for i in range(count + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self.buckets = [{} for _ in self.bands]
+        self.hashes = []
+
+
+    def find(self, page_hash: int) -> tuple:
+        """
+        Number of the nearest hash within max_distance and the distance, or (None, None).
+        """
+        best, best_distance = None, None
+        seen = set()
+        for (shift, mask), buckets in zip(self.bands, self.buckets):
+            for number in buckets.get((page_hash >> shift) & mask, ()):
+                if number in seen:
+                    continue
+                seen.add(number)
+                distance = hamming(page_hash, self.hashes[number])
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best, best_distance = number, distance
+        return best, best_distance
+
+
+    def add(self, page_hash: int) -> int:
+        number = len(self.hashes)
+        self.hashes.append(page_hash)
+        for (shift, mask), buckets in zip(self.bands, self.buckets):
+            buckets.setdefault((page_hash >> shift) & mask, []).append(number)
+        return number
+
+
+def group_duplicates(hashes: list, max_distance: int = DEFAULT_MAX_DISTANCE) -> list:
+    """
+    For every hash (in order) the position of its representative and the distance to it:
+    (itself, 0) for the first page of a group, an earlier page it duplicates otherwise.
+    Pages without a hash (None) are never grouped.
+    """
+    index = DuplicateIndex(max_distance)
+    positions = []
+    groups = []
+    for position, page_hash in enumerate(hashes):
+        number, distance = (None, None) if page_hash is None else index.find(page_hash)
+        if number is None:
+            if page_hash is not None:
+                index.add(page_hash)
+                positions.append(position)
+            groups.append((position, 0))
+        else:
+            groups.append((positions[number], distance))
+    return groups
@@ -0,0 +1,318 @@
+from abc import ABC, abstractmethod
+import fnmatch
+import glob
+import json
+import os
+import sqlite3
+import sys
+
+from globals import RW_DB_FILE, \
+                    RW_JSON_FOLDER, \
+                    RW_TXT_FOLDER, \
+                    WZ_JSON_FOLDER
+
+
+STORE_KINDS = ["files", "sqlite"]
+SQLITE_COMMIT_EVERY = 1000
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ocr_text (name TEXT PRIMARY KEY, text TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rw (number TEXT PRIMARY KEY, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rw_wz (rw TEXT NOT NULL, wz TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rw_dws (rw TEXT NOT NULL, dws TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS wz (number TEXT PRIMARY KEY, dws TEXT, body TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS item (kind TEXT NOT NULL, number TEXT NOT NULL, idx INTEGER, quantity INTEGER, name TEXT);
+CREATE INDEX IF NOT EXISTS rw_wz_rw ON rw_wz (rw);
+CREATE INDEX IF NOT EXISTS rw_wz_wz ON rw_wz (wz);
+CREATE INDEX IF NOT EXISTS rw_dws_rw ON rw_dws (rw);
+CREATE INDEX IF NOT EXISTS rw_dws_dws ON rw_dws (dws);
+CREATE INDEX IF NOT EXISTS wz_dws ON wz (dws);
+CREATE INDEX IF NOT EXISTS item_document ON item (kind, number);
+CREATE INDEX IF NOT EXISTS item_idx ON item (idx);
+"""
+
+
+def get_files(path: str) -> list:
+    return glob.glob(path)
+
+
+def test_and_touch_dir(dir_name: str) -> None:
+    # Several workers sharing a queue may create the folder at the same time.
+    os.makedirs(dir_name, exist_ok=True)
+
+
+def load_json(filename: str) -> dict:
+    try:
+        with open(filename, "r", encoding="UTF-8") as stream:
+            return json.load(stream)
+    except (OSError, ValueError) as e:
+        print(f"Nie można wczytać pliku {filename}: {e}", file=sys.stderr)
+        return {}
+
+
+def get_json_file_name(out_dir: str, out_number: str) -> str:
+    return os.path.join(out_dir, out_number.replace("/","_")+".json")
+
+
+def save_json(_dict: dict, filename: str):
+    with open(filename, "w", encoding='utf-8') as json_file:
+        json.dump(_dict, json_file)
+
+
+def rw_entry(item: dict) -> dict:
+    """
+    RW document in the form used by RWComparator.rw_data.
+    """
+    return {
+        "DWS_documents" : item.get("DWS_documents",[]),
+        "WZ_documents" : item.get("WZ_documents", []),
+        "items" : item.get("items",[])
+    }
+
+
+def wz_entry(item: dict) -> dict:
+    return {"DWS_number": item.get("DWS_number",[]), "items" : item.get("items",[])}
+
+
+class DocumentStore(ABC):
+    """
+    Storage of OCR texts, RW documents and WZ documents.
+    """
+
+    @abstractmethod
+    def list_texts(self, patterns: list = None) -> list:
+        pass
+
+    @abstractmethod
+    def get_text(self, source: str) -> str:
+        pass
+
+    @abstractmethod
+    def put_text(self, name: str, text: str) -> None:
+        pass
+
+    @abstractmethod
+    def put_rw(self, rw: dict) -> None:
+        pass
+
+    @abstractmethod
+    def rw_exists(self, rw_number: str) -> bool:
+        pass
+
+    @abstractmethod
+    def delete_rw(self, rw_number: str) -> bool:
+        pass
+
+    @abstractmethod
+    def put_wz(self, wz: dict) -> None:
+        pass
+
+    @abstractmethod
+    def load_rw_data(self) -> dict:
+        pass
+
+    @abstractmethod
+    def load_wz_data(self) -> dict:
+        pass
+
+    def commit(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.commit()
+
+
+class FolderStore(DocumentStore):
+    """
+    Original layout: one text file per scan in RW_txt/, one json file per document in RW_json/ and WZ_json/.
+    """
+
+    def __init__(self, txt_folder: str = RW_TXT_FOLDER, rw_folder: str = RW_JSON_FOLDER, wz_folder: str = WZ_JSON_FOLDER) -> None:
+        self.txt_folder = txt_folder
+        self.rw_folder = rw_folder
+        self.wz_folder = wz_folder
+
+
+    def list_texts(self, patterns: list = None) -> list:
+        if not patterns:
+            return glob.glob(os.path.join(self.txt_folder, "*.txt"))
+        result = []
+        for pattern in patterns:
+            result.extend(glob.glob(pattern))
+        return result
+
+
+    def get_text(self, source: str) -> str:
+        try:
+            with open(source, "r", encoding='utf-8') as stream:
+                return stream.read()
+        except (OSError, ValueError):
+            return ''
+
+
+    def put_text(self, name: str, text: str) -> None:
+        os.makedirs(self.txt_folder, exist_ok=True)
+        with open(os.path.join(self.txt_folder, name + ".txt"), 'w', encoding="utf-8") as stream:
+            stream.write(text)
+
+
+    def put_rw(self, rw: dict) -> None:
+        os.makedirs(self.rw_folder, exist_ok=True)
+        save_json(rw, get_json_file_name(self.rw_folder, rw["RW_document"]))
+
+
+    def rw_exists(self, rw_number: str) -> bool:
+        return os.path.exists(get_json_file_name(self.rw_folder, rw_number))
+
+
+    def delete_rw(self, rw_number: str) -> bool:
+        try:
+            os.remove(get_json_file_name(self.rw_folder, rw_number))
+        except FileNotFoundError:
+            return False
+        return True
+
+
+    def put_wz(self, wz: dict) -> None:
+        os.makedirs(self.wz_folder, exist_ok=True)
+        save_json(wz, get_json_file_name(self.wz_folder, "WZ_"+wz["WZ_number"]))
+
+
+    def load_rw_data(self) -> dict:
+        rw_data = {}
+        for fn in glob.glob(os.path.join(self.rw_folder, "*.json")):
+            item = load_json(fn)
+            rw_data[item.get("RW_document","Rw/unknown")] = rw_entry(item)
+        return rw_data
+
+
+    def load_wz_data(self) -> dict:
+        wz_data = {}
+        for fn in glob.glob(os.path.join(self.wz_folder, "*.json")):
+            item = load_json(fn)
+            wz_data[item.get("WZ_number","000/00")] = wz_entry(item)
+        return wz_data
+
+
+class SQLiteStore(DocumentStore):
+    """
+    All documents in a single SQLite database, written in bulk transactions.
+    RW, WZ and DWS numbers and item indexes are indexed for queries.
+    """
+
+    def __init__(self, db_file: str = RW_DB_FILE) -> None:
+        self.db_file = db_file
+        self.connection = sqlite3.connect(db_file)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(SQLITE_SCHEMA)
+        self.pending = 0
+        self.add_item_names()
+
+
+    def add_item_names(self) -> None:
+        """
+        Adds names of WZ items to the item table of a database created without them.
+        """
+        if "name" in [row[1] for row in self.connection.execute("PRAGMA table_info(item)")]:
+            return
+        self.connection.execute("ALTER TABLE item ADD COLUMN name TEXT")
+        for number, body in self.connection.execute("SELECT number, body FROM wz").fetchall():
+            self.put_wz_items(number, json.loads(body)["items"])
+        self.commit()
+
+
+    def written(self) -> None:
+        self.pending += 1
+        if self.pending >= SQLITE_COMMIT_EVERY:
+            self.commit()
+
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self.pending = 0
+
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+
+    def list_texts(self, patterns: list = None) -> list:
+        names = [row[0] for row in self.connection.execute("SELECT name FROM ocr_text ORDER BY name")]
+        if not patterns:
+            return names
+        return [name for name in names if any(fnmatch.fnmatch(name, pattern) for pattern in patterns)]
+
+
+    def get_text(self, source: str) -> str:
+        row = self.connection.execute("SELECT text FROM ocr_text WHERE name = ?", (source,)).fetchone()
+        return row[0] if row else ''
+
+
+    def put_text(self, name: str, text: str) -> None:
+        self.connection.execute("INSERT OR REPLACE INTO ocr_text (name, text) VALUES (?, ?)", (name, text))
+        self.written()
+
+
+    def put_rw(self, rw: dict) -> None:
+        number = rw["RW_document"]
+        self.delete_rw(number)
+        self.connection.execute("INSERT INTO rw (number, body) VALUES (?, ?)", (number, json.dumps(rw)))
+        self.connection.executemany("INSERT INTO rw_wz (rw, wz) VALUES (?, ?)", [(number, wz) for wz in rw["WZ_documents"]])
+        self.connection.executemany("INSERT INTO rw_dws (rw, dws) VALUES (?, ?)", [(number, dws) for dws in rw["DWS_documents"]])
+        self.connection.executemany("INSERT INTO item (kind, number, idx, quantity) VALUES ('RW', ?, ?, ?)",
+                                    [(number, item["index"], item["quantity"]) for item in rw["items"]])
+        self.written()
+
+
+    def rw_exists(self, rw_number: str) -> bool:
+        return self.connection.execute("SELECT 1 FROM rw WHERE number = ?", (rw_number,)).fetchone() is not None
+
+
+    def delete_rw(self, rw_number: str) -> bool:
+        cursor = self.connection.execute("DELETE FROM rw WHERE number = ?", (rw_number,))
+        self.connection.execute("DELETE FROM rw_wz WHERE rw = ?", (rw_number,))
+        self.connection.execute("DELETE FROM rw_dws WHERE rw = ?", (rw_number,))
+        self.connection.execute("DELETE FROM item WHERE kind = 'RW' AND number = ?", (rw_number,))
+        return cursor.rowcount > 0
+
+
+    def put_wz(self, wz: dict) -> None:
+        number = wz["WZ_number"]
+        self.connection.execute("INSERT OR REPLACE INTO wz (number, dws, body) VALUES (?, ?, ?)",
+                                (number, wz["DWS_number"], json.dumps(wz)))
+        self.put_wz_items(number, wz["items"])
+        self.written()
+
+
+    def put_wz_items(self, number: str, items: list) -> None:
+        self.connection.execute("DELETE FROM item WHERE kind = 'WZ' AND number = ?", (number,))
+        self.connection.executemany("INSERT INTO item (kind, number, idx, quantity, name) VALUES ('WZ', ?, ?, ?, ?)",
+                                    [(number, item["index"], item["quantity"], item["name"]) for item in items])
+
+
+    def load_rw_data(self) -> dict:
+        return {number: rw_entry(json.loads(body)) for number, body in self.connection.execute("SELECT number, body FROM rw")}
+
+
+    def load_wz_data(self) -> dict:
+        return {number: wz_entry(json.loads(body)) for number, body in self.connection.execute("SELECT number, body FROM wz")}
+
+
+_stores = {}
+
+
+def open_store(kind: str = "files", db_file: str = RW_DB_FILE) -> DocumentStore:
+    if kind == "sqlite":
+        return SQLiteStore(db_file)
+    return FolderStore()
+
+
+def get_store(kind: str = "files", db_file: str = RW_DB_FILE) -> DocumentStore:
+    """
+    Store shared by all calls in the current process (used by pool workers).
+    """
+    if (kind, db_file) not in _stores:
+        _stores[(kind, db_file)] = open_store(kind, db_file)
+    return _stores[(kind, db_file)]
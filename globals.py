@@ -3,4 +3,5 @@ RW_RAW_INPUT_FOLDER = "RW_jpeg/"
 RW_TEMP_FOLDER = "RW_temp/"
 RW_TXT_FOLDER = "RW_txt/"
 DWS_XLS_FOLDER = "DWS_xls/"
-WZ_JSON_FOLDER = "WZ_json/"
\ No newline at end of file
+WZ_JSON_FOLDER = "WZ_json/"
+RW_DB_FILE = "RW_documents.sqlite"
\ No newline at end of file
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+
+from globals import RW_TEMP_FOLDER
+from reportwriter import GroupResult
+
+
+GROUP_CACHE_FILE = os.path.join(RW_TEMP_FOLDER, "rw_groups.json")
+
+
+def hash_document(document: dict) -> str:
+    if document is None:
+        return "-"
+    return hashlib.sha256(json.dumps(document, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def get_group_key(wz_list: list, rw_list: list, wz_data: dict, rw_data: dict) -> str:
+    """
+    Key of a group: hash of numbers and content hashes of all its documents.
+    A WZ referenced by RW but not found is part of the key too, so the group is rebuilt once it appears.
+    """
+    parts = [f"WZ:{wz}:{hash_document(wz_data.get(wz))}" for wz in sorted(wz_list)]
+    parts += [f"RW:{rw}:{hash_document(rw_data[rw])}" for rw in sorted(rw_list)]
+    return hashlib.sha256("\n".join(parts).encode("utf-8")).hexdigest()
+
+
+class GroupCache():
+    """
+    Comparison results of groups from the previous run, keyed by get_group_key.
+    Only results of groups seen in the current run are saved, so entries of changed
+    or removed groups are dropped and returned by obsolete().
+    """
+
+    def __init__(self, filename: str = GROUP_CACHE_FILE) -> None:
+        self.filename = filename
+        try:
+            with open(filename, "r", encoding="utf-8") as stream:
+                self.previous = json.load(stream)
+        except (OSError, ValueError):
+            self.previous = {}
+        self.current = {}
+        self.hits = 0
+        self.misses = 0
+
+
+    def get(self, key: str) -> GroupResult:
+        entry = self.previous.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.current[key] = entry
+        return GroupResult(entry["WZ_numbers"], entry["DWS_numbers"], entry["RW_numbers"], [tuple(row) for row in entry["rows"]])
+
+
+    def put(self, key: str, result: GroupResult) -> None:
+        self.current[key] = {
+            "WZ_numbers": result.wz_dict["WZ_numbers"],
+            "DWS_numbers": result.wz_dict["DWS_numbers"],
+            "RW_numbers": result.rw_dict["RW_numbers"],
+            "rows": list(result.rows()),
+        }
+
+
+    def obsolete(self) -> list:
+        """
+        Results of the previous run which are no longer valid, as GroupResult objects.
+        """
+        return [GroupResult(entry["WZ_numbers"], entry["DWS_numbers"], entry["RW_numbers"], [tuple(row) for row in entry["rows"]])
+                for key, entry in self.previous.items() if key not in self.current]
+
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as stream:
+            json.dump(self.current, stream, ensure_ascii=False)
+        os.replace(tmp_filename, self.filename)
+
+
+def compare_incremental(references: list, wz_data: dict, rw_data: dict, cache: GroupCache, compare, on_changed=None):
+    """
+    Results of all groups in order of references. Cached results are reused, the other groups
+    are passed together to compare(references) which yields their results in order.
+    on_changed is called with every newly compared group.
+    """
+    keys = [get_group_key(wz_list, rw_list, wz_data, rw_data) for wz_list, rw_list in references]
+    cached = [cache.get(key) for key in keys]
+    changed = iter(compare([ref for ref, result in zip(references, cached) if result is None]))
+    for key, result in zip(keys, cached):
+        if result is None:
+            result = GroupResult.from_compare_set(next(changed))
+            cache.put(key, result)
+            if on_changed is not None:
+                on_changed(result)
+        yield result
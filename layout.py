@@ -0,0 +1,93 @@
+import cv2
+import numpy as np
+
+
+ROI_MODES = ["off", "regions", "rows"]
+MIN_RULING_WIDTH_RATIO = 0.5
+RULING_MERGE_DISTANCE = 8
+MIN_ROW_HEIGHT = 12
+REGION_MARGIN = 4
+
+
+def get_rulings(detected_lines, min_width_ratio=MIN_RULING_WIDTH_RATIO) -> list:
+    """
+    Vertical positions of long horizontal lines (table rulings) found by the morphological
+    opening in rwimage2txt. Lines closer than RULING_MERGE_DISTANCE are treated as one.
+    """
+    min_width = detected_lines.shape[1] * min_width_ratio
+    cnts = cv2.findContours(detected_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    cnts = cnts[0] if len(cnts) == 2 else cnts[1]
+    rulings = []
+    for c in cnts:
+        x, y, w, h = cv2.boundingRect(c)
+        if w >= min_width:
+            rulings.append(y + h // 2)
+    merged = []
+    for y in sorted(rulings):
+        if merged and y - merged[-1] <= RULING_MERGE_DISTANCE:
+            continue
+        merged.append(y)
+    return merged
+
+
+def get_ink_box(page, top: int, bottom: int):
+    """
+    Bounding box (x, y, w, h) of the text between top and bottom rows of a page with
+    black text on white background, or None when that part of the page is empty.
+    """
+    ink = cv2.findNonZero(cv2.bitwise_not(page[top:bottom]))
+    if ink is None:
+        return None
+    x, y, w, h = cv2.boundingRect(ink)
+    x0 = max(x - REGION_MARGIN, 0)
+    y0 = max(top + y - REGION_MARGIN, 0)
+    x1 = min(x + w + REGION_MARGIN, page.shape[1])
+    y1 = min(top + y + h + REGION_MARGIN, page.shape[0])
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def find_regions(page, detected_lines) -> dict:
+    """
+    Header block (everything above the first table ruling) and item table (between the first
+    and the last ruling) of a preprocessed RW page. Rows of the table are the strips between
+    consecutive rulings. Returns None when the table could not be found.
+    """
+    rulings = get_rulings(detected_lines)
+    if len(rulings) < 2:
+        return None
+    top, bottom = rulings[0], rulings[-1]
+    rows = []
+    for row_top, row_bottom in zip(rulings, rulings[1:]):
+        if row_bottom - row_top < MIN_ROW_HEIGHT:
+            continue
+        box = get_ink_box(page, row_top, row_bottom)
+        if box is not None:
+            rows.append(box)
+    return {
+        "header": get_ink_box(page, 0, top),
+        "table": get_ink_box(page, top, bottom),
+        "rows": rows,
+    }
+
+
+def crop(image, box):
+    x, y, w, h = box
+    return image[y:y + h, x:x + w]
+
+
+def ocr_regions(page, detected_lines, recognize, rows: bool = False) -> str:
+    """
+    Recognises only the header block and the item table of a page. recognize is a callable
+    taking an image and returning text. Falls back to the whole page if no table is found.
+    """
+    regions = find_regions(page, detected_lines)
+    if regions is None:
+        return recognize(page)
+    parts = []
+    if regions["header"] is not None:
+        parts.append(recognize(np.ascontiguousarray(crop(page, regions["header"]))))
+    if rows:
+        parts.extend(recognize(np.ascontiguousarray(crop(page, box))) for box in regions["rows"])
+    elif regions["table"] is not None:
+        parts.append(recognize(np.ascontiguousarray(crop(page, regions["table"]))))
+    return "\n".join(part.rstrip("\n") for part in parts) + "\n"
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+
+
+class Manifest():
+    """
+    Record of processed source files: content hash, mtime and size of every source
+    together with the number of the document it produced and its report entry.
+    Lets a rerun skip unchanged sources and find outputs whose source vanished or changed.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.entries = {}
+        try:
+            with open(filename, "r", encoding="utf-8") as stream:
+                self.entries = json.load(stream)
+        except (OSError, ValueError):
+            self.entries = {}
+
+
+    def save(self) -> None:
+        os.makedirs(os.path.dirname(self.filename) or ".", exist_ok=True)
+        tmp_filename = self.filename + ".tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as stream:
+            json.dump(self.entries, stream)
+        os.replace(tmp_filename, self.filename)
+
+
+    def is_unchanged(self, source: str) -> bool:
+        """
+        Quick check based on mtime and size only, the file is not read.
+        """
+        entry = self.entries.get(source)
+        if entry is None:
+            return False
+        try:
+            stat = os.stat(source)
+        except OSError:
+            return False
+        return entry["mtime"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+
+
+    def get_hash(self, source: str) -> str:
+        return self.entries.get(source, {}).get("hash")
+
+
+    def update(self, source: str, content_hash: str, output: str, report: dict = None) -> None:
+        """
+        Sources which are not files (e.g. texts kept in a database) are recorded by hash only.
+        """
+        try:
+            stat = os.stat(source)
+            mtime, size = stat.st_mtime_ns, stat.st_size
+        except OSError:
+            mtime, size = None, None
+        self.entries[source] = {
+            "hash": content_hash,
+            "mtime": mtime,
+            "size": size,
+            "output": output,
+            "report": report,
+        }
+
+
+    def get_output(self, source: str) -> str:
+        return self.entries.get(source, {}).get("output")
+
+
+    def get_report(self, source: str) -> dict:
+        return self.entries.get(source, {}).get("report")
+
+
+    def remove(self, source: str) -> None:
+        self.entries.pop(source, None)
+
+
+    def vanished_sources(self, current_sources: list) -> list:
+        current = set(current_sources)
+        return [source for source in self.entries if source not in current]
+
+
+    def is_output_used(self, output: str) -> bool:
+        return any(entry["output"] == output for entry in self.entries.values())
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
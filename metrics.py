@@ -0,0 +1,247 @@
+from contextlib import contextmanager
+import cProfile
+import functools
+import heapq
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+
+import click
+
+
+SLOWEST_DOCUMENTS = 10
+
+_local = threading.local()
+_profiler = None
+_profiler_owner = None
+
+
+def cpu_time() -> float:
+    """
+    CPU time of this process and its finished child processes (e.g. tesseract started by pytesseract).
+    With a thread pool the time of all threads is counted.
+    """
+    times = os.times()
+    return time.process_time() + times.children_user + times.children_system
+
+
+class Metrics():
+    """
+    Wall time, CPU time, calls and items of every stage, and the time of every document
+    (scan, text file, sheet or group) with the slowest ones kept together with their stages.
+    """
+
+    def __init__(self, command: str = "", slowest: int = SLOWEST_DOCUMENTS) -> None:
+        self.command = command
+        self.slowest_count = slowest
+        self.stages = {}
+        self.documents = []
+        self.slowest = []
+        self.start_wall = time.perf_counter()
+        self.start_cpu = cpu_time()
+
+
+    def add(self, name: str, wall: float, cpu: float, items: int = 1, calls: int = 1) -> None:
+        stage = self.stages.setdefault(name, {"calls": 0, "items": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        stage["calls"] += calls
+        stage["items"] += items
+        stage["wall_s"] += wall
+        stage["cpu_s"] += cpu
+
+
+    def add_document(self, document: str, wall: float, cpu: float, stages: dict = None) -> None:
+        self.documents.append([str(document), wall, cpu])
+        entry = (wall, len(self.documents), {"document": str(document), "wall_s": wall, "cpu_s": cpu, "stages": stages or {}})
+        if len(self.slowest) < self.slowest_count:
+            heapq.heappush(self.slowest, entry)
+        elif wall > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, entry)
+
+
+    def merge(self, state: dict, document: str) -> None:
+        """
+        Stages measured for one document in a worker (see run_timed).
+        """
+        for name, stage in state["stages"].items():
+            self.add(name, stage["wall_s"], stage["cpu_s"], stage["items"], stage["calls"])
+        self.add_document(document, state["wall_s"], state["cpu_s"], state["stages"])
+
+
+    def to_dict(self) -> dict:
+        return {
+            "command": self.command,
+            "wall_s": time.perf_counter() - self.start_wall,
+            "cpu_s": cpu_time() - self.start_cpu,
+            "stages": self.stages,
+            "slowest": [entry for _, _, entry in sorted(self.slowest, reverse=True)],
+            "documents": self.documents,
+        }
+
+
+    def save(self, filename: str) -> None:
+        with open(filename, "w", encoding="utf-8") as stream:
+            json.dump(self.to_dict(), stream, ensure_ascii=False, indent=1)
+
+
+    def summary(self) -> str:
+        lines = ["ETAP                          WYWOŁAŃ  POZYCJI   CZAS [s]    CPU [s]"]
+        for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]["wall_s"]):
+            lines.append(f"{name:28} {stage['calls']:>8} {stage['items']:>8} {stage['wall_s']:>10.3f} {stage['cpu_s']:>10.3f}")
+        return "\n".join(lines)
+
+
+def current() -> Metrics:
+    return getattr(_local, "metrics", None)
+
+
+@contextmanager
+def stage(name: str, items: int = 1):
+    """
+    Measures the enclosed code as a stage of the current Metrics; does nothing when metrics are off.
+    CPU time of a stage is of this process only, child processes are counted per document.
+    """
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start_wall, time.process_time() - start_cpu, items)
+
+
+@contextmanager
+def document(name: str):
+    """
+    Measures the enclosed code as one document of the current Metrics; does nothing when metrics are off.
+    """
+    metrics = current()
+    if metrics is None:
+        yield
+        return
+    start_wall, start_cpu = time.perf_counter(), cpu_time()
+    try:
+        yield
+    finally:
+        metrics.add_document(name, time.perf_counter() - start_wall, cpu_time() - start_cpu)
+
+
+def run_timed(function, item, profile: bool = False) -> tuple:
+    """
+    Calls function(item) with its own Metrics (in a pool worker or in the main process).
+    Returns the result and the measured state, with cProfile statistics when profile is set.
+    """
+    previous = current()
+    _local.metrics = Metrics()
+    # The thread running the main profile is already profiled, a second profiler would replace it.
+    profile = profile and (os.getpid(), threading.get_ident()) != _profiler_owner
+    profiler = cProfile.Profile() if profile else None
+    start_wall, start_cpu = time.perf_counter(), cpu_time()
+    try:
+        if profiler is not None:
+            result = profiler.runcall(function, item)
+        else:
+            result = function(item)
+        state = {"wall_s": time.perf_counter() - start_wall, "cpu_s": cpu_time() - start_cpu, "stages": _local.metrics.stages}
+    finally:
+        _local.metrics = previous
+    if profiler is not None:
+        profiler.create_stats()
+        state["profile"] = profiler.stats
+    return result, state
+
+
+def _call(function, item) -> tuple:
+    return function(item), None
+
+
+def worker(function):
+    """
+    Function for pool.map or a direct call: returns (result, state), state is None when metrics are off.
+    Results are passed to collect.
+    """
+    if current() is None:
+        return functools.partial(_call, function)
+    return functools.partial(run_timed, function, profile=_profiler is not None)
+
+
+def collect(output: tuple, document: str):
+    result, state = output
+    if state is not None:
+        if "profile" in state:
+            _profiler.add(state.pop("profile"))
+        current().merge(state, document)
+    return result
+
+
+class StatsHolder():
+    """
+    cProfile statistics received from a worker, in the form accepted by pstats.Stats.
+    """
+
+    def __init__(self, stats: dict) -> None:
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class Profiler():
+    """
+    cProfile of the main process merged with statistics of documents profiled in workers.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.profile = cProfile.Profile()
+        self.worker_stats = []
+
+
+    def add(self, stats: dict) -> None:
+        self.worker_stats.append(StatsHolder(stats))
+
+
+    def save(self) -> None:
+        stats = pstats.Stats(self.profile)
+        for worker_stats in self.worker_stats:
+            stats.add(worker_stats)
+        stats.dump_stats(self.filename)
+
+
+def instrumented(command: str):
+    """
+    Adds --metrics FILE and --profile FILE options to a click command. Stages of the command
+    are measured when either is given; the trace is saved as json, the profile in pstats format.
+    """
+    def decorator(function):
+        @click.option("--metrics", "metrics_file", default=None, help="Plik json z czasami etapów i dokumentów.")
+        @click.option("--profile", "profile_file", default=None, help="Plik z wynikiem cProfile (format pstats), również dla procesów roboczych.")
+        @functools.wraps(function)
+        def wrapper(*args, metrics_file: str = None, profile_file: str = None, **kwargs):
+            global _profiler, _profiler_owner
+            if metrics_file is None and profile_file is None:
+                return function(*args, **kwargs)
+            _local.metrics = Metrics(command)
+            _profiler = Profiler(profile_file) if profile_file else None
+            _profiler_owner = (os.getpid(), threading.get_ident())
+            try:
+                if _profiler is not None:
+                    return _profiler.profile.runcall(function, *args, **kwargs)
+                return function(*args, **kwargs)
+            finally:
+                metrics = current()
+                if metrics_file:
+                    metrics.save(metrics_file)
+                    print(f"Metryki zapisano w {metrics_file}.", file=sys.stderr)
+                print(metrics.summary(), file=sys.stderr)
+                if _profiler is not None:
+                    _profiler.save()
+                    print(f"Profil zapisano w {profile_file}.", file=sys.stderr)
+                _local.metrics = None
+                _profiler = None
+        return wrapper
+    return decorator
@@ -0,0 +1,126 @@
+from abc import ABC, abstractmethod
+import threading
+
+
+TESSERACT_LANG = "pol+osd"
+TESSERACT_OEM = 3
+TESSERACT_PSM = 6
+TESSERACT_CONFIG = f"--oem {TESSERACT_OEM} --psm {TESSERACT_PSM} -l {TESSERACT_LANG}"
+
+
+def words_to_text(data: dict) -> tuple:
+    """
+    Text and mean word confidence from the result of pytesseract.image_to_data (as a dict).
+    Words are joined by spaces within a line; entries without text (blocks, lines) are skipped.
+    """
+    lines = {}
+    confidences = []
+    for i, word in enumerate(data["text"]):
+        if not str(word).strip():
+            continue
+        key = (data["page_num"][i], data["block_num"][i], data["par_num"][i], data["line_num"][i])
+        lines.setdefault(key, []).append(str(word))
+        if float(data["conf"][i]) >= 0:
+            confidences.append(float(data["conf"][i]))
+    text = "".join(" ".join(words) + "\n" for words in lines.values())
+    return text, sum(confidences) / len(confidences) if confidences else 0.0
+
+
+class OCRBackend(ABC):
+    """
+    Interface of an OCR engine. The image is a single channel numpy array (uint8).
+    """
+    name = ""
+
+    @abstractmethod
+    def recognize(self, image, psm: int = TESSERACT_PSM) -> str:
+        pass
+
+
+    @abstractmethod
+    def recognize_with_confidence(self, image, psm: int = TESSERACT_PSM) -> tuple:
+        """
+        Text and mean word confidence (0..100) given by tesseract.
+        """
+
+
+    def close(self) -> None:
+        pass
+
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return True
+
+
+class PytesseractBackend(OCRBackend):
+    """
+    Starts a new tesseract process for every image (language models are loaded every time).
+    """
+    name = "pytesseract"
+
+    def recognize(self, image, psm: int = TESSERACT_PSM) -> str:
+        import pytesseract
+        config = f"--oem {TESSERACT_OEM} --psm {psm} -l {TESSERACT_LANG}"
+        return pytesseract.image_to_string(image, config=config)
+
+
+    def recognize_with_confidence(self, image, psm: int = TESSERACT_PSM) -> tuple:
+        import pytesseract
+        config = f"--oem {TESSERACT_OEM} --psm {psm} -l {TESSERACT_LANG}"
+        return words_to_text(pytesseract.image_to_data(image, config=config, output_type=pytesseract.Output.DICT))
+
+
+class TesserocrBackend(OCRBackend):
+    """
+    Keeps one initialised tesseract engine (tesserocr.PyTessBaseAPI) for the whole lifetime
+    of the worker, so language models are loaded only once.
+    """
+    name = "tesserocr"
+
+    def __init__(self) -> None:
+        import tesserocr
+        self.tesserocr = tesserocr
+        self.api = tesserocr.PyTessBaseAPI(lang=TESSERACT_LANG, oem=tesserocr.OEM(TESSERACT_OEM), psm=tesserocr.PSM(TESSERACT_PSM))
+
+
+    def recognize(self, image, psm: int = TESSERACT_PSM) -> str:
+        height, width = image.shape[:2]
+        self.api.SetPageSegMode(self.tesserocr.PSM(psm))
+        self.api.SetImageBytes(image.tobytes(), width, height, 1, width)
+        return self.api.GetUTF8Text()
+
+
+    def recognize_with_confidence(self, image, psm: int = TESSERACT_PSM) -> tuple:
+        text = self.recognize(image, psm)
+        return text, float(self.api.MeanTextConf())
+
+
+    def close(self) -> None:
+        self.api.End()
+
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            import tesserocr
+        except ImportError:
+            return False
+        return True
+
+
+BACKENDS = {backend.name: backend for backend in (PytesseractBackend, TesserocrBackend)}
+
+_workers = threading.local()
+
+
+def get_backend(name: str) -> OCRBackend:
+    """
+    Returns the engine of the current worker (thread or process), creating it on first use.
+    """
+    backends = getattr(_workers, "backends", None)
+    if backends is None:
+        backends = _workers.backends = {}
+    if name not in backends:
+        backends[name] = BACKENDS[name]()
+    return backends[name]
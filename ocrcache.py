@@ -0,0 +1,106 @@
+import hashlib
+import os
+import tempfile
+
+from globals import RW_TEMP_FOLDER
+
+
+OCR_CACHE_FOLDER = os.path.join(RW_TEMP_FOLDER, "ocr_cache/")
+DEFAULT_CACHE_SIZE_MB = 512
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def get_cache_key(image_bytes: bytes, params: str) -> str:
+    """
+    Key of a cached OCR result: hash of the scan content combined with every parameter
+    which changes the recognised text (preprocessing and tesseract settings).
+    """
+    return hash_bytes(hash_bytes(image_bytes).encode() + b"\0" + params.encode())
+
+
+class OCRCache():
+    """
+    Persistent OCR results kept as text files in RW_TEMP_FOLDER, one file per key.
+    Files are written atomically, so the cache can be shared by many worker processes.
+    """
+
+    def __init__(self, folder: str = OCR_CACHE_FOLDER, max_size_mb: int = DEFAULT_CACHE_SIZE_MB) -> None:
+        self.folder = folder
+        self.max_size = max_size_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+
+    def get_entry_name(self, key: str) -> str:
+        return os.path.join(self.folder, key[:2], key + ".txt")
+
+
+    def get(self, key: str) -> str:
+        filename = self.get_entry_name(key)
+        try:
+            with open(filename, "r", encoding="utf-8") as stream:
+                text = stream.read()
+            # Last use time is what the eviction is based on. The entry may have been
+            # evicted by another process in the meantime, which counts as a miss.
+            os.utime(filename)
+        except OSError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+
+    def put(self, key: str, text: str) -> None:
+        filename = self.get_entry_name(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        # A unique temporary name for each writer, also for threads of one process.
+        handle, tmp_filename = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(filename))
+        try:
+            with os.fdopen(handle, "w", encoding="utf-8") as stream:
+                stream.write(text)
+            os.replace(tmp_filename, filename)
+        except OSError:
+            os.remove(tmp_filename)
+            raise
+
+
+    def entries(self) -> list:
+        result = []
+        if not os.path.isdir(self.folder):
+            return result
+        for sub_dir in os.scandir(self.folder):
+            if not sub_dir.is_dir():
+                continue
+            for entry in os.scandir(sub_dir.path):
+                if entry.name.endswith(".txt"):
+                    stat = entry.stat()
+                    result.append((stat.st_mtime, stat.st_size, entry.path))
+        return result
+
+
+    def evict(self) -> int:
+        """
+        Remove least recently used entries until the cache fits in max_size.
+        Returns number of removed entries.
+        """
+        entries = sorted(self.entries())
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_size -= size
+            removed += 1
+        return removed
+
+
+    def size(self) -> tuple:
+        entries = self.entries()
+        return len(entries), sum(size for _, size, _ in entries)
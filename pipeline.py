@@ -0,0 +1,273 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import os
+import queue
+import sys
+import threading
+import time
+
+import click
+
+from decodetxt2rw import compose_rw
+from docstore import get_files, get_json_file_name, save_json, test_and_touch_dir
+from globals import RW_JSON_FOLDER, \
+                    RW_RAW_INPUT_FOLDER, \
+                    RW_TXT_FOLDER, \
+                    WZ_JSON_FOLDER
+from layout import ROI_MODES
+from ocrbackend import BACKENDS
+from ocrcache import OCRCache
+from preprocess import TARGET_DPI
+from rwchecker import CompareSet, RWComparator, sort_compared_list
+from rwimage2txt import DEFAULT_BACKEND, get_available_cores, init_worker, recognize_file, save_txt
+
+
+DEFAULT_QUEUE_SIZE = 64
+PROVISIONAL_HEADER = "WYNIK WSTĘPNY (grupa może się jeszcze powiększyć o kolejne dokumenty RW)\n"
+SUPERSEDES_HEADER = "WYNIK OSTATECZNY, zastępuje wynik wstępny dla RW: {}\n"
+CONFIRMED_LINE = "Wynik wstępny dla WZ: {} i RW: {} jest ostateczny.\n"
+
+
+class StreamingChecker():
+    """
+    Reconciliation stage of the pipeline. RW documents arrive one by one; a group of linked
+    documents is printed as a provisional result as soon as its WZ and RW quantities match,
+    since a later RW may still link to one of its WZ. finish() gives every final group exactly
+    one final result: a confirmation of its provisional result, or its table, marked as
+    superseding the provisional results of the groups it grew from. RW documents processed
+    earlier (rw_data) complete the groups, but only groups with an RW of this run are printed.
+    """
+
+    def __init__(self, wz_data: dict, output=sys.stdout, rw_data: dict = None) -> None:
+        self.wz_data = wz_data
+        self.rw_data = {}
+        self.wz_references = {}
+        for rw_number, rw in (rw_data or {}).items():
+            self.rw_data[rw_number] = rw
+            for wz_num in rw["WZ_documents"]:
+                self.wz_references.setdefault(wz_num, set()).add(rw_number)
+        self.batch = set()
+        self.emitted = {}
+        self.output = output
+        self.first_result_time = None
+
+
+    def add_rw(self, rw: dict) -> None:
+        rw_number = rw["RW_document"]
+        # A document read again replaces the earlier one, also in its links to WZ.
+        for wz_num in self.rw_data.get(rw_number, {}).get("WZ_documents", []):
+            self.wz_references[wz_num].discard(rw_number)
+        self.batch.add(rw_number)
+        self.rw_data[rw_number] = {
+            "DWS_documents": rw["DWS_documents"],
+            "WZ_documents": rw["WZ_documents"],
+            "items": rw["items"],
+        }
+        for wz_num in rw["WZ_documents"]:
+            self.wz_references.setdefault(wz_num, set()).add(rw_number)
+        group = self.get_group(rw_number)
+        if group is None:
+            return
+        compare_set = CompareSet(group[0], group[1], self.wz_data, self.rw_data)
+        if compare_set.is_matching():
+            self.emit(group, compare_set)
+
+
+    def get_group(self, rw_number: str):
+        wz_group, rw_group = set(), {rw_number}
+        pending = [rw_number]
+        while pending:
+            rw = pending.pop()
+            for wz in self.rw_data[rw]["WZ_documents"]:
+                if wz in wz_group:
+                    continue
+                wz_group.add(wz)
+                for linked_rw in self.wz_references.get(wz, ()):
+                    if linked_rw not in rw_group:
+                        rw_group.add(linked_rw)
+                        pending.append(linked_rw)
+        if not wz_group:
+            return None
+        return sorted(wz_group), sorted(rw_group)
+
+
+    def emit(self, group: tuple, compare_set: CompareSet) -> None:
+        key = (tuple(sorted(group[0])), tuple(sorted(group[1])))
+        self.emitted[key] = set(key[1])
+        if self.first_result_time is None:
+            self.first_result_time = time.perf_counter()
+        print(PROVISIONAL_HEADER + compare_set.compare(), file=self.output, flush=True)
+
+
+    def finish(self) -> None:
+        comparator = RWComparator([], [])
+        comparator.rw_data = self.rw_data
+        comparator.wz_data = self.wz_data
+        comparator.get_dependencies()
+        remaining = []
+        for wz_list, rw_list in comparator.references:
+            if self.batch.isdisjoint(rw_list):
+                continue
+            key = (tuple(sorted(wz_list)), tuple(sorted(rw_list)))
+            if key in self.emitted:
+                print(CONFIRMED_LINE.format(", ".join(key[0]), ", ".join(key[1])), file=self.output)
+            else:
+                remaining.append(CompareSet(wz_list, rw_list, self.wz_data, self.rw_data))
+        for compare_set in sort_compared_list(remaining):
+            if self.first_result_time is None:
+                self.first_result_time = time.perf_counter()
+            rw_group = set(compare_set.get_rw_dict()["RW_numbers"])
+            # Groups only grow, so a superseded provisional group is a part of a final one.
+            superseded = sorted(rw for rw_set in self.emitted.values() if rw_set <= rw_group for rw in rw_set)
+            header = SUPERSEDES_HEADER.format(", ".join(superseded)) if superseded else ""
+            print(header + compare_set.compare(), file=self.output, flush=True)
+
+
+def ocr_stage(input_files: list, pool: ProcessPoolExecutor, worker, text_queue: queue.Queue, slots: threading.Semaphore,
+              stop: threading.Event, errors: list) -> None:
+    """
+    Submits scans to the pool. At most `slots` recognised but not yet decoded pages are held at once.
+    Always ends with (None, number of submitted scans), also when the pool broke or decoding stopped.
+    """
+    submitted = 0
+    try:
+        for filename in input_files:
+            slots.acquire()
+            if stop.is_set():
+                break
+            future = pool.submit(worker, filename)
+            submitted += 1
+            future.add_done_callback(lambda f, fn=filename: text_queue.put((fn, f)))
+    except Exception as e:
+        errors.append(e)
+    finally:
+        text_queue.put((None, submitted))
+
+
+def decode_stage(text_queue: queue.Queue, rw_queue: queue.Queue, slots: threading.Semaphore, stop: threading.Event,
+                 write_txt: bool, write_json: bool, failed: list, errors: list) -> None:
+    """
+    Decodes recognised pages until all scans submitted by ocr_stage are received. Always ends with None.
+    """
+    received, submitted = 0, None
+    try:
+        while submitted is None or received < submitted:
+            filename, future = text_queue.get()
+            if filename is None:
+                submitted = future
+                continue
+            received += 1
+            slots.release()
+            try:
+                status, text = future.result()
+            except Exception as e:
+                failed.append((filename, f"błąd OCR: {e}"))
+                continue
+            if not text:
+                failed.append((filename, "brak tekstu"))
+                continue
+            if write_txt:
+                save_txt(filename, text)
+            rw = compose_rw(text)
+            if rw["RW_document"] is None:
+                failed.append((filename, "brak numeru RW"))
+                continue
+            if write_json:
+                save_json(rw, get_json_file_name(RW_JSON_FOLDER, rw["RW_document"]))
+            rw_queue.put(rw)
+    except Exception as e:
+        errors.append(e)
+        # ocr_stage may wait for a free slot, which would never be released.
+        stop.set()
+        slots.release()
+    finally:
+        rw_queue.put(None)
+
+
+def load_documents() -> tuple:
+    """
+    WZ documents and RW documents saved by earlier runs, from WZ_json and RW_json.
+    """
+    comparator = RWComparator(get_files(os.path.join(WZ_JSON_FOLDER, "*.json")), get_files(os.path.join(RW_JSON_FOLDER, "*.json")))
+    comparator.load_wz_data()
+    comparator.load_rw_data()
+    return comparator.wz_data, comparator.rw_data
+
+
+@click.command()
+@click.option("--workers", "-w", type=click.IntRange(min=1), default=None, help="Liczba procesów OCR (domyślnie liczba dostępnych rdzeni).")
+@click.option("--tesseract-threads", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba wątków OpenMP tesseracta na jeden proces roboczy.")
+@click.option("--backend", "-b", type=click.Choice(list(BACKENDS)), show_default=True, default=DEFAULT_BACKEND, help="Silnik OCR.")
+@click.option("--roi", type=click.Choice(ROI_MODES), show_default=True, default="off", help="Rozpoznawanie tylko wybranych obszarów strony.")
+@click.option("--dpi", "target_dpi", type=click.IntRange(min=0), show_default=True, default=TARGET_DPI, help="Rozdzielczość, do której sprowadzane są skany przed OCR.")
+@click.option("--cache/--no-cache", "use_cache", show_default=True, default=True, help="Używa pamięci podręcznej wyników OCR.")
+@click.option("--queue-size", type=click.IntRange(min=1), show_default=True, default=DEFAULT_QUEUE_SIZE, help="Maksymalna liczba dokumentów oczekujących pomiędzy etapami.")
+@click.option("--write-txt", is_flag=True, default=False, help="Zapisuje wyniki OCR do katalogu RW_txt.")
+@click.option("--write-json", is_flag=True, default=False, help="Zapisuje dokumenty RW do katalogu RW_json.")
+@click.argument("filenames", nargs=-1, required=False)
+def main(workers: int, tesseract_threads: int, backend: str, roi: str, target_dpi: int, use_cache: bool,
+         queue_size: int, write_txt: bool, write_json: bool, filenames: list):
+    """
+    Program przetwarza zeskanowane dokumenty RW od obrazu do wyniku porównania z WZ w jednym przebiegu
+    (rwimage2txt -> decodetxt2rw -> rwchecker), bez plików pośrednich.
+    Dokumenty WZ wczytywane są z podkatalogu WZ_json, wcześniej odczytane dokumenty RW z podkatalogu RW_json;
+    wyświetlane są tylko grupy zawierające dokumenty RW z przetwarzanych skanów. Grupy dokumentów zgodnych wyświetlane są od razu jako wyniki wstępne;
+    po zakończeniu przetwarzania wszystkich skanów każda grupa otrzymuje jeden wynik ostateczny
+    (potwierdzenie wyniku wstępnego lub tabelę zastępującą wyniki wstępne).\n
+    Przykład:\n
+    >python pipeline.py       <- przetwarza wszystkie pliki z podkatalogu RW_jpeg\n
+    >python pipeline.py --write-json RW_jpeg/Scan_00*.jpg   <- przetwarza wybrane pliki i zapisuje dokumenty RW.\n
+    v1.0.0
+    """
+    if len(filenames) > 0:
+        input_files = []
+        for filename in filenames:
+            input_files.extend(get_files(filename))
+    else:
+        test_and_touch_dir(RW_RAW_INPUT_FOLDER)
+        input_files = get_files(os.path.join(RW_RAW_INPUT_FOLDER, "*.jp*g"))
+    if not BACKENDS[backend].is_available():
+        print(f"Silnik OCR {backend} nie jest zainstalowany.")
+        sys.exit(1)
+    if write_txt:
+        test_and_touch_dir(RW_TXT_FOLDER)
+    if write_json:
+        test_and_touch_dir(RW_JSON_FOLDER)
+    start = time.perf_counter()
+    wz_data, rw_data = load_documents()
+    checker = StreamingChecker(wz_data, rw_data=rw_data)
+    worker = partial(recognize_file, cache=OCRCache() if use_cache else None, backend=backend, roi=roi, target_dpi=target_dpi)
+    text_queue = queue.Queue()
+    rw_queue = queue.Queue(maxsize=queue_size)
+    slots = threading.Semaphore(queue_size)
+    stop = threading.Event()
+    failed = []
+    errors = []
+    with ProcessPoolExecutor(max_workers=workers or get_available_cores(), initializer=init_worker, initargs=(tesseract_threads,)) as pool:
+        stages = [
+            threading.Thread(target=ocr_stage, args=(input_files, pool, worker, text_queue, slots, stop, errors), daemon=True),
+            threading.Thread(target=decode_stage, args=(text_queue, rw_queue, slots, stop, write_txt, write_json, failed, errors), daemon=True),
+        ]
+        for stage in stages:
+            stage.start()
+        rw = rw_queue.get()
+        while rw is not None:
+            checker.add_rw(rw)
+            rw = rw_queue.get()
+        for stage in stages:
+            stage.join()
+    for filename, reason in failed:
+        print(f"Nie przetworzono pliku {filename}: {reason}", file=sys.stderr)
+    if errors:
+        # Results of an interrupted run are incomplete, so no group gets a final result.
+        print(f"Przetwarzanie przerwane: {errors[0]!r}", file=sys.stderr)
+        sys.exit(1)
+    checker.finish()
+    elapsed = time.perf_counter() - start
+    first = f"{checker.first_result_time - start:.1f} s" if checker.first_result_time else "-"
+    print(f"Zakończono. Obrazów: {len(input_files)}, dokumentów RW: {len(checker.batch)}, czas: {elapsed:.1f} s, "
+          f"pierwszy wynik po: {first}.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
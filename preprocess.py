@@ -0,0 +1,97 @@
+import struct
+
+import cv2
+import numpy as np
+
+
+TARGET_DPI = 300
+A4_INCHES = (8.27, 11.69)
+HORIZONTAL_KERNEL_SIZE = (30, 1)
+HORIZONTAL_ITERATIONS = 2
+HORIZONTAL_LINE_THICKNESS = 6
+
+REDUCED_GRAYSCALE_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+
+def get_jpeg_dpi(raw: bytes) -> int:
+    """
+    Horizontal density from the JFIF (APP0) header of a JPEG file, 0 when unknown.
+    """
+    if raw[:4] != b"\xff\xd8\xff\xe0" or raw[6:11] != b"JFIF\0":
+        return 0
+    units = raw[13]
+    density = struct.unpack(">H", raw[14:16])[0]
+    if units == 1:
+        return density
+    if units == 2:
+        return round(density * 2.54)
+    return 0
+
+
+def get_preprocess_params(target_dpi: int = TARGET_DPI) -> str:
+    return f"dpi={target_dpi}|{HORIZONTAL_KERNEL_SIZE}|{HORIZONTAL_ITERATIONS}|{HORIZONTAL_LINE_THICKNESS}"
+
+
+def decode_grey(raw: bytes, target_dpi: int = TARGET_DPI, source_dpi: int = 0):
+    """
+    Decodes a scan straight to greyscale and brings it to target_dpi. Whole reduction steps
+    (1/2, 1/4, 1/8) are done by the JPEG decoder itself, the rest by a single resize.
+    Pages of unknown resolution are left as they are.
+    """
+    buffer = np.frombuffer(raw, dtype=np.uint8)
+    source_dpi = source_dpi or get_jpeg_dpi(raw)
+    if not source_dpi or not target_dpi:
+        return cv2.imdecode(buffer, cv2.IMREAD_GRAYSCALE)
+    reduction = 1
+    while reduction * 2 in REDUCED_GRAYSCALE_FLAGS and source_dpi / (reduction * 2) >= target_dpi:
+        reduction *= 2
+    grey = cv2.imdecode(buffer, REDUCED_GRAYSCALE_FLAGS[reduction])
+    if grey is None:
+        return None
+    scale = target_dpi * reduction / source_dpi
+    if abs(scale - 1) > 0.02:
+        interpolation = cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR
+        grey = cv2.resize(grey, None, fx=scale, fy=scale, interpolation=interpolation)
+    return grey
+
+
+def binarize_inv(grey):
+    """
+    Otsu thresholding, done in place: white text on black background.
+    """
+    cv2.threshold(grey, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU, dst=grey)
+    return grey
+
+
+def detect_rulings(thresh):
+    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, HORIZONTAL_KERNEL_SIZE)
+    return cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=HORIZONTAL_ITERATIONS)
+
+
+def erase_rulings(thresh, detected_lines):
+    """
+    Erases detected lines with a margin of HORIZONTAL_LINE_THICKNESS / 2 pixels using a single
+    dilated mask instead of drawing every contour separately. Modifies thresh in place.
+    """
+    size = HORIZONTAL_LINE_THICKNESS + 1
+    mask = cv2.dilate(detected_lines, cv2.getStructuringElement(cv2.MORPH_RECT, (size, size)))
+    cv2.subtract(thresh, mask, dst=thresh)
+    return thresh
+
+
+def prepare_page(grey) -> tuple:
+    """
+    Full preprocessing of a greyscale page, done in place on the given array.
+    Returns page ready for OCR (black text on white, rulings removed) and the mask of detected rulings.
+    """
+    thresh = binarize_inv(grey)
+    detected_lines = detect_rulings(thresh)
+    erase_rulings(thresh, detected_lines)
+    # The page is binary already, so the second thresholding is a plain inversion.
+    cv2.bitwise_not(thresh, dst=thresh)
+    return thresh, detected_lines
@@ -0,0 +1,170 @@
+from abc import ABC, abstractmethod
+import csv
+import json
+import sys
+
+
+REPORT_FORMATS = ["text", "csv", "jsonl", "xlsx"]
+COLUMNS = ["DWSygn", "WZ", "RW", "STATUS", "INDEX", "ILOŚĆ (WZ)", "ILOŚĆ (RW)", "NAZWA TOWARU"]
+
+
+def text_lines(compare_set):
+    """
+    Lines of the text table of one group of documents (CompareSet).
+    """
+    yield "{:*<150}\n".format("")
+    yield "WZ-ty  : " + str(compare_set.wz_dict["WZ_numbers"]) + "\n"
+    yield "DWSygn : " + str(compare_set.wz_dict["DWS_numbers"]) + "\n"
+    yield "RW     : " + str(compare_set.rw_dict["RW_numbers"]) + "\n"
+    yield "{:-<150}\n".format("")
+    yield " STATUS   INDEX   ILOŚĆ (WZ)  ILOŚĆ (RW)  NAZWA TOWARU\n"
+    yield "{:-<150}\n".format("")
+    for row in compare_set.rows():
+        yield "{0:^7}  {1:>6}   {2:>10}  {3:>10}  {4}\n".format(*row)
+    yield "{:-<150}\n{:*<150}\n\n".format("","")
+
+
+def group_columns(compare_set) -> list:
+    return [
+        ", ".join(compare_set.wz_dict["DWS_numbers"]),
+        ", ".join(compare_set.wz_dict["WZ_numbers"]),
+        ", ".join(compare_set.rw_dict["RW_numbers"]),
+    ]
+
+
+class GroupResult():
+    """
+    Compared rows of one group of documents with the interface of CompareSet used by report writers.
+    """
+
+    def __init__(self, wz_numbers: list, dws_numbers: list, rw_numbers: list, rows: list) -> None:
+        self.wz_dict = {"WZ_numbers": wz_numbers, "DWS_numbers": dws_numbers}
+        self.rw_dict = {"RW_numbers": rw_numbers}
+        self.row_list = rows
+
+
+    @classmethod
+    def from_compare_set(cls, compare_set) -> "GroupResult":
+        return cls(compare_set.wz_dict["WZ_numbers"], compare_set.wz_dict["DWS_numbers"],
+                   compare_set.rw_dict["RW_numbers"], list(compare_set.rows()))
+
+
+    def rows(self):
+        return iter(self.row_list)
+
+
+    def is_matching(self) -> bool:
+        if len(self.wz_dict["DWS_numbers"]) < len(self.wz_dict["WZ_numbers"]):
+            return False
+        return all(row[0] == "OK" for row in self.row_list)
+
+
+class ReportWriter(ABC):
+    """
+    Writes comparison results group by group, as soon as each group is compared.
+    """
+
+    def __init__(self, output: str) -> None:
+        self.output = output
+        self.stream = self.open_stream(output)
+
+
+    def open_stream(self, output: str):
+        if output == "-":
+            return sys.stdout
+        return open(output, "w", encoding="utf-8", newline="")
+
+
+    @abstractmethod
+    def write_group(self, compare_set) -> None:
+        pass
+
+
+    def close(self) -> None:
+        if self.stream is not sys.stdout:
+            self.stream.close()
+        else:
+            self.stream.flush()
+
+
+class TextReportWriter(ReportWriter):
+    """
+    The original table format of rwchecker.
+    """
+
+    def write_group(self, compare_set) -> None:
+        self.stream.writelines(text_lines(compare_set))
+        self.stream.write("\n")
+
+
+class CsvReportWriter(ReportWriter):
+    """
+    One line per item of every group; document numbers are repeated in each line.
+    """
+
+    def __init__(self, output: str) -> None:
+        super().__init__(output)
+        self.writer = csv.writer(self.stream)
+        self.writer.writerow(COLUMNS)
+
+
+    def write_group(self, compare_set) -> None:
+        documents = group_columns(compare_set)
+        self.writer.writerows(documents + list(row) for row in compare_set.rows())
+
+
+class JsonLinesReportWriter(ReportWriter):
+    """
+    One json object per group of documents.
+    """
+
+    def write_group(self, compare_set) -> None:
+        group = {
+            "WZ_numbers": compare_set.wz_dict["WZ_numbers"],
+            "DWS_numbers": compare_set.wz_dict["DWS_numbers"],
+            "RW_numbers": compare_set.rw_dict["RW_numbers"],
+            "items": [
+                {"status": status, "index": index, "wz_quantity": wz_quantity, "rw_quantity": rw_quantity, "name": name}
+                for status, index, wz_quantity, rw_quantity, name in compare_set.rows()
+            ],
+        }
+        self.stream.write(json.dumps(group, ensure_ascii=False) + "\n")
+
+
+class XlsxReportWriter(ReportWriter):
+    """
+    Same layout as csv, written with xlsxwriter in constant memory mode (rows are flushed to disk).
+    """
+
+    def open_stream(self, output: str):
+        if output == "-":
+            raise ValueError("Format xlsx wymaga podania pliku wyjściowego (--output).")
+        import xlsxwriter
+        self.workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+        self.sheet = self.workbook.add_worksheet("Porównanie")
+        self.sheet.write_row(0, 0, COLUMNS)
+        self.row_number = 1
+        return None
+
+
+    def write_group(self, compare_set) -> None:
+        documents = group_columns(compare_set)
+        for row in compare_set.rows():
+            self.sheet.write_row(self.row_number, 0, documents + list(row))
+            self.row_number += 1
+
+
+    def close(self) -> None:
+        self.workbook.close()
+
+
+REPORT_WRITERS = {
+    "text": TextReportWriter,
+    "csv": CsvReportWriter,
+    "jsonl": JsonLinesReportWriter,
+    "xlsx": XlsxReportWriter,
+}
+
+
+def open_report_writer(report_format: str = "text", output: str = "-") -> ReportWriter:
+    return REPORT_WRITERS[report_format](output)
@@ -1,10 +1,19 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
 import json
 import os
+import sys
 
 import click
-from decodetxt2rw import get_files
-from globals import RW_JSON_FOLDER, \
+import docstore
+from docstore import get_files
+import groupcache
+import metrics
+from globals import RW_DB_FILE, \
+                    RW_JSON_FOLDER, \
                     WZ_JSON_FOLDER
+from reportwriter import REPORT_FORMATS, GroupResult, open_report_writer, text_lines
 
 
 OUTPUT_FOLDER = "compare_result/"
@@ -45,35 +54,35 @@ class CompareSet():
                 self.rw_dict["items"][item["index"]] = self.rw_dict["items"].get(item["index"], int(0)) + item["quantity"]
 
 
+    def rows(self):
+        """
+        Compared items: (status, index, WZ quantity, RW quantity, item name), ordered by index.
+        """
+        indexes = set(self.wz_dict["items"]) | set(self.rw_dict["items"])
+        for i in sorted(indexes):
+            rw_quantity = self.rw_dict["items"].get(i,0)
+            wz_item = self.wz_dict["items"].get(i)
+            if wz_item is None:
+                yield "RÓŻNICA", i, 0, rw_quantity, ""
+            else:
+                status = "OK" if wz_item["quantity"] == rw_quantity else "RÓŻNICA"
+                yield status, i, wz_item["quantity"], rw_quantity, wz_item["name"]
+
+
     def compare(self) -> str:
-        self.comparision_result = "{:*<150}\n".format("")
-        self.comparision_result += ("WZ-ty  : " + str(self.wz_dict["WZ_numbers"]) + "\n")
-        self.comparision_result += ("DWSygn : " + str(self.wz_dict["DWS_numbers"]) + "\n")
-        self.comparision_result += ("RW     : " + str(self.rw_dict["RW_numbers"]) + "\n")
-        self.comparision_result += "{:-<150}\n".format("")
-        self.comparision_result += " STATUS   INDEX   ILOŚĆ (WZ)  ILOŚĆ (RW)  NAZWA TOWARU\n"
-        self.comparision_result += "{:-<150}\n".format("")
-        indexes = set(list(self.wz_dict["items"].keys()) + list(self.rw_dict["items"].keys()))
-        for i in indexes:
-            try:
-                rw_quantity = self.rw_dict["items"].get(i,0)
-                wz_quantity = self.wz_dict["items"][i]["quantity"]
-                if wz_quantity == rw_quantity:
-                    status = "OK"
-                else:
-                    status = "RÓŻNICA"
-                name = self.wz_dict["items"][i]["name"]
-            except KeyError:
-                status = "RÓŻNICA"
-                wz_quantity = 0
-                name = ""   
-            self.comparision_result += "{0:^7}  {1:>6}   {2:>10}  {3:>10}  {4}\n".format(
-                status, i, wz_quantity, rw_quantity, name
-            )
-        self.comparision_result += "{:-<150}\n{:*<150}\n\n".format("","")
+        self.comparision_result = "".join(text_lines(self))
         return self.comparision_result
 
 
+    def is_matching(self) -> bool:
+        """
+        True when every WZ has been found and all quantities of WZ and RW items are equal.
+        """
+        if len(self.wz_dict["DWS_numbers"]) < len(self.wz_dict["WZ_numbers"]):
+            return False
+        return all(row[0] == "OK" for row in self.rows())
+
+
     def get_wz_dict(self) -> dict:   
         return self.wz_dict
 
@@ -86,6 +95,34 @@ class CompareSet():
         return json.dumps([self.wz_dict, self.rw_dict], indent=2)
 
 
+class DisjointSet():
+    """
+    Union-find over integers 0..size-1 with union by size and path halving.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.parent = list(range(size))
+        self.size = [1] * size
+
+
+    def find(self, x: int) -> int:
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+
+    def union(self, a: int, b: int) -> None:
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+
 class RWComparator():
     
     def __init__(self, wz_filenames: list, rw_filenames: list) -> None:
@@ -97,18 +134,19 @@ class RWComparator():
         self.rw_data = {}
         for fn in self.rw_filenames:
             item = RWComparator.load_json(fn)
-            self.rw_data[item.get("RW_document","Rw/unknown")] = {
-                "DWS_documents" : item.get("DWS_documents",[]),
-                "WZ_documents" : item.get("WZ_documents", []), 
-                "items" : item.get("items",[])
-            }
+            self.rw_data[item.get("RW_document","Rw/unknown")] = docstore.rw_entry(item)
         
 
     def load_wz_data(self):
         self.wz_data = {}
         for fn in self.wz_filenames:
             item = RWComparator.load_json(fn)
-            self.wz_data[item.get("WZ_number","000/00")] = {"DWS_number": item.get("DWS_number",[]), "items" : item.get("items",[])}
+            self.wz_data[item.get("WZ_number","000/00")] = docstore.wz_entry(item)
+
+
+    def load_from_store(self, store: docstore.DocumentStore) -> None:
+        self.rw_data = store.load_rw_data()
+        self.wz_data = store.load_wz_data()
 
 
     def generate_WZ_references(self) -> None:
@@ -135,34 +173,34 @@ class RWComparator():
 
 
     def get_dependencies(self):
+        """
+        Group WZ and RW documents linked by references (connected components), using
+        a disjoint-set structure. Groups are ordered by their first WZ in wz_references,
+        documents within a group by order of wz_references and rw_data.
+        """
         self.generate_RW_references()
         self.generate_WZ_references()
-        self.references = [self.aggregate_indexes(wz) for wz in self.wz_references if not self.wz_references[wz]["checked"]]
-
-
-    def aggregate_indexes(self, wz_num: str) -> list:
-        result_WZ_list = [wz_num]
-        self.wz_references[wz_num]["checked"] = True
-        tmp_RW_set = {rw for rw in self.wz_references[wz_num]["items"] if not self.rw_references[rw]["checked"]}
-        result_RW_list = list(tmp_RW_set)
-        for rw in tmp_RW_set:
-            self.rw_references[rw]["checked"] = True
-            tmp_WZ_set = {wz for wz in self.rw_references[rw]["items"] if not self.wz_references[wz]["checked"]}
-            for wz in tmp_WZ_set:
-                [wz_res, rw_res] = self.aggregate_indexes(wz)
-                result_WZ_list.extend(wz_res)
-                result_RW_list.extend(rw_res)
-        return [result_WZ_list, result_RW_list]
+        wz_ids = {wz: i for i, wz in enumerate(self.wz_references)}
+        rw_offset = len(wz_ids)
+        sets = DisjointSet(rw_offset + len(self.rw_references))
+        for j, (rw, rw_refs) in enumerate(self.rw_references.items()):
+            for wz in rw_refs["items"]:
+                sets.union(rw_offset + j, wz_ids[wz])
+        groups = {}
+        for wz, i in wz_ids.items():
+            groups.setdefault(sets.find(i), [[], []])[0].append(wz)
+            self.wz_references[wz]["checked"] = True
+        for j, rw in enumerate(self.rw_references):
+            group = groups.get(sets.find(rw_offset + j))
+            if group is not None:
+                group[1].append(rw)
+                self.rw_references[rw]["checked"] = True
+        self.references = list(groups.values())
 
 
     @classmethod
     def load_json(cls, filename: str) -> dict:
-        try:
-            with open(filename, "r", encoding="UTF-8") as stream:
-                output = json.load(stream)
-        except:
-            output = {}
-        return output
+        return docstore.load_json(filename)
 
 
     def print_references(self) -> None:
@@ -184,26 +222,177 @@ def sort_compared_list(c_list: list) -> list:
     return sorted(c_list, key=lambda c_obj: c_obj.wz_dict["DWS_numbers"])
 
 
+def get_dws_sort_key(wz_list: list, wz_data: dict) -> list:
+    """
+    Same key as used by sort_compared_list, computed without composing the CompareSet.
+    """
+    return sorted(wz_data[wz]["DWS_number"] for wz in wz_list if wz in wz_data)
+
+
+def sort_references(references: list, wz_data: dict) -> list:
+    return sorted(references, key=lambda ref: get_dws_sort_key(ref[0], wz_data))
+
+
+ENGINES = ["objects", "columnar"]
+
+
+def get_group_cache_file(store_kind: str, db_file: str) -> str:
+    if store_kind == "sqlite":
+        return db_file + ".groups.json"
+    return groupcache.GROUP_CACHE_FILE
+
+
+def make_chunk(references: list, wz_data: dict, rw_data: dict) -> tuple:
+    """
+    Groups of a chunk together with only the documents they need.
+    """
+    chunk_wz_data = {wz: wz_data[wz] for wz_list, _ in references for wz in wz_list if wz in wz_data}
+    chunk_rw_data = {rw: rw_data[rw] for _, rw_list in references for rw in rw_list}
+    return references, chunk_wz_data, chunk_rw_data
+
+
+def compare_chunk(chunk: tuple) -> list:
+    references, wz_data, rw_data = chunk
+    return [GroupResult.from_compare_set(CompareSet(wz_list, rw_list, wz_data, rw_data)) for wz_list, rw_list in references]
+
+
+def compare_in_pool(references: list, wz_data: dict, rw_data: dict, jobs: int, chunk_size: int = 0):
+    """
+    Compare groups in a process pool, chunk by chunk, yielding results in order of references.
+    At most 2 chunks per process are in flight, so documents are not copied all at once.
+    """
+    if chunk_size <= 0:
+        chunk_size = max(len(references) // (jobs * 4), 1)
+    groups = iter(references)
+    chunks = iter(lambda: list(islice(groups, chunk_size)), [])
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        pending = deque(pool.submit(compare_chunk, make_chunk(chunk, wz_data, rw_data)) for chunk in islice(chunks, jobs * 2))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in islice(chunks, 1):
+                pending.append(pool.submit(compare_chunk, make_chunk(chunk, wz_data, rw_data)))
+            yield from results
+
+
+def compare_columnar(db_file: str, verify: bool) -> tuple:
+    """
+    Groups and results of the columnar engine; with verify, checked against RWComparator and CompareSet.
+    """
+    import columnar
+    store = docstore.SQLiteStore(db_file)
+    with metrics.stage("compare_columnar"):
+        references, results = columnar.compare_groups(store.connection)
+    if verify:
+        with metrics.stage("verify"):
+            comparator = RWComparator([], [])
+            comparator.load_from_store(store)
+            comparator.get_dependencies()
+            expected = [CompareSet(wz_list, rw_list, comparator.wz_data, comparator.rw_data)
+                        for wz_list, rw_list in sort_references(comparator.references, comparator.wz_data)]
+            differences = columnar.verify_groups(results, expected)
+    store.close()
+    if verify and differences:
+        for position in differences:
+            group = results[position] if position < len(results) else expected[position]
+            print(f"Różny wynik silnika columnar dla grupy WZ: {group.wz_dict['WZ_numbers']}", file=sys.stderr)
+        sys.exit(1)
+    return references, results
+
+
+def write_report(references: list, compared, report_format: str, output: str) -> None:
+    writer = open_report_writer(report_format, output)
+    compared = iter(compared)
+    for wz_list, _ in references:
+        with metrics.document(min(wz_list)):
+            with metrics.stage("compare"):
+                compare_set = next(compared)
+            with metrics.stage("write"):
+                writer.write_group(compare_set)
+    writer.close()
+
+
 @click.command()
-def main():
+@click.option("--store", "store_kind", type=click.Choice(docstore.STORE_KINDS), show_default=True, default="files", help="Źródło dokumentów: pliki w katalogach RW_json i WZ_json lub baza SQLite.")
+@click.option("--db", "db_file", show_default=True, default=RW_DB_FILE, help="Plik bazy SQLite (dla --store sqlite).")
+@click.option("--format", "-f", "report_format", type=click.Choice(REPORT_FORMATS), show_default=True, default="text", help="Format wyniku porównania.")
+@click.option("--output", "-o", show_default=True, default="-", help="Plik wynikowy (- oznacza standardowe wyjście).")
+@click.option("--jobs", "-j", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba procesów porównujących grupy dokumentów.")
+@click.option("--chunk-size", type=click.IntRange(min=0), show_default=True, default=0, help="Liczba grup wysyłanych naraz do procesu (0 - dobierana automatycznie).")
+@click.option("--incremental", "-i", is_flag=True, show_default=True, default=False, help="Porównuje ponownie tylko grupy, których dokumenty zmieniły się od poprzedniego uruchomienia.")
+@click.option("--delta", default=None, help="Plik, do którego zapisywane są tylko grupy nowe lub zmienione od poprzedniego uruchomienia (włącza --incremental).")
+@click.option("--engine", type=click.Choice(ENGINES), show_default=True, default="objects", help="Sposób porównania: obiekty CompareSet dla każdej grupy lub jedno zestawienie kolumnowe pozycji z bazy SQLite (tylko --store sqlite).")
+@click.option("--verify", is_flag=True, show_default=True, default=False, help="Sprawdza wynik silnika columnar z wynikiem CompareSet i kończy z błędem przy różnicy.")
+@metrics.instrumented("rwchecker")
+def main(store_kind: str, db_file: str, report_format: str, output: str, jobs: int, chunk_size: int,
+         incremental: bool, delta: str, engine: str, verify: bool):
     """
     Program porównuje pliki WZ z plikami RW.\n 
     Przykład:\n
     >python rwchecker.py     <- wynik porównania wyświetlony na standardowym urządzeniu wyjściowym.\n
     >python rwchecker.py > plik_wyjściowy.txt    <- wynik porównania zapisany do pliku tekstowego.\n
+    >python rwchecker.py --store sqlite    <- dokumenty wczytane z bazy SQLite.\n
+    >python rwchecker.py --format xlsx --output wynik.xlsx    <- wynik porównania zapisany do arkusza xlsx.\n
+    >python rwchecker.py --jobs 8    <- grupy dokumentów porównywane w 8 procesach.\n
+    >python rwchecker.py --metrics metryki.json --profile rwchecker.prof    <- zapisuje czasy etapów i grup oraz profil cProfile.\n
+    >python rwchecker.py --incremental --delta zmiany.txt    <- porównuje tylko zmienione grupy, zmiany zapisuje w pliku zmiany.txt.\n
+    >python rwchecker.py --store sqlite --engine columnar --verify    <- porównanie kolumnowe pozycji z bazy, sprawdzone z CompareSet.\n
     v1.0.0
     """
-    rw_json_list = get_files(os.path.join(RW_JSON_FOLDER, "*.json"))
-    wz_json_list = get_files(os.path.join(WZ_JSON_FOLDER, "*.json"))
-
-    comparator = RWComparator(wz_json_list,rw_json_list)
-    comparator.load_rw_data()
-    comparator.load_wz_data()
-    comparator.get_dependencies()
-
-    comp = [CompareSet(ref[0], ref[1], comparator.wz_data, comparator.rw_data) for ref in comparator.references]
-    for c in sort_compared_list(comp):
-        print(c.compare())
+    if report_format == "xlsx":
+        if output == "-":
+            raise click.BadParameter("format xlsx wymaga podania pliku wyjściowego.", param_hint="--output")
+        if delta == "-":
+            raise click.BadParameter("format xlsx wymaga podania pliku.", param_hint="--delta")
+    if engine == "columnar":
+        if store_kind != "sqlite":
+            raise click.UsageError("--engine columnar wymaga --store sqlite.")
+        if jobs > 1 or incremental or delta:
+            raise click.UsageError("--engine columnar nie łączy się z --jobs, --incremental ani --delta.")
+        references, compared = compare_columnar(db_file, verify)
+        write_report(references, compared, report_format, output)
+        return
+    if verify:
+        raise click.UsageError("--verify działa tylko z --engine columnar.")
+    with metrics.stage("load"):
+        if store_kind == "sqlite":
+            comparator = RWComparator([], [])
+            store = docstore.open_store(store_kind, db_file)
+            comparator.load_from_store(store)
+            store.close()
+        else:
+            rw_json_list = get_files(os.path.join(RW_JSON_FOLDER, "*.json"))
+            wz_json_list = get_files(os.path.join(WZ_JSON_FOLDER, "*.json"))
+            comparator = RWComparator(wz_json_list,rw_json_list)
+            comparator.load_rw_data()
+            comparator.load_wz_data()
+    with metrics.stage("get_dependencies"):
+        comparator.get_dependencies()
+
+    with metrics.stage("sort_references"):
+        references = sort_references(comparator.references, comparator.wz_data)
+    wz_data, rw_data = comparator.wz_data, comparator.rw_data
+
+    def compare(references: list):
+        if jobs > 1:
+            return compare_in_pool(references, wz_data, rw_data, jobs, chunk_size)
+        return (CompareSet(wz_list, rw_list, wz_data, rw_data) for wz_list, rw_list in references)
+
+    delta_writer = open_report_writer(report_format, delta) if delta else None
+    if incremental or delta_writer:
+        cache = groupcache.GroupCache(get_group_cache_file(store_kind, db_file))
+        on_changed = delta_writer.write_group if delta_writer else None
+        compared = groupcache.compare_incremental(references, wz_data, rw_data, cache, compare, on_changed)
+    else:
+        compared = compare(references)
+
+    write_report(references, compared, report_format, output)
+    if delta_writer:
+        delta_writer.close()
+    if incremental or delta_writer:
+        for result in cache.obsolete():
+            print(f"Nieaktualny wynik grupy WZ: {result.wz_dict['WZ_numbers']}", file=sys.stderr)
+        cache.save()
+        print(f"Grup: {len(references)}, z poprzedniego uruchomienia: {cache.hits}, porównanych ponownie: {cache.misses}", file=sys.stderr)
 
 
 if __name__ == "__main__":
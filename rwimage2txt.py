@@ -1,50 +1,87 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from functools import partial
+import math
 import os
+import sys
+import time
 
 import click
 import cv2
-import pytesseract
 from tqdm import tqdm
 
-from decodetxt2rw import get_files, test_and_touch_dir
-from globals import RW_RAW_INPUT_FOLDER, \
+from decodetxt2rw import compose_rw, decode_rw_number, verify_rw
+from dedup import DEFAULT_MAX_DISTANCE, get_scan_hash, group_duplicates
+from docstore import STORE_KINDS, get_files, open_store, test_and_touch_dir
+from globals import RW_DB_FILE, \
+                    RW_RAW_INPUT_FOLDER, \
+                    RW_TEMP_FOLDER, \
                     RW_TXT_FOLDER
+from layout import ROI_MODES, ocr_regions
+import metrics
+from ocrbackend import BACKENDS, TESSERACT_CONFIG, get_backend
+from ocrcache import OCRCache, DEFAULT_CACHE_SIZE_MB, get_cache_key
+from shmpool import DEFAULT_SLOT_MB, SHM_FOLDER, PageSlots, fits_shm, run_handoff
+from preprocess import A4_INCHES, TARGET_DPI, decode_grey, get_preprocess_params, prepare_page
+from scheduler import DEFAULT_BACKOFF, Journal, can_kill_workers, run_scheduled
+from workqueue import DEFAULT_LEASE, DEFAULT_QUEUE_FILE, WorkQueue
 
 
-def read_raw_file(filename: str):
+DEFAULT_BACKEND = "pytesseract"
+# First tier of the adaptive OCR: downscaled greyscale page without preprocessing.
+FAST_DPI = 200
+MIN_CONFIDENCE = 70
+
+EXECUTORS = {"thread": ThreadPoolExecutor, "process": ProcessPoolExecutor}
+
+OCR_JOURNAL_FILE = os.path.join(RW_TEMP_FOLDER, "ocr_journal.jsonl")
+OCR_FAILED_FILE = os.path.join(RW_TEMP_FOLDER, "ocr_failed.txt")
+OCR_DUPLICATES_FILE = os.path.join(RW_TEMP_FOLDER, "ocr_duplicates.txt")
+# Top part of the page with the RW number, read to confirm a duplicate found by hashes.
+HEADER_FRACTION = 0.3
+
+
+def get_available_cores() -> int:
     try:
-        return cv2.imread(filename)
-    except FileNotFoundError:
-        print("Plik" + filename + "nie został znaleziony.")
-        return None
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
 
 
-def get_greyscale(image):
-    return cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def limit_tesseract_threads(threads: int) -> None:
+    """
+    Tesseract uses OpenMP internally, one thread per core by default. With many workers
+    running at once this oversubscribes the CPU, so every worker gets a fixed limit.
+    """
+    os.environ["OMP_THREAD_LIMIT"] = str(threads)
 
 
-def thresholding_inv(image):
-    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+def init_worker(tesseract_threads: int) -> None:
+    limit_tesseract_threads(tesseract_threads)
+    cv2.setNumThreads(1)
 
 
-def thresholding(image):
-    return cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+def read_raw_bytes(filename: str) -> bytes:
+    try:
+        with open(filename, "rb") as stream:
+            return stream.read()
+    except OSError:
+        print("Plik " + filename + " nie został znaleziony.")
+        return None
 
 
-def remove_horizontal(image, thresh):
-    img = image.copy()
-    horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (30, 1))
-    detected_lines = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, horizontal_kernel, iterations=2)
-    cnts = cv2.findContours(detected_lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    cnts = cnts[0] if len(cnts) == 2 else cnts[1]
-    for c in cnts:
-        cv2.drawContours(img, [c], -1, (0, 0, 0), 6)
-    return img
+def get_ocr_params(backend: str = DEFAULT_BACKEND, roi: str = "off", target_dpi: int = TARGET_DPI,
+                   adaptive: bool = False, fast_dpi: int = FAST_DPI, min_confidence: float = MIN_CONFIDENCE) -> str:
+    """
+    Every setting which changes the OCR result. Part of the OCR cache key.
+    """
+    params = f"{backend}|roi={roi}|{TESSERACT_CONFIG}|{get_preprocess_params(target_dpi)}"
+    if adaptive:
+        params += f"|adaptive={fast_dpi},{min_confidence}"
+    return params
 
 
-def make_txt(image):
-    custom_config = r"--oem 3 --psm 6 -l pol+osd"
-    return pytesseract.image_to_string(image, config=custom_config)
+def make_txt(image, backend: str = DEFAULT_BACKEND):
+    return get_backend(backend).recognize(image)
 
 
 def get_result_name(filename: str):
@@ -52,24 +89,346 @@ def get_result_name(filename: str):
     return f_name.rsplit('.', maxsplit=1)[0]
     
 
-def process_image(filename: str):
-    image = read_raw_file(filename)
-    if image is None:
-        print("Wystąpił problem z plikiem obrazu ", filename)
-        return
-    grey = get_greyscale(image)
-    thresh = thresholding_inv(grey)
-    img = remove_horizontal(thresh, thresh)
-    img = thresholding_inv(img)
-    text = make_txt(img)
+def page_to_text(page, detected_lines, backend: str = DEFAULT_BACKEND, roi: str = "off") -> str:
+    if roi == "off":
+        return make_txt(page, backend)
+    return ocr_regions(page, detected_lines, partial(make_txt, backend=backend), rows=(roi == "rows"))
+
+
+def recognize_fast(grey, backend: str = DEFAULT_BACKEND) -> tuple:
+    return get_backend(backend).recognize_with_confidence(grey)
+
+
+def get_weakness(text: str, confidence: float, min_confidence: float = MIN_CONFIDENCE) -> str:
+    """
+    Why the text of the first OCR tier can't be used, checked as in decodetxt2rw.verify_rw;
+    empty string when it is good enough.
+    """
+    verification = verify_rw(compose_rw(text), "")
+    if verification["RW_document"] is None:
+        return "NO RW"
+    if verification["WZ_documents"] != "OK":
+        return verification["WZ_documents"]
+    if verification["items"] == "NO ITEMS":
+        return "NO ITEMS"
+    if confidence < min_confidence:
+        return "LOW CONFIDENCE"
+    return ""
+
+
+def save_txt(filename: str, text: str) -> None:
     result_fn = get_result_name(filename)
     txt_filename = os.path.join(RW_TXT_FOLDER, result_fn + ".txt")
     with open(txt_filename, 'w', encoding="utf-8") as stream:
         stream.write(text)
 
+
+def recognize_full(filename: str, raw: bytes, backend: str = DEFAULT_BACKEND, roi: str = "off",
+                   target_dpi: int = TARGET_DPI, source_dpi: int = 0) -> str:
+    with metrics.stage("decode_grey"):
+        grey = decode_grey(raw, target_dpi, source_dpi)
+    if grey is None:
+        print("Wystąpił problem z plikiem obrazu ", filename)
+        return None
+    with metrics.stage("prepare_page"):
+        page, detected_lines = prepare_page(grey)
+    with metrics.stage("ocr"):
+        return page_to_text(page, detected_lines, backend, roi)
+
+
+def recognize_file(filename: str, cache: OCRCache = None, backend: str = DEFAULT_BACKEND, roi: str = "off",
+                   target_dpi: int = TARGET_DPI, source_dpi: int = 0, adaptive: bool = False,
+                   fast_dpi: int = FAST_DPI, min_confidence: float = MIN_CONFIDENCE) -> tuple:
+    """
+    OCR of a single scan without saving the result. Returns status and text. Status is "hit" when
+    the text came from the cache, "miss" when the scan was recognised and "error" when the file couldn't be read.
+    With adaptive the page is first recognised downscaled to fast_dpi without preprocessing; status is
+    "fast" when that text is good enough (see get_weakness) and "full" when the page needed the full OCR.
+    """
+    with metrics.stage("read"):
+        raw = read_raw_bytes(filename)
+    if not raw:
+        print("Wystąpił problem z plikiem obrazu ", filename)
+        return "error", None
+    if cache is not None:
+        with metrics.stage("cache"):
+            key = get_cache_key(raw, get_ocr_params(backend, roi, target_dpi, adaptive, fast_dpi, min_confidence))
+            text = cache.get(key)
+        if text is not None:
+            return "hit", text
+    status = "miss"
+    if adaptive:
+        with metrics.stage("fast_decode_grey"):
+            grey = decode_grey(raw, fast_dpi, source_dpi)
+        if grey is None:
+            print("Wystąpił problem z plikiem obrazu ", filename)
+            return "error", None
+        with metrics.stage("fast_ocr"):
+            text, confidence = recognize_fast(grey, backend)
+        with metrics.stage("fast_verify"):
+            weakness = get_weakness(text, confidence, min_confidence)
+        status = "full" if weakness else "fast"
+    if status != "fast":
+        text = recognize_full(filename, raw, backend, roi, target_dpi, source_dpi)
+        if text is None:
+            return "error", None
+    if cache is not None:
+        with metrics.stage("cache"):
+            cache.put(key, text)
+    return status, text
+
+
+def hash_scan(filename: str, source_dpi: int = 0) -> int:
+    """
+    Perceptual hash of a scan (see dedup.get_page_hash), None when the file couldn't be read.
+    """
+    with metrics.stage("read"):
+        raw = read_raw_bytes(filename)
+    with metrics.stage("page_hash"):
+        return get_scan_hash(raw, source_dpi)
+
+
+def read_header_number(filename: str, source_dpi: int = 0, backend: str = DEFAULT_BACKEND) -> str:
+    """
+    RW number read by a fast OCR of the top of the downscaled page, None when it can't be read.
+    """
+    raw = read_raw_bytes(filename)
+    grey = decode_grey(raw, FAST_DPI, source_dpi) if raw else None
+    if grey is None:
+        return None
+    try:
+        with metrics.stage("header_ocr"):
+            text = get_backend(backend).recognize(grey[:int(grey.shape[0] * HEADER_FRACTION)])
+    except Exception as e:
+        print(f"Nie można odczytać nagłówka skanu {filename}: {e}")
+        return None
+    return decode_rw_number(text)
+
+
+def find_duplicates(pool, input_files: list, source_dpi: int = 0, max_distance: int = DEFAULT_MAX_DISTANCE,
+                    confirm: bool = True, backend: str = DEFAULT_BACKEND) -> tuple:
+    """
+    Groups near-duplicate scans by perceptual hashes computed in the pool. Returns the scans
+    to recognise (the first scan of every group) and the other ones as (scan, representative, distance, RW number).
+    With confirm a scan is skipped only when the RW number read from its header equals the one of its
+    representative; otherwise it is recognised as a distinct page.
+    """
+    worker = metrics.worker(partial(hash_scan, source_dpi=source_dpi))
+    hashes = [metrics.collect(output, f"hash:{filename}") for filename, output in
+              tqdm(zip(input_files, pool.map(worker, input_files)), total=len(input_files), desc="Wyszukiwanie duplikatów", unit="obraz")]
+    groups = group_duplicates(hashes, max_distance)
+    numbers = {}
+    if confirm:
+        candidates = sorted({position for position, (representative, _) in enumerate(groups) if representative != position}
+                            | {representative for position, (representative, _) in enumerate(groups) if representative != position})
+        worker = metrics.worker(partial(read_header_number, source_dpi=source_dpi, backend=backend))
+        for position, output in zip(candidates, pool.map(worker, [input_files[position] for position in candidates])):
+            numbers[position] = metrics.collect(output, f"header:{input_files[position]}")
+    representatives = []
+    duplicates = []
+    for position, (representative, distance) in enumerate(groups):
+        confirmed = not confirm or (numbers.get(position) is not None and numbers.get(position) == numbers.get(representative))
+        if representative == position or not confirmed:
+            representatives.append(input_files[position])
+        else:
+            duplicates.append((input_files[position], input_files[representative], distance, numbers.get(position)))
+    return representatives, duplicates
+
+
+def write_duplicates(filename: str, duplicates: list) -> None:
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as stream:
+        for duplicate, representative, distance, rw_number in duplicates:
+            stream.write(f"{duplicate}\t{representative}\t{distance}\t{rw_number or ''}\n")
+
+
+def preprocess_file(filename: str, slot: int = None, slots: PageSlots = None, cache: OCRCache = None,
+                    backend: str = DEFAULT_BACKEND, roi: str = "off", target_dpi: int = TARGET_DPI, source_dpi: int = 0) -> dict:
+    """
+    First stage of recognize_file in a separate preprocessing worker. The page (and the mask of rulings
+    for roi) is prepared in place in the shared memory slot when given and large enough,
+    otherwise it is returned in "arrays" and pickled to the OCR worker.
+    """
+    prepared = {"status": "miss", "key": None, "text": None, "arrays": None, "shapes": None}
+    raw = read_raw_bytes(filename)
+    if not raw:
+        print("Wystąpił problem z plikiem obrazu ", filename)
+        return {**prepared, "status": "error"}
+    if cache is not None:
+        prepared["key"] = get_cache_key(raw, get_ocr_params(backend, roi, target_dpi))
+        prepared["text"] = cache.get(prepared["key"])
+        if prepared["text"] is not None:
+            return {**prepared, "status": "hit"}
+    grey = decode_grey(raw, target_dpi, source_dpi)
+    if grey is None:
+        print("Wystąpił problem z plikiem obrazu ", filename)
+        return {**prepared, "status": "error"}
+    shapes = [grey.shape] * (1 if roi == "off" else 2)
+    if slots is None or not slots.fits(shapes):
+        prepared["arrays"] = list(prepare_page(grey))[:len(shapes)]
+        return prepared
+    arrays = slots.arrays(slot, shapes)
+    arrays[0][...] = grey
+    page, detected_lines = prepare_page(arrays[0])
+    if roi != "off":
+        arrays[1][...] = detected_lines
+    prepared["shapes"] = shapes
+    return prepared
+
+
+def ocr_page(prepared: dict, slot: int = None, slots: PageSlots = None, cache: OCRCache = None,
+             backend: str = DEFAULT_BACKEND, roi: str = "off") -> tuple:
+    """
+    Second stage of recognize_file in an OCR worker, reading the page prepared by preprocess_file.
+    Returns status and text like recognize_file.
+    """
+    if prepared["status"] != "miss":
+        return prepared["status"], prepared["text"]
+    arrays = prepared["arrays"] or slots.arrays(slot, prepared["shapes"])
+    text = page_to_text(arrays[0], arrays[1] if roi != "off" else None, backend, roi)
+    if cache is not None:
+        cache.put(prepared["key"], text)
+    return "miss", text
+
+
+def get_slot_mb(target_dpi: int = TARGET_DPI, roi: str = "off") -> int:
+    """
+    Shared memory slot for an A4 page prepared at target_dpi, with the mask of rulings for roi and a 5% margin;
+    DEFAULT_SLOT_MB when pages keep their own resolution. Larger pages are copied instead.
+    """
+    if not target_dpi:
+        return DEFAULT_SLOT_MB
+    page_bytes = int(A4_INCHES[0] * target_dpi) * int(A4_INCHES[1] * target_dpi) * (1 if roi == "off" else 2)
+    return math.ceil(page_bytes * 1.05 / 1024 / 1024)
+
+
+def recognize_staged(input_files: list, ocr_pool, preprocess_workers: int, slot_count: int = 0, slot_mb: int = DEFAULT_SLOT_MB,
+                     cache: OCRCache = None, backend: str = DEFAULT_BACKEND, roi: str = "off", target_dpi: int = TARGET_DPI,
+                     source_dpi: int = 0, in_flight: int = 2):
+    """
+    Preprocessing and OCR in separate process pools. With slot_count pages are handed over in shared memory
+    slots of slot_mb, without it they are pickled, in_flight pages at most. Yields (filename, (status, text))
+    in order of completion.
+    """
+    slots = PageSlots(slot_count, slot_mb * 1024 * 1024) if slot_count else None
+    produce = partial(preprocess_file, slots=slots, cache=cache, backend=backend, roi=roi, target_dpi=target_dpi, source_dpi=source_dpi)
+    consume = partial(ocr_page, slots=slots, cache=cache, backend=backend, roi=roi)
+    try:
+        with ProcessPoolExecutor(max_workers=preprocess_workers, initializer=init_worker, initargs=(1,)) as preprocess_pool:
+            for filename, result in run_handoff(input_files, produce, consume, preprocess_pool, ocr_pool, slots, in_flight):
+                if isinstance(result, Exception):
+                    print(f"Wystąpił problem z plikiem obrazu {filename}: {result}")
+                    result = ("error", None)
+                yield filename, result
+    finally:
+        if slots is not None:
+            slots.close()
+
+
+def process_image(filename: str, **kwargs) -> str:
+    """
+    OCR of a single scan saved to RW_TXT_FOLDER. Takes options of recognize_file and returns its status.
+    """
+    status, text = recognize_file(filename, **kwargs)
+    if text is not None:
+        save_txt(filename, text)
+    return status
+
+
+def get_journal_files(store_kind: str, db_file: str) -> tuple:
+    """
+    Journal and failed images list of a run: in RW_temp for text files, next to the database for SQLite.
+    """
+    if store_kind == "sqlite":
+        return f"{db_file}.ocr_journal.jsonl", f"{db_file}.ocr_failed.txt"
+    return OCR_JOURNAL_FILE, OCR_FAILED_FILE
+
+
+def recognize_pooled(input_files: list, pool, worker, errors: dict):
+    """
+    OCR of every image submitted to the pool separately, so an image which raises (a corrupt file,
+    an error of tesseract) is yielded as an error, with the reason put into errors, and the batch goes on.
+    Yields (filename, (status, text)) in order of completion.
+    """
+    futures = {pool.submit(worker, filename): filename for filename in input_files}
+    for future in as_completed(futures):
+        filename = futures[future]
+        try:
+            yield filename, metrics.collect(future.result(), filename)
+        except Exception as e:
+            print(f"Wystąpił problem z plikiem obrazu {filename}: {e}")
+            errors[filename] = f"{type(e).__name__}: {e}"
+            yield filename, ("error", None)
+
+
+def recognize_scheduled(input_files: list, worker, workers: int, timeout: float, retries: int, backoff: float,
+                        tesseract_threads: int, errors: dict):
+    """
+    OCR in scheduler workers, which are killed when an image exceeds timeout and retried.
+    Images failed after all retries are yielded as errors, with the reason put into errors.
+    """
+    for filename, ok, output, attempts in run_scheduled(input_files, worker, workers, timeout, retries, backoff,
+                                                        init_worker, (tesseract_threads,)):
+        if ok:
+            yield filename, metrics.collect(output, filename)
+        else:
+            errors[filename] = f"{output} (prób: {attempts})"
+            yield filename, ("error", None)
+
+
+def record(journal, unrecorded: list, errors: dict) -> None:
+    for filename, status in unrecorded:
+        if status == "error":
+            journal.record(filename, "failed", error=errors.get(filename, "nie można odczytać lub przetworzyć obrazu"))
+        else:
+            journal.record(filename, "done")
+    unrecorded.clear()
+
+
+def write_failed(filename: str, failed: dict) -> None:
+    os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+    with open(filename, "w", encoding="utf-8") as stream:
+        for source, error in sorted(failed.items()):
+            stream.write(f"{source}\t{error}\n")
+
+
 @click.command()
+@click.option("--workers", "-w", type=click.IntRange(min=1), default=None, help="Liczba równoległych procesów/wątków (domyślnie liczba dostępnych rdzeni).")
+@click.option("--executor", "-e", type=click.Choice(list(EXECUTORS)), show_default=True, default="process", help="Rodzaj puli roboczej.")
+@click.option("--tesseract-threads", type=click.IntRange(min=1), show_default=True, default=1, help="Liczba wątków OpenMP tesseracta na jeden proces roboczy.")
+@click.option("--backend", "-b", type=click.Choice(list(BACKENDS)), show_default=True, default=DEFAULT_BACKEND, help="Silnik OCR: pytesseract (nowy proces tesseracta dla każdego obrazu) lub tesserocr (silnik wczytany raz na proces roboczy).")
+@click.option("--roi", type=click.Choice(ROI_MODES), show_default=True, default="off", help="Rozpoznawanie tylko nagłówka i tabeli pozycji (regions) lub nagłówka i kolejnych wierszy tabeli (rows).")
+@click.option("--dpi", "target_dpi", type=click.IntRange(min=0), show_default=True, default=TARGET_DPI, help="Rozdzielczość, do której sprowadzane są skany przed OCR (0 - bez zmian).")
+@click.option("--source-dpi", type=click.IntRange(min=0), show_default=True, default=0, help="Rozdzielczość skanów, gdy nie jest zapisana w pliku jpg (0 - odczyt z pliku).")
+@click.option("--cache/--no-cache", "use_cache", show_default=True, default=True, help="Używa pamięci podręcznej wyników OCR w katalogu RW_temp.")
+@click.option("--cache-size", type=click.IntRange(min=0), show_default=True, default=DEFAULT_CACHE_SIZE_MB, help="Maksymalny rozmiar pamięci podręcznej OCR w MB.")
+@click.option("--adaptive", is_flag=True, show_default=True, default=False, help="OCR dwuetapowy: najpierw szybkie rozpoznanie pomniejszonej strony, pełne przetwarzanie tylko dla stron bez numeru RW, WZ, pozycji lub z niską pewnością.")
+@click.option("--fast-dpi", type=click.IntRange(min=0), show_default=True, default=FAST_DPI, help="Rozdzielczość strony w pierwszym etapie OCR dwuetapowego.")
+@click.option("--min-confidence", type=click.FloatRange(0, 100), show_default=True, default=MIN_CONFIDENCE, help="Minimalna średnia pewność tesseracta (0-100) wyniku pierwszego etapu.")
+@click.option("--dedup", is_flag=True, show_default=True, default=False, help="Wyszukuje prawie identyczne skany (ponownie zeskanowane strony) i rozpoznaje tylko pierwszy skan z każdej grupy.")
+@click.option("--dedup-distance", type=click.IntRange(min=0), show_default=True, default=DEFAULT_MAX_DISTANCE, help="Największa odległość Hamminga skrótów percepcyjnych duplikatów.")
+@click.option("--dedup-confirm/--no-dedup-confirm", show_default=True, default=True, help="Pomija duplikat tylko wtedy, gdy numer RW odczytany szybkim OCR nagłówka jest taki sam jak w pierwszym skanie grupy.")
+@click.option("--preprocess-workers", type=click.IntRange(min=0), show_default=True, default=0, help="Liczba osobnych procesów wczytujących i przygotowujących strony dla procesów OCR (0 - wszystko w procesach OCR).")
+@click.option("--handoff", type=click.Choice(["shm", "copy"]), show_default=True, default="shm", help="Przekazywanie stron do procesów OCR: w pamięci współdzielonej lub przez kopiowanie (pickle).")
+@click.option("--slots", "slot_count", type=click.IntRange(min=1), default=None, help="Liczba miejsc na strony w pamięci współdzielonej (domyślnie 2 x liczba procesów OCR).")
+@click.option("--slot-mb", type=click.IntRange(min=1), default=None, help="Rozmiar jednego miejsca w MB (domyślnie rozmiar strony A4 w rozdzielczości --dpi); większe strony są kopiowane.")
+@click.option("--timeout", type=click.FloatRange(min=0), show_default=True, default=0, help="Limit czasu OCR jednego obrazu w sekundach; proces przekraczający limit jest zabijany (0 - bez limitu, tylko dla --executor process).")
+@click.option("--retries", type=click.IntRange(min=0), show_default=True, default=0, help="Liczba ponowień OCR obrazu po błędzie, przekroczeniu limitu czasu lub awarii procesu (tylko dla --executor process).")
+@click.option("--backoff", type=click.FloatRange(min=0), show_default=True, default=DEFAULT_BACKOFF, help="Odstęp przed pierwszym ponowieniem w sekundach, podwajany przy kolejnych.")
+@click.option("--resume", is_flag=True, show_default=True, default=False, help="Wznawia przerwane uruchomienie: pomija obrazy zapisane w dzienniku poprzedniego uruchomienia.")
+@click.option("--queue", "use_queue", is_flag=True, show_default=True, default=False, help="Pobiera obrazy partiami ze wspólnej kolejki zadań, z której mogą równocześnie korzystać inne procesy i komputery.")
+@click.option("--queue-file", show_default=True, default=DEFAULT_QUEUE_FILE, help="Plik SQLite wspólnej kolejki zadań (dla --queue).")
+@click.option("--lease", type=click.FloatRange(min=1), show_default=True, default=DEFAULT_LEASE, help="Czas dzierżawy partii obrazów w sekundach; nieukończone w tym czasie obrazy przejmują inne procesy.")
+@click.option("--batch", type=click.IntRange(min=1), default=None, help="Liczba obrazów pobieranych z kolejki naraz (domyślnie 2 x liczba procesów).")
+@click.option("--store", "store_kind", type=click.Choice(STORE_KINDS), show_default=True, default="files", help="Miejsce zapisu tekstów: pliki w katalogu RW_txt lub baza SQLite.")
+@click.option("--db", "db_file", show_default=True, default=RW_DB_FILE, help="Plik bazy SQLite (dla --store sqlite).")
 @click.argument("filenames", nargs=-1, required=False)
-def main(filenames: list):
+@metrics.instrumented("rwimage2txt")
+def main(workers: int, executor: str, tesseract_threads: int, backend: str, roi: str, target_dpi: int, source_dpi: int,
+         use_cache: bool, cache_size: int, adaptive: bool, fast_dpi: int, min_confidence: float,
+         dedup: bool, dedup_distance: int, dedup_confirm: bool, preprocess_workers: int, handoff: str, slot_count: int, slot_mb: int,
+         timeout: float, retries: int, backoff: float, resume: bool, use_queue: bool, queue_file: str, lease: float, batch: int,
+         store_kind: str, db_file: str, filenames: list):
     """
     Program przetwarza zeskanowane pliki RW w formacie jpg do plików tekstowych.\n
     Gdy wywołany bez argumentów, przetwarza wszystkie pliki jpg z podkatalogu RW_jpeg a pliki wynikowe zapisuje w podkatalogu RW_txt.
@@ -77,6 +436,18 @@ def main(filenames: list):
     Przykład:\n
     >python rwimage2txt.py       <- przetwarza wszystkie pliki\n
     >python rwimage2txt.py RW_jpeg/Scan_0001.jpg   <- przetwarza tylko konkretny plik.\n
+    >python rwimage2txt.py --workers 8 --executor process   <- przetwarza pliki w 8 procesach.\n
+    >python rwimage2txt.py --backend tesserocr   <- używa silnika OCR wczytanego raz na proces roboczy.\n
+    >python rwimage2txt.py --roi regions   <- rozpoznaje tylko nagłówek dokumentu i tabelę pozycji.\n
+    >python rwimage2txt.py --adaptive   <- pełne przetwarzanie i OCR tylko dla stron słabo rozpoznanych w szybkim pierwszym etapie.\n
+    >python rwimage2txt.py --dedup   <- pomija w OCR prawie identyczne skany tej samej strony i wypisuje je w raporcie.\n
+    >python rwimage2txt.py --preprocess-workers 2 --workers 6   <- przygotowuje strony w 2 procesach i przekazuje je do 6 procesów OCR w pamięci współdzielonej.\n
+    >python rwimage2txt.py --timeout 120 --retries 2   <- przerywa OCR obrazu po 120 s i ponawia go dwukrotnie.\n
+    >python rwimage2txt.py --resume   <- wznawia przerwane uruchomienie od miejsca, w którym zostało przerwane.\n
+    >python rwimage2txt.py --queue   <- dzieli obrazy z innymi procesami uruchomionymi z --queue, także na innych komputerach.\n
+    >python rwimage2txt.py --no-cache   <- ponownie rozpoznaje wszystkie pliki, z pominięciem pamięci podręcznej.\n
+    >python rwimage2txt.py --store sqlite   <- zapisuje teksty w bazie SQLite.\n
+    >python rwimage2txt.py --metrics metryki.json --profile ocr.prof   <- zapisuje czasy etapów i skanów oraz profil cProfile.\n
     v1.0.0
     """
     if len(filenames) > 0:
@@ -86,10 +457,108 @@ def main(filenames: list):
     else:
         test_and_touch_dir(RW_RAW_INPUT_FOLDER)
         input_files = get_files(os.path.join(RW_RAW_INPUT_FOLDER, "*.jp*g"))
-    test_and_touch_dir(RW_TXT_FOLDER)
-    with ThreadPoolExecutor(max_workers=2) as pool:
-        list(tqdm(pool.map(process_image, input_files), total=len(input_files), desc="Przetwarzanie obrazu", unit="obraz")) 
-    print("Zakończono.")
+    if not BACKENDS[backend].is_available():
+        print(f"Silnik OCR {backend} nie jest zainstalowany.")
+        sys.exit(1)
+    if preprocess_workers and adaptive:
+        print("Opcja --adaptive nie działa z --preprocess-workers.")
+        sys.exit(1)
+    if use_queue and (dedup or resume):
+        print("Opcje --dedup i --resume nie działają z --queue (kolejka sama pamięta przetworzone obrazy).")
+        sys.exit(1)
+    if store_kind == "files":
+        test_and_touch_dir(RW_TXT_FOLDER)
+    if workers is None:
+        workers = get_available_cores()
+    if use_queue:
+        journal = WorkQueue(queue_file, "ocr", lease=lease)
+        added = journal.add(input_files)
+        print(f"Kolejka {queue_file}: dodano {added} z {len(input_files)} obrazów, proces {journal.worker}.")
+        failed_file = None
+    else:
+        journal_file, failed_file = get_journal_files(store_kind, db_file)
+        # Named images are added to the journal of the whole folder instead of starting a new one.
+        journal = Journal(journal_file, resume or len(filenames) > 0)
+    if resume:
+        finished = journal.finished()
+        skipped = len(input_files)
+        input_files = [filename for filename in input_files if filename not in finished]
+        print(f"Wznowienie: pominięto {skipped - len(input_files)} obrazów z dziennika {journal_file}.")
+    cache = OCRCache(max_size_mb=cache_size) if use_cache else None
+    store = open_store(store_kind, db_file)
+    worker = metrics.worker(partial(recognize_file, cache=cache, backend=backend, roi=roi, target_dpi=target_dpi, source_dpi=source_dpi,
+                                    adaptive=adaptive, fast_dpi=fast_dpi, min_confidence=min_confidence))
+    # Killable workers only when they are needed; otherwise the plain pool, which also works without fork.
+    use_scheduler = executor == "process" and not preprocess_workers and bool(timeout or retries)
+    if use_scheduler and not can_kill_workers():
+        print("Opcje --timeout i --retries wymagają systemu z fork (Linux, macOS); obrazy zostaną przetworzone bez nich.")
+        use_scheduler = False
+    if preprocess_workers and handoff == "shm":
+        slot_mb = slot_mb or get_slot_mb(target_dpi, roi)
+        if not fits_shm(slot_count or 2 * workers, slot_mb * 1024 * 1024):
+            print(f"Za mało pamięci współdzielonej w {SHM_FOLDER} na {slot_count or 2 * workers} miejsc po {slot_mb} MB; "
+                  "strony będą kopiowane (--handoff copy).")
+            handoff = "copy"
+    errors = {}
+    start = time.perf_counter()
+    with EXECUTORS[executor](max_workers=workers, initializer=init_worker, initargs=(tesseract_threads,)) as pool:
+        duplicates = []
+        if dedup:
+            input_files, duplicates = find_duplicates(pool, input_files, source_dpi, dedup_distance, dedup_confirm, backend)
+
+        def recognize(files: list):
+            if preprocess_workers:
+                in_flight = slot_count or 2 * workers
+                return recognize_staged(files, pool, preprocess_workers, in_flight if handoff == "shm" else 0, slot_mb,
+                                        cache, backend, roi, target_dpi, source_dpi, in_flight)
+            if use_scheduler:
+                return recognize_scheduled(files, worker, workers, timeout, retries, backoff, tesseract_threads, errors)
+            return recognize_pooled(files, pool, worker, errors)
+
+        batches = journal.batches(batch or 2 * workers) if use_queue else [input_files]
+        progress = tqdm(total=None if use_queue else len(input_files), desc="Przetwarzanie obrazu", unit="obraz")
+        results = []
+        unrecorded = []
+        for files in batches:
+            for filename, (status, text) in recognize(files):
+                if text is not None:
+                    with metrics.stage("store"):
+                        store.put_text(get_result_name(filename), text)
+                results.append(status)
+                unrecorded.append((filename, status))
+                progress.update()
+                # SQLite texts are committed in batches; an image is journaled only once its text is committed.
+                if not getattr(store, "pending", 0):
+                    record(journal, unrecorded, errors)
+            store.commit()
+            record(journal, unrecorded, errors)
+        progress.close()
+    store.close()
+    failed = journal.failed()
+    journal.close()
+    if failed_file is not None:
+        write_failed(failed_file, failed)
+    if failed:
+        print(f"Nie rozpoznano {len(failed)} obrazów" + (f" (lista w {failed_file}):" if failed_file is not None else ":"))
+        for filename, error in sorted(failed.items()):
+            print(f"  {filename}: {error}")
+    if cache is not None:
+        removed = cache.evict()
+        entries, size = cache.size()
+        misses = sum(results.count(status) for status in ("miss", "fast", "full"))
+        print(f"Pamięć podręczna OCR: trafienia {results.count('hit')}, chybienia {misses}, "
+              f"usunięto {removed}, wpisów {entries} ({size / 1024 / 1024:.1f} MB).")
+    if dedup:
+        write_duplicates(OCR_DUPLICATES_FILE, duplicates)
+        print(f"Duplikaty skanów pominięte w OCR: {len(duplicates)} (lista w {OCR_DUPLICATES_FILE}).")
+        for filename, representative, distance, _ in duplicates:
+            print(f"  {filename} = {representative} (odległość {distance})")
+    if adaptive:
+        fast, full = results.count("fast"), results.count("full")
+        print(f"OCR dwuetapowy: wystarczył pierwszy etap {fast}, wymagało drugiego etapu {full} "
+              f"({full / (fast + full) * 100 if fast + full else 0:.1f}% rozpoznanych stron).")
+    elapsed = time.perf_counter() - start
+    print(f"Zakończono. Przetworzono {len(results) + len(duplicates)} obrazów w {elapsed:.1f} s ({len(results) / elapsed if elapsed > 0 else 0:.2f} obraz/s, {workers} x {executor}).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,195 @@
+import heapq
+from itertools import count
+import json
+import multiprocessing
+from multiprocessing.connection import wait
+import os
+import signal
+import time
+
+
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 1.0
+STOP_TIMEOUT = 5
+
+
+class Journal():
+    """
+    Append-only record (json lines) of finished sources, one line per source written as soon as
+    it is finished, so a killed run can be resumed. The last line of a source wins; a line cut off
+    by the kill is ignored.
+    """
+
+    def __init__(self, filename: str, resume: bool = False) -> None:
+        self.filename = filename
+        self.entries = {}
+        if resume:
+            try:
+                with open(filename, "r", encoding="utf-8") as stream:
+                    for line in stream:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            continue
+                        self.entries[entry["source"]] = entry
+            except OSError:
+                pass
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        self.stream = open(filename, "a" if resume else "w", encoding="utf-8")
+        if self.stream.tell() > 0:
+            # Ends a line cut off by a killed run.
+            self.stream.write("\n")
+
+
+    def __enter__(self) -> "Journal":
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def record(self, source: str, status: str, attempts: int = 1, error: str = None) -> None:
+        entry = {"source": source, "status": status, "attempts": attempts, "error": error, "time": time.time()}
+        self.stream.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.stream.flush()
+        self.entries[source] = entry
+
+
+    def finished(self) -> set:
+        """
+        Sources done; failed sources are tried again by a resumed run.
+        """
+        return {source for source, entry in self.entries.items() if entry["status"] == "done"}
+
+
+    def failed(self) -> dict:
+        return {source: entry["error"] for source, entry in self.entries.items() if entry["status"] == "failed"}
+
+
+    def close(self) -> None:
+        self.stream.close()
+
+
+def can_kill_workers() -> bool:
+    """
+    Workers are forked and killed with their process group, which needs a POSIX system.
+    """
+    return "fork" in multiprocessing.get_all_start_methods() and hasattr(os, "killpg")
+
+
+def worker_loop(connection, function, initializer=None, initargs=()) -> None:
+    # Own process group, so a hung child (e.g. tesseract) is killed together with the worker.
+    os.setpgid(0, 0)
+    if initializer is not None:
+        initializer(*initargs)
+    while True:
+        item = connection.recv()
+        if item is None:
+            return
+        try:
+            connection.send((True, function(item)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class Worker():
+    """
+    One worker process which can be killed with its children when its task hangs.
+    """
+
+    def __init__(self, context, function, initializer=None, initargs=()) -> None:
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=worker_loop, args=(child_connection, function, initializer, initargs), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.item = None
+        self.deadline = None
+
+
+    def start(self, item, timeout: float) -> None:
+        self.item = item
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.connection.send(item)
+
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except OSError:
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(STOP_TIMEOUT)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.connection.close()
+
+
+def run_scheduled(items: list, function, workers: int = 1, timeout: float = 0, retries: int = DEFAULT_RETRIES,
+                  backoff: float = DEFAULT_BACKOFF, initializer=None, initargs=()):
+    """
+    Calls function(item) for every item in worker processes, yielding (item, ok, result or error, attempts)
+    in order of completion. An item which raises, exceeds timeout seconds (its worker is killed) or crashes
+    its worker is retried up to retries times, after backoff, 2 * backoff, 4 * backoff... seconds.
+    """
+    context = multiprocessing.get_context("fork")
+    order = count()
+    pending = [(0.0, next(order), item) for item in items]
+    attempts = {}
+    idle = [Worker(context, function, initializer, initargs) for _ in range(min(workers, len(items)))]
+    busy = {}
+
+    def fail(item, error: str):
+        if attempts[item] <= retries:
+            heapq.heappush(pending, (time.monotonic() + backoff * 2 ** (attempts[item] - 1), next(order), item))
+            return None
+        return item, False, error, attempts[item]
+
+    try:
+        while pending or busy:
+            now = time.monotonic()
+            while idle and pending and pending[0][0] <= now:
+                _, _, item = heapq.heappop(pending)
+                attempts[item] = attempts.get(item, 0) + 1
+                worker = idle.pop()
+                worker.start(item, timeout)
+                busy[worker.connection] = worker
+            waits = [worker.deadline - now for worker in busy.values() if worker.deadline is not None]
+            if idle and pending:
+                waits.append(pending[0][0] - now)
+            for connection in wait(list(busy), max(0.0, min(waits)) if waits else None):
+                worker = busy.pop(connection)
+                try:
+                    ok, result = connection.recv()
+                except (EOFError, OSError):
+                    worker.kill()
+                    idle.append(Worker(context, function, initializer, initargs))
+                    finished = fail(worker.item, f"proces roboczy zakończył się nieoczekiwanie (kod {worker.process.exitcode})")
+                else:
+                    idle.append(worker)
+                    finished = (worker.item, True, result, attempts[worker.item]) if ok else fail(worker.item, result)
+                if finished is not None:
+                    yield finished
+            now = time.monotonic()
+            for connection, worker in list(busy.items()):
+                if worker.deadline is not None and worker.deadline <= now:
+                    del busy[connection]
+                    worker.kill()
+                    idle.append(Worker(context, function, initializer, initargs))
+                    finished = fail(worker.item, f"przekroczono limit czasu {timeout} s")
+                    if finished is not None:
+                        yield finished
+    finally:
+        for worker in busy.values():
+            worker.kill()
+        for worker in idle:
+            worker.stop()
@@ -0,0 +1,157 @@
+from multiprocessing import shared_memory
+import queue
+import shutil
+import threading
+
+import numpy as np
+
+
+# Slot for a page of unknown resolution: an A4 page at 600 dpi.
+DEFAULT_SLOT_MB = 40
+# Shared memory blocks are files in this folder on Linux; in containers it is often small (64 MB in Docker).
+SHM_FOLDER = "/dev/shm"
+
+_attached = {}
+
+
+class PageSlots():
+    """
+    A fixed number of equal slots in one shared memory block, for page images handed over between
+    worker processes without pickling the pixels. The creating process hands out free slots
+    (acquire/release); a pickled PageSlots attaches to the same block in a worker, once per process.
+    """
+
+    def __init__(self, count: int, slot_bytes: int = DEFAULT_SLOT_MB * 1024 * 1024, name: str = None) -> None:
+        self.count = count
+        self.slot_bytes = slot_bytes
+        self.owner = name is None
+        if self.owner:
+            self.memory = shared_memory.SharedMemory(create=True, size=count * slot_bytes)
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+        self.free = list(range(count))
+        self.condition = threading.Condition()
+
+
+    def __reduce__(self):
+        return attach, (self.memory.name, self.count, self.slot_bytes)
+
+
+    def __enter__(self) -> "PageSlots":
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def acquire(self) -> int:
+        with self.condition:
+            while not self.free:
+                self.condition.wait()
+            return self.free.pop()
+
+
+    def release(self, slot: int) -> None:
+        with self.condition:
+            self.free.append(slot)
+            self.condition.notify()
+
+
+    def fits(self, shapes: list, dtype=np.uint8) -> bool:
+        return sum(int(np.prod(shape)) for shape in shapes) * np.dtype(dtype).itemsize <= self.slot_bytes
+
+
+    def arrays(self, slot: int, shapes: list, dtype=np.uint8) -> list:
+        """
+        Arrays of the given shapes laid one after another in the slot, as views of the shared memory.
+        """
+        views = []
+        offset = slot * self.slot_bytes
+        for shape in shapes:
+            views.append(np.ndarray(shape, dtype=dtype, buffer=self.memory.buf, offset=offset))
+            offset += views[-1].nbytes
+        return views
+
+
+    def close(self) -> None:
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+def get_shm_free() -> int:
+    """
+    Free bytes for shared memory, None when not known (no /dev/shm, e.g. macOS or Windows).
+    """
+    try:
+        return shutil.disk_usage(SHM_FOLDER).free
+    except OSError:
+        return None
+
+
+def fits_shm(count: int, slot_bytes: int) -> bool:
+    """
+    True when count slots fit in the free shared memory; a block larger than that is created,
+    but a worker writing past the free space is killed with SIGBUS.
+    """
+    free = get_shm_free()
+    return free is None or count * slot_bytes <= free
+
+
+def attach(name: str, count: int, slot_bytes: int) -> PageSlots:
+    if name not in _attached:
+        _attached[name] = PageSlots(count, slot_bytes, name)
+    return _attached[name]
+
+
+def run_handoff(items: list, produce, consume, producer_pool, consumer_pool, slots: PageSlots = None, in_flight: int = 2):
+    """
+    Runs produce(item, slot) in producer_pool and consume(produced, slot) in consumer_pool for every item,
+    yielding (item, result) in order of completion. With slots every page in flight holds one slot, which
+    is released when consume is done; without slots produced pages are pickled and in_flight pages at most
+    are held at once. A failed produce or consume, also one of a broken pool, is yielded as its exception,
+    so every item is yielded exactly once.
+    """
+    done = queue.Queue()
+    limit = threading.Semaphore(in_flight if slots is None else slots.count)
+
+    def finish(item, slot, result) -> None:
+        if slots is not None:
+            slots.release(slot)
+        limit.release()
+        done.put((item, result))
+
+    def on_consumed(item, slot, future) -> None:
+        try:
+            result = future.result()
+        except Exception as e:
+            result = e
+        finish(item, slot, result)
+
+    def on_produced(item, slot, future) -> None:
+        try:
+            consumed = consumer_pool.submit(consume, future.result(), slot)
+        except Exception as e:
+            # A failed produce, or a consumer pool broken by a crashed worker.
+            finish(item, slot, e)
+            return
+        consumed.add_done_callback(lambda f: on_consumed(item, slot, f))
+
+    def submit_all() -> None:
+        for position, item in enumerate(items):
+            limit.acquire()
+            slot = slots.acquire() if slots is not None else None
+            try:
+                produced = producer_pool.submit(produce, item, slot)
+            except Exception as e:
+                # The producer pool is broken: this and all following items fail without being submitted.
+                finish(item, slot, e)
+                for rest in items[position + 1:]:
+                    done.put((rest, e))
+                return
+            produced.add_done_callback(lambda f, item=item, slot=slot: on_produced(item, slot, f))
+
+    threading.Thread(target=submit_all, daemon=True).start()
+    for _ in range(len(items)):
+        yield done.get()
@@ -0,0 +1,328 @@
+import json
+import os
+import random
+import struct
+import unicodedata
+
+import click
+import cv2
+import numpy as np
+
+from docstore import get_json_file_name, save_json
+from preprocess import A4_INCHES
+
+
+PRODUCT_WORDS = ["PŁYTA", "KOSTKA", "KRAWĘŻNIK", "LATARNIA", "SŁUPEK", "RURA", "KRATKA", "OBRZEŻE", "STUDNIA", "POKRYWA",
+                 "UCHWYT", "LISTWA", "ZNAK", "TARCZA", "WSPORNIK", "OPRAWA"]
+PRODUCT_TYPES = ["PW-95", "MONDIAL", "FUTURLED3", "LPC-FUT", "UW-108", "CYBANT", "OGÓL", "R-Y-G"]
+YEAR = "23"
+ASSORTMENT_FIRST_ROW = 5
+# DWS sheet layout read by decodexls2wz (see get_count_of_wz, get_wz_start and get_wz_content).
+DWS_SHEET_COLUMNS = 15
+WZ_COUNT_ROW = 42
+
+
+class SyntheticSheet():
+    """
+    Sheet with the part of the xlrd.sheet.Sheet interface used by decodexls2wz.
+    """
+
+    def __init__(self, name: str, rows: list) -> None:
+        self.name = name
+        self.ncols = max((len(row) for row in rows), default=0)
+        self.rows = [row + [""] * (self.ncols - len(row)) for row in rows]
+        self.nrows = len(self.rows)
+
+
+    def cell_value(self, rowx: int, colx: int):
+        return self.rows[rowx][colx]
+
+
+    def row_values(self, rowx: int, start_colx: int = 0, end_colx: int = None) -> list:
+        return self.rows[rowx][start_colx:end_colx]
+
+
+    def col_values(self, colx: int, start_rowx: int = 0, end_rowx: int = None) -> list:
+        return [row[colx] for row in self.rows[start_rowx:end_rowx]]
+
+
+class SyntheticBook():
+    """
+    Workbook with the part of the xlrd.book.Book interface used by decodexls2wz.
+    """
+
+    def __init__(self, sheets: list) -> None:
+        self.sheets = {sheet.name: sheet for sheet in sheets}
+        self.on_demand = False
+
+
+    def sheet_names(self) -> list:
+        return list(self.sheets)
+
+
+    def sheet_by_name(self, name: str) -> SyntheticSheet:
+        return self.sheets[name]
+
+
+    def unload_sheet(self, name: str) -> None:
+        pass
+
+
+    def release_resources(self) -> None:
+        pass
+
+
+def make_assortment(count: int, rng: random.Random) -> dict:
+    """
+    Unique item names with unique four digit warehouse indexes (as read by decodetxt2rw).
+    """
+    indexes = rng.sample(range(1000, 10000), min(count, 9000))
+    assortment = {}
+    for index in indexes:
+        name = f"{rng.choice(PRODUCT_WORDS)} {rng.choice(PRODUCT_TYPES)} {rng.randint(1, 999)}X{rng.randint(1, 99)}"
+        while name in assortment:
+            name += "A"
+        assortment[name] = float(index)
+    return assortment
+
+
+def get_wz_number(number: int) -> str:
+    """
+    WZ number in the form accepted by decodexls2wz and decodetxt2rw, unique for the first 200000 numbers.
+    """
+    return f"{number % 1000:03}/{number // 1000 % 20:02}/2{number // 20000 % 10}/6"
+
+
+def make_documents(rw_count: int, assortment: dict, rng: random.Random, difference_rate: float = 0.1,
+                   max_items: int = 8) -> tuple:
+    """
+    Linked WZ and RW documents. Each RW settles 1-2 new WZ documents and sometimes also refers
+    to a WZ of an earlier RW, so the documents form groups of different sizes.
+    About difference_rate of RW documents have one quantity changed or an item missing.
+    Returns (wz_documents, rw_documents) in the json formats of decodexls2wz and decodetxt2rw.
+    """
+    names = list(assortment)
+    wz_documents = []
+    rw_documents = []
+    for rw_number in range(1, rw_count + 1):
+        wz_list = []
+        shared = []
+        if wz_documents and rng.random() < 0.2:
+            shared.append(rng.choice(wz_documents[-50:]))
+        for _ in range(rng.randint(1, 2)):
+            number = len(wz_documents) + 1
+            wz = {
+                "WZ_number": get_wz_number(number),
+                "DWS_number": f"{(number // 3) % 1000:03}/{YEAR}",
+                "items": [{"index": int(assortment[name]), "name": name, "quantity": rng.randint(1, 20)}
+                          for name in rng.sample(names, rng.randint(1, max_items))],
+            }
+            wz_documents.append(wz)
+            wz_list.append(wz)
+        quantities = {}
+        for wz in wz_list:
+            for item in wz["items"]:
+                quantities[item["index"]] = quantities.get(item["index"], 0) + item["quantity"]
+        if rng.random() < difference_rate:
+            index = rng.choice(list(quantities))
+            if rng.random() < 0.5:
+                quantities[index] += 1
+            else:
+                del quantities[index]
+        # A WZ shared with an earlier RW links the groups, its items are settled by that RW.
+        wz_list = shared + wz_list
+        rw_documents.append({
+            "RW_document": f"RW/U{rw_number:05}/{YEAR}",
+            "DWS_documents": sorted({wz["DWS_number"] for wz in wz_list}),
+            "WZ_documents": [wz["WZ_number"] for wz in wz_list],
+            "items": [{"index": index, "quantity": quantity} for index, quantity in quantities.items()],
+        })
+    return wz_documents, rw_documents
+
+
+def unique_wz(wz_documents: list) -> list:
+    """
+    WZ numbers repeat after 200000 documents; the last document of a number wins, as in WZ_json.
+    """
+    return list({wz["WZ_number"]: wz for wz in wz_documents}.values())
+
+
+def make_rw_text(rw: dict, names: dict, rng: random.Random) -> str:
+    """
+    OCR-like text of a RW scan with the header numbers and item lines decoded by decodetxt2rw.compose_rw.
+    """
+    lines = [
+        "PRZEDSIĘBIORSTWO ROBÓT DROGOWYCH",
+        f"Rozchód wewnętrzny {rw['RW_document']}",
+        "Data wystawienia: 2023-04-12  Magazyn: 01",
+        "Uwagi: TRAFIC - SŁUPSK - " + " ".join(f"WZ {wz}" for wz in rw["WZ_documents"]) + "; "
+        + " ".join(f"DWS {dws}" for dws in rw["DWS_documents"]),
+        "",
+        "LP INDEKS NAZWA TOWARU ILOŚĆ JM CENA WARTOŚĆ",
+    ]
+    for lp, item in enumerate(rw["items"], start=1):
+        price = rng.randint(100, 90000) / 100
+        lines.append(f"{lp} {item['index']} J00{rng.randint(100, 999)}ANOD {names.get(item['index'], 'TOWAR')} "
+                     f"{item['quantity']} SZT {price:.2f} {price * item['quantity']:.2f}")
+    lines += ["", "Wydał: ....................  Odebrał: ...................."]
+    return "\n".join(lines) + "\n"
+
+
+def set_jpeg_dpi(raw: bytes, dpi: int) -> bytes:
+    """
+    Writes density into the JFIF header produced by cv2.imencode.
+    """
+    return raw[:13] + struct.pack(">BHH", 1, dpi, dpi) + raw[18:]
+
+
+def to_ascii(text: str) -> str:
+    return unicodedata.normalize("NFKD", text.replace("Ł", "L").replace("ł", "l")).encode("ascii", "ignore").decode()
+
+
+def make_scan(text: str, dpi: int = 300, rng: random.Random = None) -> bytes:
+    """
+    A4 jpeg page with the text: header lines above a ruled item table, with a slight noise.
+    cv2 fonts have no Polish letters, so they are written without diacritics.
+    """
+    width, height = int(A4_INCHES[0] * dpi), int(A4_INCHES[1] * dpi)
+    scale = dpi / 300
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    y = int(150 * scale)
+    in_table = False
+    for line in text.splitlines():
+        if "INDEKS" in line:
+            in_table = True
+        if in_table:
+            cv2.line(page, (int(80 * scale), y - int(40 * scale)), (width - int(80 * scale), y - int(40 * scale)),
+                     (0, 0, 0), max(int(2 * scale), 1))
+        cv2.putText(page, to_ascii(line), (int(100 * scale), y), cv2.FONT_HERSHEY_SIMPLEX, 0.9 * scale, (0, 0, 0),
+                    max(int(2 * scale), 1))
+        y += int(60 * scale)
+        if y > height - int(100 * scale):
+            break
+    if rng is not None:
+        noise = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).integers(0, 40, page.shape[:2], dtype=np.uint8)
+        page = cv2.subtract(page, cv2.merge([noise, noise, noise]))
+    raw = cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 85])[1].tobytes()
+    return set_jpeg_dpi(raw, dpi)
+
+
+def make_dws_sheet(dws_number: str, wz_documents: list) -> SyntheticSheet:
+    """
+    DWS sheet as read by decodexls2wz: WZ count in col 8/9 of row 42, "Wz" markers in col 11,
+    WZ number in col 13, item names in col 7, quantities (or "EOWZ") in col 14.
+    """
+    rows = [[""] * DWS_SHEET_COLUMNS for _ in range(WZ_COUNT_ROW + 7)]
+    rows[WZ_COUNT_ROW][8] = "Liczba dokumentów WZ :"
+    rows[WZ_COUNT_ROW][9] = float(len(wz_documents))
+    for wz in wz_documents:
+        start = [""] * DWS_SHEET_COLUMNS
+        start[7] = "Nazwa towaru"
+        start[11] = "Wz"
+        start[13] = wz["WZ_number"]
+        start[14] = "Ilość"
+        rows.append(start)
+        for item in wz["items"]:
+            row = [""] * DWS_SHEET_COLUMNS
+            row[6] = float(len(rows))
+            row[7] = item["name"]
+            row[14] = float(item["quantity"])
+            rows.append(row)
+        end = [""] * DWS_SHEET_COLUMNS
+        end[14] = "EOWZ"
+        rows.append(end)
+        rows.append([""] * DWS_SHEET_COLUMNS)
+    return SyntheticSheet(dws_number.replace("/", "_"), rows)
+
+
+def make_dws_book(wz_documents: list) -> SyntheticBook:
+    by_dws = {}
+    for wz in wz_documents:
+        by_dws.setdefault(wz["DWS_number"], []).append(wz)
+    return SyntheticBook([make_dws_sheet(dws, wz_list) for dws, wz_list in sorted(by_dws.items())])
+
+
+def make_assortment_book(assortment: dict) -> SyntheticBook:
+    """
+    Sheet "Asortyment" read by decodexls2wz.get_assortment: names in col 3 and indexes in col 12 from row 5.
+    """
+    rows = [[""] * 13 for _ in range(ASSORTMENT_FIRST_ROW)]
+    for name, index in assortment.items():
+        row = [""] * 13
+        row[3] = name
+        row[12] = index
+        rows.append(row)
+    return SyntheticBook([SyntheticSheet("Asortyment", rows)])
+
+
+class Dataset():
+    """
+    Synthetic data of one scale: assortment, linked WZ/RW documents and OCR texts of the RW documents.
+    """
+
+    def __init__(self, rw_count: int, seed: int = 0, assortment_size: int = 2000, difference_rate: float = 0.1) -> None:
+        self.rng = random.Random(seed)
+        self.assortment = make_assortment(assortment_size, self.rng)
+        self.names = {int(index): name for name, index in self.assortment.items()}
+        self.wz_documents, self.rw_documents = make_documents(rw_count, self.assortment, self.rng, difference_rate)
+        self.wz_documents = unique_wz(self.wz_documents)
+
+
+    def rw_texts(self):
+        for rw in self.rw_documents:
+            yield make_rw_text(rw, self.names, self.rng)
+
+
+    def wz_data(self) -> dict:
+        return {wz["WZ_number"]: {"DWS_number": wz["DWS_number"], "items": wz["items"]} for wz in self.wz_documents}
+
+
+    def rw_data(self) -> dict:
+        return {rw["RW_document"]: {key: rw[key] for key in ("DWS_documents", "WZ_documents", "items")} for rw in self.rw_documents}
+
+
+    def write(self, folder: str, scans: int = 0, dpi: int = 300) -> None:
+        """
+        Files in the layout of the working directory: RW_txt/, RW_json/, WZ_json/ and the first
+        `scans` RW documents as RW_jpeg/ images. Workbooks can't be written without an xls writer,
+        their contents are saved as assortment.json and DWS_sheets.json instead.
+        """
+        for sub_folder in ("RW_txt", "RW_json", "WZ_json", "RW_jpeg"):
+            os.makedirs(os.path.join(folder, sub_folder), exist_ok=True)
+        for i, (rw, text) in enumerate(zip(self.rw_documents, self.rw_texts()), start=1):
+            with open(os.path.join(folder, "RW_txt", f"Scan_{i:06}.txt"), "w", encoding="utf-8") as stream:
+                stream.write(text)
+            save_json(rw, get_json_file_name(os.path.join(folder, "RW_json"), rw["RW_document"]))
+            if i <= scans:
+                with open(os.path.join(folder, "RW_jpeg", f"Scan_{i:06}.jpg"), "wb") as stream:
+                    stream.write(make_scan(text, dpi, self.rng))
+        for wz in self.wz_documents:
+            save_json(wz, get_json_file_name(os.path.join(folder, "WZ_json"), "WZ_" + wz["WZ_number"]))
+        with open(os.path.join(folder, "assortment.json"), "w", encoding="utf-8") as stream:
+            json.dump(self.assortment, stream, ensure_ascii=False)
+        with open(os.path.join(folder, "DWS_sheets.json"), "w", encoding="utf-8") as stream:
+            json.dump({sheet.name: sheet.rows for sheet in make_dws_book(self.wz_documents).sheets.values()}, stream, ensure_ascii=False)
+
+
+@click.command()
+@click.option("--rw", "rw_count", type=click.IntRange(min=1), show_default=True, default=100, help="Liczba dokumentów RW.")
+@click.option("--scans", type=click.IntRange(min=0), show_default=True, default=10, help="Liczba dokumentów RW zapisanych również jako obrazy jpeg.")
+@click.option("--dpi", type=int, show_default=True, default=300, help="Rozdzielczość obrazów.")
+@click.option("--assortment-size", type=click.IntRange(min=10, max=9000), show_default=True, default=2000, help="Liczba pozycji asortymentu.")
+@click.option("--seed", type=int, show_default=True, default=0, help="Ziarno generatora liczb losowych.")
+@click.argument("folder", nargs=1)
+def main(rw_count: int, scans: int, dpi: int, assortment_size: int, seed: int, folder: str):
+    """
+    Program generuje syntetyczne dane testowe: powiązane dokumenty WZ i RW, teksty i obrazy skanów RW
+    oraz zawartość skoroszytów asortymentu i DWSygn, w układzie katalogów roboczych.\n
+    Przykład:\n
+    >python synthdata.py --rw 10000 --scans 20 dane_testowe\n
+    v1.0.0
+    """
+    dataset = Dataset(rw_count, seed, assortment_size)
+    dataset.write(folder, scans, dpi)
+    print(f"Zapisano {len(dataset.rw_documents)} RW i {len(dataset.wz_documents)} WZ w katalogu {folder}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import random
+
+import assortment
+
+
+ASSORTMENT = {"PŁYTA CHODNIKOWA 50X50": 2167.0, "LATARNIA SOLARNA": 1815.0, "KRAWĘŻNIK DROGOWY": 2405.0, "": ""}
+
+
+def test_exact_name_has_its_index():
+    index = assortment.AssortmentIndex(ASSORTMENT)
+    assert index.get("LATARNIA SOLARNA", 0) == 1815.0
+
+
+def test_similar_name_gets_best_match():
+    index = assortment.AssortmentIndex(ASSORTMENT)
+    name, score = index.match("PLYTA CHODNIKOWA 50x50")
+    assert name == "PŁYTA CHODNIKOWA 50X50"
+    assert 0.8 <= score < 1
+    assert index.get("PLYTA CHODNIKOWA 50x50", 0) == 2167.0
+    assert index.match("latarnia  solarna") == ("LATARNIA SOLARNA", 1.0)
+
+
+def test_dissimilar_name_gets_default():
+    index = assortment.AssortmentIndex(ASSORTMENT)
+    assert index.get("ŁAWKA PARKOWA", 0) == 0
+    assert index.get("XYZ", 0) == 0
+    strict = assortment.AssortmentIndex(ASSORTMENT, min_score=1)
+    assert strict.get("PLYTA CHODNIKOWA 50x50", 0) == 0
+
+
+def test_index_is_cached_until_workbook_changes(tmp_path):
+    workbook = tmp_path / "asortyment.xls"
+    cache_file = str(tmp_path / "index.pickle")
+    workbook.write_bytes(b"first")
+    reads = []
+
+    def read_assortment(filename):
+        reads.append(filename)
+        return dict(ASSORTMENT)
+
+    index, from_cache = assortment.get_assortment_index(str(workbook), read_assortment, cache_file)
+    assert not from_cache and index.get("LATARNIA SOLARNA") == 1815.0
+    index, from_cache = assortment.get_assortment_index(str(workbook), read_assortment, cache_file, min_score=0.5)
+    assert from_cache and index.min_score == 0.5 and len(reads) == 1
+    workbook.write_bytes(b"second")
+    _, from_cache = assortment.get_assortment_index(str(workbook), read_assortment, cache_file)
+    assert not from_cache and len(reads) == 2
+
+
+def test_lookup_in_large_assortment_finds_reformatted_names():
+    rng = random.Random(0)
+    words = ["PŁYTA", "KOSTKA", "KRAWĘŻNIK", "LATARNIA", "SŁUPEK", "RURA", "KRATKA", "OBRZEŻE", "STUDNIA", "POKRYWA"]
+    names = {f"{rng.choice(words)} {rng.choice(words)} {rng.randint(1, 999)}X{rng.randint(1, 99)}": float(i) for i in range(30_000)}
+    index = assortment.AssortmentIndex(names)
+    queries = [name.lower().replace("X", " X") for name in rng.sample(list(names), 200)]
+    assert all(score > 0.7 for _, score in (index.match(query) for query in queries))
@@ -0,0 +1,58 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from click.testing import CliRunner
+
+import cli
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ["cv2", "numpy", "pandas", "pytesseract", "tqdm", "xlrd", "xlsxwriter"]
+
+# Modules a subcommand must not load; None is the help of the group itself.
+NOT_LOADED = {
+    None: HEAVY_MODULES,
+    "check": HEAVY_MODULES,
+    "decode": ["cv2", "numpy", "pandas", "pytesseract", "xlrd"],
+    "extract-wz": ["cv2", "pandas", "pytesseract"],
+    "ocr": ["pandas", "pytesseract", "xlrd"],
+    "queue": HEAVY_MODULES,
+    "pipeline": ["pandas", "pytesseract", "xlrd", "xlsxwriter"],
+    "synth": ["pandas", "pytesseract", "tqdm", "xlrd", "xlsxwriter"],
+}
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+from click.testing import CliRunner
+import cli
+result = CliRunner().invoke(cli.main, sys.argv[1:] + ["--help"])
+print(json.dumps({"seconds": time.perf_counter() - start, "exit_code": result.exit_code, "modules": sorted(sys.modules)}))
+"""
+
+
+def measure_import(*args) -> dict:
+    """
+    Imports of a subcommand with its help, in a new interpreter.
+    """
+    output = subprocess.run([sys.executable, "-c", MEASURE, *args], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("command", list(NOT_LOADED))
+def test_subcommand_imports_only_its_dependencies(command, record_property):
+    result = measure_import(*([command] if command else []))
+    record_property("import_seconds", result["seconds"])
+    assert result["exit_code"] == 0
+    assert [module for module in NOT_LOADED[command] if module in result["modules"]] == []
+
+
+def test_all_commands_are_loaded():
+    runner = CliRunner()
+    for name in cli.COMMANDS:
+        result = runner.invoke(cli.main, [name, "--help"])
+        assert result.exit_code == 0, result.output
+        assert result.output.startswith(f"Usage: main {name}")
@@ -0,0 +1,107 @@
+import json
+import sqlite3
+
+from click.testing import CliRunner
+import pytest
+
+import columnar
+import docstore
+import rwchecker
+from test_rwchecker import random_documents
+
+
+def make_store(path, wz_data: dict, rw_data: dict) -> docstore.SQLiteStore:
+    store = docstore.SQLiteStore(str(path))
+    for number, wz in wz_data.items():
+        store.put_wz({"WZ_number": number, **wz})
+    for number, rw in rw_data.items():
+        store.put_rw({"RW_document": number, **rw})
+    store.commit()
+    return store
+
+
+def compare_objects(store: docstore.SQLiteStore) -> tuple:
+    comparator = rwchecker.RWComparator([], [])
+    comparator.load_from_store(store)
+    comparator.get_dependencies()
+    references = rwchecker.sort_references(comparator.references, comparator.wz_data)
+    return references, [rwchecker.CompareSet(wz_list, rw_list, comparator.wz_data, comparator.rw_data) for wz_list, rw_list in references]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_compare_groups_matches_compare_set(tmp_path, seed):
+    store = make_store(tmp_path / "rw.sqlite", *random_documents(seed))
+    references, expected = compare_objects(store)
+    compared_references, compared = columnar.compare_groups(store.connection)
+    assert [(sorted(wz), sorted(rw)) for wz, rw in compared_references] == [(sorted(wz), sorted(rw)) for wz, rw in references]
+    assert columnar.verify_groups(compared, expected) == []
+    assert [result.is_matching() for result in compared] == [compare_set.is_matching() for compare_set in expected]
+
+
+def test_repeated_indexes_and_missing_wz(tmp_path):
+    wz_data = {
+        "002/01/23/6": {"DWS_number": "001/23", "items": [{"index": 1000, "name": "B1", "quantity": 2},
+                                                          {"index": 1000, "name": "B2", "quantity": 3}]},
+        "001/01/23/6": {"DWS_number": "002/23", "items": [{"index": 1000, "name": "A", "quantity": 1},
+                                                          {"index": 2000, "name": "C", "quantity": 4}]},
+    }
+    rw_data = {
+        "RW/U00001/23": {"DWS_documents": [], "WZ_documents": ["001/01/23/6", "003/01/23/6"], "items": [{"index": 1000, "quantity": 6}]},
+        "RW/U00002/23": {"DWS_documents": [], "WZ_documents": ["002/01/23/6"], "items": [{"index": 3000, "quantity": 1}]},
+        "RW/U00003/23": {"DWS_documents": [], "WZ_documents": [], "items": [{"index": 2000, "quantity": 9}]},
+    }
+    store = make_store(tmp_path / "rw.sqlite", wz_data, rw_data)
+    references, results = columnar.compare_groups(store.connection)
+    assert len(references) == 2
+    assert results[0].wz_dict["WZ_numbers"] == ["002/01/23/6"]
+    assert list(results[0].rows()) == [("RÓŻNICA", 1000, 5, 0, "B2"), ("RÓŻNICA", 3000, 0, 1, "")]
+    assert results[1].wz_dict == {"WZ_numbers": ["001/01/23/6", "Nie znaleziono WZ: 003/01/23/6"], "DWS_numbers": ["002/23"]}
+    assert list(results[1].rows()) == [("RÓŻNICA", 1000, 1, 6, "A"), ("RÓŻNICA", 2000, 4, 0, "C")]
+    assert columnar.verify_groups(results, compare_objects(store)[1]) == []
+
+
+def test_item_names_are_added_to_old_database(tmp_path):
+    db_file = str(tmp_path / "rw.sqlite")
+    wz = {"WZ_number": "001/01/23/6", "DWS_number": "001/23", "items": [{"index": 1000, "name": "TOWAR", "quantity": 2}]}
+    connection = sqlite3.connect(db_file)
+    connection.executescript(docstore.SQLITE_SCHEMA.replace(", name TEXT", ""))
+    connection.execute("INSERT INTO wz (number, dws, body) VALUES (?, ?, ?)", (wz["WZ_number"], wz["DWS_number"], json.dumps(wz)))
+    connection.execute("INSERT INTO item (kind, number, idx, quantity) VALUES ('WZ', '001/01/23/6', 1000, 2)")
+    connection.commit()
+    connection.close()
+    store = docstore.SQLiteStore(db_file)
+    assert store.connection.execute("SELECT kind, number, idx, quantity, name FROM item").fetchall() == [("WZ", "001/01/23/6", 1000, 2, "TOWAR")]
+
+
+def test_engine_columnar_writes_the_same_report(tmp_path):
+    db_file = str(tmp_path / "rw.sqlite")
+    make_store(db_file, *random_documents(3)).close()
+    runner = CliRunner()
+    for engine in rwchecker.ENGINES:
+        verify = ["--verify"] if engine == "columnar" else []
+        result = runner.invoke(rwchecker.main, ["--store", "sqlite", "--db", db_file, "--engine", engine, "-o", str(tmp_path / f"{engine}.txt")] + verify)
+        assert result.exit_code == 0, result.output
+    assert (tmp_path / "columnar.txt").read_text(encoding="utf-8") == (tmp_path / "objects.txt").read_text(encoding="utf-8")
+
+
+def test_verify_fails_on_different_result(tmp_path, monkeypatch):
+    db_file = str(tmp_path / "rw.sqlite")
+    make_store(db_file, *random_documents(3)).close()
+    aggregate = columnar.aggregate
+
+    def aggregate_with_error(columns):
+        totals = aggregate(columns)
+        totals["rw_quantity"][0] += 1
+        return totals
+
+    monkeypatch.setattr(columnar, "aggregate", aggregate_with_error)
+    result = CliRunner().invoke(rwchecker.main, ["--store", "sqlite", "--db", db_file, "--engine", "columnar", "--verify"])
+    assert result.exit_code == 1
+    assert "Różny wynik silnika columnar dla grupy WZ" in result.output
+
+
+@pytest.mark.parametrize("arguments", [["--engine", "columnar"], ["--store", "sqlite", "--engine", "columnar", "--jobs", "2"],
+                                       ["--store", "sqlite", "--engine", "columnar", "--incremental"], ["--verify"]])
+def test_engine_columnar_rejects_other_options(arguments):
+    result = CliRunner().invoke(rwchecker.main, arguments)
+    assert result.exit_code == 2
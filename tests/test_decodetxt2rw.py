@@ -59,3 +59,45 @@ def test_get_index(input, expected):
 ])
 def test_get_count(input, expected):
     assert dt2rw.get_count(input) == expected
+
+
+RW_TEXTS = [
+    """ZAKŁAD -RW/U00054/22 Rw/U00018/23
+TRAFIC - SŁUPSK - WZ 244/04/22/6; DWS 060/22 dws 123/23 , DWs234/23, 090/22
+wz 123/01/22/6 , WZ234/01/23/6 DWS
+060/22
+LP INDEKS NAZWA CENA
+—”) 1815 J00072PODK LATARNIA MONDIAL FUTURLED3 3x300 230V R-Y-G OGÓL 4 SZT 775.00 3 100.00
+20 ŻELKOWA KOLONII: SIEDLECKA DW803 EEE
+2167 J00171ANOD PŁYTA PW-95 2 SZT 24.60 49.20
+m. 2160 UCHWYT UW-108,CYBANT M12x108x149 gwint 50 oci2um 4SZT 5.83 23.32
+- 2405 LISTWA LPC-FUT-2*200-595-496 123 SZT 14.00 14.00
+1999 BEZ ILOSCI
+""",
+    """1234 NAGŁÓWEK PRZED TABELĄ 5 SZT
+INDEKS 2020 NAZWA 7 SZT
+2021 POZYCJA 1 SZT""",
+    "rw/u1/29 wz 001/01/29/6",
+]
+
+
+def legacy_compose_rw(raw_text: str) -> dict:
+    return {
+        "RW_document": dt2rw.decode_rw_number(raw_text),
+        "DWS_documents": dt2rw.decode_dws_numbers(raw_text),
+        "WZ_documents": dt2rw.decode_wz_numbers(raw_text),
+        "items": [dt2rw.decode_item(line) for line in dt2rw.item_lines_generator(raw_text)],
+    }
+
+
+@pytest.mark.parametrize("raw_text", RW_TEXTS[:2])
+def test_compose_rw_matches_separate_decoders(raw_text):
+    assert dt2rw.compose_rw(raw_text) == legacy_compose_rw(raw_text)
+
+
+def test_compose_rw_without_items_header():
+    rw = dt2rw.compose_rw(RW_TEXTS[2])
+    assert rw["RW_document"] == "RW/U1/29"
+    assert rw["WZ_documents"] == ["001/01/29/6"]
+    assert rw["items"] == []
+    assert dt2rw.compose_rw("")["items"] == []
@@ -0,0 +1,115 @@
+import random
+
+import pytest
+
+import decodexls2wz
+
+
+class FakeSheet():
+    """
+    Minimal xlrd sheet: cells given as a list of rows.
+    """
+
+    def __init__(self, name: str, rows: list) -> None:
+        self.name = name
+        self.ncols = max(len(row) for row in rows)
+        self.rows = [row + [""] * (self.ncols - len(row)) for row in rows]
+        self.nrows = len(rows)
+
+    def cell_value(self, row: int, col: int):
+        return self.rows[row][col]
+
+    def col_values(self, col: int, start_rowx: int = 0, end_rowx: int = None) -> list:
+        return [row[col] for row in self.rows[start_rowx:end_rowx]]
+
+    def row_values(self, row: int, start_colx: int = 0, end_colx: int = None) -> list:
+        return self.rows[row][start_colx:end_colx]
+
+
+class FakeBook():
+
+    def __init__(self, sheets: list, on_demand: bool = True) -> None:
+        self.sheets = {sheet.name: sheet for sheet in sheets}
+        self.on_demand = on_demand
+        self.unloaded = []
+
+    def sheet_by_name(self, name: str) -> FakeSheet:
+        return self.sheets[name]
+
+    def unload_sheet(self, name: str) -> None:
+        self.unloaded.append(name)
+
+
+def make_dws_sheet(name: str, wz_documents: list) -> FakeSheet:
+    """
+    DWS sheet layout read by decodexls2wz: WZ count in col 8/9 from row 41, "Wz" markers in col 11,
+    item names in col 7, WZ numbers in col 13, quantities (or "EOWZ") in col 14.
+    """
+    rows = [[""] * 15 for _ in range(45)]
+    rows[42][8] = "Liczba dokumentów WZ :"
+    rows[42][9] = float(len(wz_documents))
+    for wz_number, items in wz_documents:
+        start = [""] * 15
+        start[11] = "Wz"
+        start[13] = wz_number
+        start[14] = "Ilość"
+        rows.append(start)
+        for item_name, quantity in items:
+            row = [""] * 15
+            row[7] = item_name
+            row[14] = float(quantity)
+            rows.append(row)
+        end = [""] * 15
+        end[14] = "EOWZ"
+        rows.append(end)
+        rows.append([""] * 15)
+    return FakeSheet(name, rows)
+
+
+ASSORTMENT = {"PŁYTA": 2167.0, "LATARNIA": 1815.0}
+DWS_SHEET = make_dws_sheet("001_23", [
+    ("001/01/23/6", [("PŁYTA", 2), ("LATARNIA", 4)]),
+    ("002/01/23/6", [("NIEZNANY", 1)]),
+])
+
+
+def test_extract_sheet_wz_unloads_sheet():
+    book = FakeBook([DWS_SHEET])
+    wz_list = decodexls2wz.extract_sheet_wz(ASSORTMENT, book, "001_23")
+    assert wz_list == [
+        {"WZ_number": "001/01/23/6", "DWS_number": "001/23", "items": [
+            {"index": 2167, "name": "PŁYTA", "quantity": 2}, {"index": 1815, "name": "LATARNIA", "quantity": 4}]},
+        {"WZ_number": "002/01/23/6", "DWS_number": "001/23", "items": [{"index": 0, "name": "NIEZNANY", "quantity": 1}]},
+    ]
+    assert book.unloaded == ["001_23"]
+
+
+def test_extract_sheet_wz_keeps_fully_loaded_sheet():
+    book = FakeBook([DWS_SHEET], on_demand=False)
+    decodexls2wz.extract_sheet_wz(ASSORTMENT, book, "001_23")
+    assert book.unloaded == []
+
+
+def random_dws_sheet(seed: int) -> FakeSheet:
+    rng = random.Random(seed)
+    names = list(ASSORTMENT) + ["NIEZNANY", "INNY"]
+    wz_documents = [(f"{i:03}/{rng.randint(1, 12):02}/23/6", [(rng.choice(names), rng.randint(1, 9)) for _ in range(rng.randint(0, 5))])
+                    for i in range(rng.randint(1, 6))]
+    sheet = make_dws_sheet(f"{seed:03}_23", wz_documents)
+    # A marker of a WZ not counted on the sheet is ignored by both readers.
+    if seed % 2:
+        sheet.rows.append([""] * 11 + ["Wz", "", "", "EOWZ"])
+        sheet.nrows += 1
+    return sheet
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_scan_dws_sheet_matches_get_wz_content(seed):
+    sheet = random_dws_sheet(seed)
+    expected = [decodexls2wz.get_wz_content(ASSORTMENT, sheet, start_row=sr) for sr in decodexls2wz.get_wz_start(sheet)]
+    assert decodexls2wz.scan_dws_sheet(ASSORTMENT, sheet) == expected
+
+
+def test_scan_dws_sheet_without_wz_count():
+    sheet = FakeSheet("001_23", [[""] * 15 for _ in range(50)])
+    assert decodexls2wz.scan_dws_sheet(ASSORTMENT, sheet) == []
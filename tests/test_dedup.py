@@ -0,0 +1,109 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+import random
+
+import cv2
+import numpy as np
+import pytest
+
+import dedup
+import rwimage2txt
+import synthdata
+
+
+DATASET = synthdata.Dataset(2, seed=7, assortment_size=50)
+
+
+def rescan(raw: bytes, angle: float, shift: int) -> bytes:
+    page = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+    height, width = page.shape
+    rotation = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+    rotation[:, 2] += shift
+    page = cv2.warpAffine(page, rotation, (width, height), borderValue=255)
+    return synthdata.set_jpeg_dpi(cv2.imencode(".jpg", page, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes(), 300)
+
+
+def test_index_finds_every_hash_within_distance():
+    rng = random.Random(0)
+    index = dedup.DuplicateIndex(max_distance=6)
+    hashes = [rng.getrandbits(dedup.HASH_BITS) for _ in range(200)]
+    for page_hash in hashes:
+        index.add(page_hash)
+    for _ in range(100):
+        page_hash = rng.choice(hashes)
+        for bit in rng.sample(range(dedup.HASH_BITS), rng.randint(0, 6)):
+            page_hash ^= 1 << bit
+        number, distance = index.find(page_hash)
+        nearest = min(dedup.hamming(page_hash, other) for other in hashes)
+        assert distance == nearest == dedup.hamming(page_hash, hashes[number])
+    assert index.find(rng.getrandbits(dedup.HASH_BITS)) == (None, None)
+
+
+def test_group_duplicates_points_to_first_page():
+    assert dedup.group_duplicates([0b1111, 0b0000, 0b1110, None, None, 0b0001], max_distance=1) == \
+        [(0, 0), (1, 0), (0, 1), (3, 0), (4, 0), (1, 1)]
+
+
+def get_ink_rect(ink) -> tuple:
+    return cv2.boundingRect(cv2.findNonZero(cv2.threshold(ink, 127, 255, cv2.THRESH_BINARY)[1]))
+
+
+@pytest.mark.parametrize("angle", [-2.5, 2.5])
+def test_deskew_rotates_around_page_centre(angle):
+    ink = np.zeros((1754, 1240), dtype=np.uint8)
+    cv2.rectangle(ink, (60, 50), (1180, 1704), 255, 3)
+    for row in range(38):
+        cv2.putText(ink, f"{2100 + row} PLYTA PW-95 {row % 7 + 1} SZT 24.60 49.20", (80, 100 + row * 42), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 255, 2)
+    skewed = cv2.warpAffine(ink, cv2.getRotationMatrix2D((620, 877), angle, 1.0), (1240, 1754))
+    x, y, width, height = get_ink_rect(dedup.deskew(skewed))
+    expected_x, expected_y, expected_width, expected_height = get_ink_rect(ink)
+    assert abs(x - expected_x) <= 2 and abs(y - expected_y) <= 2
+    assert abs(width - expected_width) <= 4 and abs(height - expected_height) <= 4
+
+
+def test_blank_pages_have_no_hash_and_are_not_grouped():
+    rng = np.random.default_rng(0)
+    blank = np.full((1754, 1240), 250, dtype=np.uint8)
+    noisy = np.clip(blank + rng.normal(0, 3, blank.shape), 0, 255).astype(np.uint8)
+    hashes = [dedup.get_page_hash(page) for page in (blank, noisy, np.full_like(blank, 128))]
+    assert hashes == [None, None, None]
+    assert dedup.group_duplicates(hashes) == [(0, 0), (1, 0), (2, 0)]
+    raw = synthdata.make_scan(next(DATASET.rw_texts()), rng=random.Random(1))
+    assert dedup.get_scan_hash(raw) is not None
+
+
+def write_scans(tmp_path) -> list:
+    rng = random.Random(1)
+    first, second = list(DATASET.rw_texts())[:2]
+    files = {
+        "a.jpg": synthdata.make_scan(first, rng=rng),
+        "b.jpg": synthdata.make_scan(second, rng=rng),
+        "a_rescan.jpg": rescan(synthdata.make_scan(first, rng=rng), 0.4, 25),
+    }
+    filenames = []
+    for name, raw in files.items():
+        filenames.append(str(tmp_path / name))
+        with open(filenames[-1], "wb") as stream:
+            stream.write(raw)
+    return filenames
+
+
+@pytest.mark.parametrize("confirm", [True, False])
+def test_rescanned_page_is_found_and_other_page_is_not(monkeypatch, tmp_path, confirm):
+    monkeypatch.setattr(rwimage2txt, "read_header_number", lambda filename, **kwargs: "RW/U00001/23" if "a" in os.path.basename(filename) else None)
+    filenames = write_scans(tmp_path)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        representatives, duplicates = rwimage2txt.find_duplicates(pool, filenames, confirm=confirm)
+    assert representatives == filenames[:2]
+    assert [(duplicate, representative) for duplicate, representative, _, _ in duplicates] == [(filenames[2], filenames[0])]
+
+
+@pytest.mark.parametrize("rescan_number", ["RW/U00002/23", None])
+def test_duplicate_with_other_or_unread_rw_number_is_recognised(monkeypatch, tmp_path, rescan_number):
+    numbers = {"a.jpg": "RW/U00001/23", "b.jpg": "RW/U00003/23", "a_rescan.jpg": rescan_number}
+    monkeypatch.setattr(rwimage2txt, "read_header_number", lambda filename, **kwargs: numbers[os.path.basename(filename)])
+    filenames = write_scans(tmp_path)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        representatives, duplicates = rwimage2txt.find_duplicates(pool, filenames)
+    assert representatives == filenames
+    assert duplicates == []
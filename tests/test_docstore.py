@@ -0,0 +1,48 @@
+import docstore
+
+
+RW = {"RW_document": "RW/U00001/23", "DWS_documents": ["001/23"], "WZ_documents": ["001/01/23/6"],
+      "items": [{"index": 2167, "quantity": 2}]}
+WZ = {"WZ_number": "001/01/23/6", "DWS_number": "001/23", "items": [{"index": 2167, "name": "PŁYTA", "quantity": 2}]}
+
+
+def make_stores(tmp_path):
+    return [
+        docstore.FolderStore(str(tmp_path / "txt"), str(tmp_path / "rw"), str(tmp_path / "wz")),
+        docstore.SQLiteStore(str(tmp_path / "documents.sqlite")),
+    ]
+
+
+def test_stores_round_trip(tmp_path):
+    for store in make_stores(tmp_path):
+        store.put_text("Scan_0001", "RW/U00001/23")
+        store.put_rw(RW)
+        store.put_wz(WZ)
+        store.commit()
+        [source] = store.list_texts()
+        assert store.get_text(source) == "RW/U00001/23"
+        assert store.load_rw_data() == {"RW/U00001/23": docstore.rw_entry(RW)}
+        assert store.load_wz_data() == {"001/01/23/6": docstore.wz_entry(WZ)}
+        assert store.rw_exists("RW/U00001/23")
+        assert store.delete_rw("RW/U00001/23")
+        assert not store.rw_exists("RW/U00001/23")
+        assert store.load_rw_data() == {}
+        store.close()
+
+
+def test_sqlite_indexes_and_replace(tmp_path):
+    store = docstore.SQLiteStore(str(tmp_path / "documents.sqlite"))
+    store.put_rw(RW)
+    store.put_rw(dict(RW, items=[{"index": 1815, "quantity": 4}]))
+    rows = store.connection.execute("SELECT number, idx, quantity FROM item WHERE kind = 'RW'").fetchall()
+    assert rows == [("RW/U00001/23", 1815, 4)]
+    assert store.connection.execute("SELECT rw FROM rw_wz WHERE wz = '001/01/23/6'").fetchall() == [("RW/U00001/23",)]
+    assert store.list_texts(["Scan_*"]) == []
+    store.close()
+
+
+def test_load_json_reports_errors(tmp_path, capsys):
+    broken = tmp_path / "broken.json"
+    broken.write_text("{", encoding="utf-8")
+    assert docstore.load_json(str(broken)) == {}
+    assert "broken.json" in capsys.readouterr().err
@@ -0,0 +1,54 @@
+import copy
+
+import groupcache
+import rwchecker
+from test_rwchecker import random_documents
+
+
+def run(references, wz_data, rw_data, cache):
+    compared = []
+
+    def compare(references):
+        compared.extend(references)
+        return (rwchecker.CompareSet(wz_list, rw_list, wz_data, rw_data) for wz_list, rw_list in references)
+
+    changed = []
+    results = list(groupcache.compare_incremental(references, wz_data, rw_data, cache, compare, changed.append))
+    return results, compared, changed
+
+
+def get_references(wz_data, rw_data):
+    comparator = rwchecker.RWComparator([], [])
+    comparator.wz_data, comparator.rw_data = wz_data, rw_data
+    comparator.get_dependencies()
+    return rwchecker.sort_references(comparator.references, wz_data)
+
+
+def test_rerun_compares_only_changed_groups(tmp_path):
+    cache_file = str(tmp_path / "groups.json")
+    wz_data, rw_data = random_documents(2)
+    references = get_references(wz_data, rw_data)
+    cache = groupcache.GroupCache(cache_file)
+    first, compared, _ = run(references, wz_data, rw_data, cache)
+    cache.save()
+    assert len(compared) == len(references)
+
+    rw_data = copy.deepcopy(rw_data)
+    rw_number = next(rw_list[0] for _, rw_list in references if rw_list)
+    rw_data[rw_number]["items"].append({"index": 1234, "quantity": 7})
+    cache = groupcache.GroupCache(cache_file)
+    second, compared, changed = run(references, wz_data, rw_data, cache)
+    assert len(compared) == 1 and rw_number in compared[0][1]
+    assert [result.rw_dict["RW_numbers"] for result in changed] == [sorted(compared[0][1])]
+    assert len(cache.obsolete()) == 1
+    expected = [rwchecker.CompareSet(wz_list, rw_list, wz_data, rw_data) for wz_list, rw_list in references]
+    assert [list(result.rows()) for result in second] == [list(c.rows()) for c in expected]
+    assert [result.wz_dict for result in second] == [{"WZ_numbers": c.wz_dict["WZ_numbers"], "DWS_numbers": c.wz_dict["DWS_numbers"]} for c in expected]
+
+
+def test_group_key_depends_on_missing_wz():
+    wz_data = {"001/01/23/6": {"DWS_number": "001/23", "items": []}}
+    rw_data = {"RW/U00001/23": {"DWS_documents": [], "WZ_documents": ["001/01/23/6", "002/01/23/6"], "items": []}}
+    key = groupcache.get_group_key(["001/01/23/6", "002/01/23/6"], ["RW/U00001/23"], wz_data, rw_data)
+    wz_data["002/01/23/6"] = {"DWS_number": "002/23", "items": []}
+    assert key != groupcache.get_group_key(["001/01/23/6", "002/01/23/6"], ["RW/U00001/23"], wz_data, rw_data)
@@ -0,0 +1,38 @@
+import cv2
+import numpy as np
+
+import layout
+from preprocess import prepare_page
+
+
+def make_page():
+    page = np.full((600, 400, 3), 255, dtype=np.uint8)
+    cv2.putText(page, "RW/U00054/22", (20, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    for y in (200, 260, 320, 380):
+        cv2.line(page, (10, y), (390, y), (0, 0, 0), 2)
+    cv2.putText(page, "INDEKS NAZWA", (20, 240), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    cv2.putText(page, "2167 PLYTA", (20, 300), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    cv2.putText(page, "podpis", (20, 500), cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 0), 2)
+    return page
+
+
+def test_get_rulings():
+    _, detected_lines = prepare_page(cv2.cvtColor(make_page(), cv2.COLOR_BGR2GRAY))
+    rulings = layout.get_rulings(detected_lines)
+    assert len(rulings) == 4
+    assert all(abs(a - b) <= 2 for a, b in zip(rulings, (200, 260, 320, 380)))
+
+
+def test_find_regions_skips_margins_and_signature():
+    page, detected_lines = prepare_page(cv2.cvtColor(make_page(), cv2.COLOR_BGR2GRAY))
+    regions = layout.find_regions(page, detected_lines)
+    x, y, w, h = regions["header"]
+    assert y + h <= 200
+    x, y, w, h = regions["table"]
+    assert y >= 195 and y + h <= 385
+    assert len(regions["rows"]) == 2
+
+
+def test_ocr_regions_falls_back_to_whole_page():
+    page = np.full((100, 100), 255, dtype=np.uint8)
+    assert layout.ocr_regions(page, np.zeros_like(page), lambda image: str(image.shape)) == "(100, 100)"
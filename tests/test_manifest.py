@@ -0,0 +1,35 @@
+import os
+
+import manifest
+
+
+def test_manifest_round_trip_and_change_detection(tmp_path):
+    source = tmp_path / "Scan_0001.txt"
+    source.write_text("RW/U00001/23", encoding="utf-8")
+    m = manifest.Manifest(str(tmp_path / "temp" / "manifest.json"))
+    assert not m.is_unchanged(str(source))
+    m.update(str(source), manifest.hash_text("RW/U00001/23"), "RW/U00001/23", {"items": 1})
+    m.save()
+
+    m = manifest.Manifest(str(tmp_path / "temp" / "manifest.json"))
+    assert m.is_unchanged(str(source))
+    assert m.get_output(str(source)) == "RW/U00001/23"
+    assert m.get_report(str(source)) == {"items": 1}
+    source.write_text("RW/U00002/23 changed", encoding="utf-8")
+    assert not m.is_unchanged(str(source))
+
+
+def test_vanished_sources_and_shared_outputs(tmp_path):
+    sources = []
+    for name in ("a.txt", "b.txt"):
+        path = tmp_path / name
+        path.write_text(name)
+        sources.append(str(path))
+    m = manifest.Manifest(str(tmp_path / "manifest.json"))
+    for source in sources:
+        m.update(source, "hash", "RW/U00001/23")
+    os.remove(sources[0])
+    assert m.vanished_sources(sources[1:]) == [sources[0]]
+    m.remove(sources[0])
+    assert m.is_output_used("RW/U00001/23")
+    assert not m.is_output_used("RW/U00002/23")
@@ -0,0 +1,64 @@
+import json
+import pstats
+
+import click
+from click.testing import CliRunner
+
+import metrics
+
+
+def work(item):
+    with metrics.stage("square"):
+        return item * item
+
+
+@click.command()
+@metrics.instrumented("test")
+def command():
+    for item in range(5):
+        with metrics.document(f"doc{item}"):
+            with metrics.stage("add", items=2):
+                pass
+    output = metrics.worker(work)(3)
+    assert metrics.collect(output, "doc_worker") == 9
+
+
+def test_stages_without_metrics_do_nothing():
+    assert metrics.current() is None
+    with metrics.stage("stage"):
+        with metrics.document("doc"):
+            pass
+    assert metrics.collect(metrics.worker(work)(4), "doc") == 16
+
+
+def test_slowest_documents_are_ordered():
+    session = metrics.Metrics("test", slowest=3)
+    for wall in [0.5, 0.1, 0.9, 0.3, 0.7]:
+        session.add_document(f"doc{wall}", wall, 0.0)
+    data = session.to_dict()
+    assert [entry["document"] for entry in data["slowest"]] == ["doc0.9", "doc0.7", "doc0.5"]
+    assert len(data["documents"]) == 5
+
+
+def test_run_timed_result_is_merged():
+    session = metrics.Metrics("test")
+    result, state = metrics.run_timed(work, 5)
+    assert result == 25
+    session.merge(state, "doc")
+    assert session.stages["square"]["calls"] == 1
+    assert session.to_dict()["slowest"][0]["stages"]["square"]["items"] == 1
+
+
+def test_instrumented_command_writes_metrics_and_profile(tmp_path):
+    metrics_file, profile_file = str(tmp_path / "metrics.json"), str(tmp_path / "profile.prof")
+    result = CliRunner().invoke(command, ["--metrics", metrics_file, "--profile", profile_file])
+    assert result.exit_code == 0, result.output
+    with open(metrics_file, "r", encoding="utf-8") as stream:
+        data = json.load(stream)
+    assert data["command"] == "test"
+    assert data["stages"]["add"] == {**data["stages"]["add"], "calls": 5, "items": 10}
+    assert data["stages"]["square"]["calls"] == 1
+    assert len(data["documents"]) == 6
+    functions = {name for _, _, name in pstats.Stats(profile_file).stats}
+    assert "work" in functions
+    assert metrics.current() is None
@@ -0,0 +1,92 @@
+import sys
+import threading
+import types
+
+import numpy as np
+import pytest
+
+import ocrbackend
+
+
+class FakeAPI():
+    created = []
+
+    def __init__(self, lang: str, oem: int, psm: int) -> None:
+        self.psm = psm
+        self.image = None
+        self.ended = False
+        FakeAPI.created.append(self)
+
+    def SetPageSegMode(self, psm: int) -> None:
+        self.psm = psm
+
+    def SetImageBytes(self, data: bytes, width: int, height: int, bytes_per_pixel: int, bytes_per_line: int) -> None:
+        self.image = (len(data), width, height, bytes_per_pixel, bytes_per_line)
+
+    def GetUTF8Text(self) -> str:
+        return f"RW/U00001/23 psm {self.psm}\n"
+
+    def MeanTextConf(self) -> int:
+        return 87
+
+    def End(self) -> None:
+        self.ended = True
+
+
+@pytest.fixture
+def fake_tesserocr(monkeypatch):
+    FakeAPI.created = []
+    module = types.SimpleNamespace(PyTessBaseAPI=FakeAPI, OEM=int, PSM=int)
+    monkeypatch.setitem(sys.modules, "tesserocr", module)
+    monkeypatch.setattr(ocrbackend, "_workers", threading.local())
+    return module
+
+
+def test_backend_interface_is_abstract():
+    with pytest.raises(TypeError):
+        ocrbackend.OCRBackend()
+
+
+def test_get_backend_selects_backend_by_name(monkeypatch):
+    monkeypatch.setattr(ocrbackend, "_workers", threading.local())
+    backend = ocrbackend.get_backend("pytesseract")
+    assert isinstance(backend, ocrbackend.PytesseractBackend)
+    assert ocrbackend.get_backend("pytesseract") is backend
+    with pytest.raises(KeyError):
+        ocrbackend.get_backend("other")
+
+
+def test_is_available(monkeypatch, fake_tesserocr):
+    assert ocrbackend.PytesseractBackend.is_available()
+    assert ocrbackend.TesserocrBackend.is_available()
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    assert not ocrbackend.TesserocrBackend.is_available()
+
+
+def test_tesserocr_engine_is_reused_within_a_thread(fake_tesserocr):
+    image = np.zeros((20, 30), dtype=np.uint8)
+    backend = ocrbackend.get_backend("tesserocr")
+    assert backend.recognize(image, psm=4) == "RW/U00001/23 psm 4\n"
+    assert backend.recognize_with_confidence(image) == ("RW/U00001/23 psm 6\n", 87.0)
+    assert ocrbackend.get_backend("tesserocr") is backend
+    assert FakeAPI.created[0].image == (600, 30, 20, 1, 30)
+    other = []
+    thread = threading.Thread(target=lambda: other.append(ocrbackend.get_backend("tesserocr")))
+    thread.start()
+    thread.join()
+    assert other[0] is not backend
+    assert len(FakeAPI.created) == 2
+    backend.close()
+    assert FakeAPI.created[0].ended
+
+
+def test_words_to_text_joins_lines_and_averages_confidence():
+    data = {
+        "text": ["", "RW/U00001/23", "WZ", "", "1815"],
+        "conf": [-1, 90, 70, -1, "80"],
+        "page_num": [1, 1, 1, 1, 1],
+        "block_num": [0, 1, 1, 1, 1],
+        "par_num": [0, 1, 1, 1, 1],
+        "line_num": [0, 1, 1, 2, 2],
+    }
+    assert ocrbackend.words_to_text(data) == ("RW/U00001/23 WZ\n1815\n", 80.0)
@@ -0,0 +1,55 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+import ocrcache
+
+
+def test_cache_key_depends_on_image_and_params():
+    key = ocrcache.get_cache_key(b"image", "--psm 6")
+    assert key == ocrcache.get_cache_key(b"image", "--psm 6")
+    assert key != ocrcache.get_cache_key(b"image2", "--psm 6")
+    assert key != ocrcache.get_cache_key(b"image", "--psm 4")
+
+
+def test_get_put_stats(tmp_path):
+    cache = ocrcache.OCRCache(str(tmp_path))
+    key = ocrcache.get_cache_key(b"image", "params")
+    assert cache.get(key) is None
+    cache.put(key, "RW/U00054/22")
+    assert cache.get(key) == "RW/U00054/22"
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.size() == (1, len("RW/U00054/22"))
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = ocrcache.OCRCache(str(tmp_path), max_size_mb=0)
+    cache.max_size = 25
+    for i, key in enumerate(["a" * 64, "b" * 64, "c" * 64]):
+        cache.put(key, "x" * 10)
+        os.utime(cache.get_entry_name(key), (i, i))
+    assert cache.evict() == 1
+    assert cache.get("a" * 64) is None
+    assert cache.get("c" * 64) == "x" * 10
+
+
+def test_entry_evicted_while_read_is_a_miss(tmp_path, monkeypatch):
+    cache = ocrcache.OCRCache(str(tmp_path))
+    key = "a" * 64
+    cache.put(key, "RW/U00054/22")
+
+    def utime_after_eviction(filename):
+        os.remove(filename)
+        raise FileNotFoundError(filename)
+
+    monkeypatch.setattr(ocrcache.os, "utime", utime_after_eviction)
+    assert cache.get(key) is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_threads_put_the_same_key(tmp_path):
+    cache = ocrcache.OCRCache(str(tmp_path))
+    key = "a" * 64
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda i: cache.put(key, f"tekst {i % 2}" * 1000), range(200)))
+    assert cache.get(key) in ("tekst 0" * 1000, "tekst 1" * 1000)
+    assert os.listdir(os.path.dirname(cache.get_entry_name(key))) == [key + ".txt"]
@@ -0,0 +1,112 @@
+from concurrent.futures import ProcessPoolExecutor
+import io
+import os
+import queue
+import threading
+
+from click.testing import CliRunner
+
+import pipeline
+
+
+WZ_DATA = {
+    "001/01/23/6": {"DWS_number": "001/23", "items": [{"index": 2167, "name": "PŁYTA", "quantity": 2}]},
+    "002/01/23/6": {"DWS_number": "002/23", "items": [{"index": 1815, "name": "LATARNIA", "quantity": 4}]},
+}
+
+
+def make_rw(number: str, wz: list, items: list) -> dict:
+    return {"RW_document": number, "DWS_documents": [], "WZ_documents": wz,
+            "items": [{"index": i, "quantity": q} for i, q in items]}
+
+
+def test_matching_group_is_emitted_immediately():
+    output = io.StringIO()
+    checker = pipeline.StreamingChecker(WZ_DATA, output)
+    checker.add_rw(make_rw("RW/U00001/23", ["002/01/23/6"], [(1815, 3)]))
+    assert output.getvalue() == ""
+    checker.add_rw(make_rw("RW/U00002/23", ["001/01/23/6"], [(2167, 2)]))
+    assert output.getvalue().startswith(pipeline.PROVISIONAL_HEADER)
+    assert "RW/U00002/23" in output.getvalue()
+    assert "RÓŻNICA" not in output.getvalue()
+
+
+def test_every_group_has_exactly_one_final_result():
+    output = io.StringIO()
+    checker = pipeline.StreamingChecker(WZ_DATA, output)
+    checker.add_rw(make_rw("RW/U00001/23", ["001/01/23/6"], [(2167, 2)]))
+    checker.add_rw(make_rw("RW/U00002/23", ["001/01/23/6"], [(2167, 1)]))
+    checker.add_rw(make_rw("RW/U00003/23", ["002/01/23/6"], [(1815, 4)]))
+    provisional = output.getvalue()
+    assert provisional.count(pipeline.PROVISIONAL_HEADER) == 2
+    output.seek(0)
+    output.truncate()
+    checker.finish()
+    final = output.getvalue()
+    assert pipeline.PROVISIONAL_HEADER not in final
+    # The grown group supersedes its provisional result, the unchanged one is confirmed.
+    assert final.count("WZ-ty  : ['001/01/23/6']") == 1
+    assert final.count(pipeline.SUPERSEDES_HEADER.format("RW/U00001/23")) == 1
+    assert final.count("RÓŻNICA") == 1
+    assert final.count(pipeline.CONFIRMED_LINE.format("002/01/23/6", "RW/U00003/23")) == 1
+    assert "WZ-ty  : ['002/01/23/6']" not in final
+
+
+def test_rw_without_wz_is_not_grouped():
+    checker = pipeline.StreamingChecker(WZ_DATA, io.StringIO())
+    checker.add_rw(make_rw("RW/U00001/23", [], [(2167, 2)]))
+    assert checker.get_group("RW/U00001/23") is None
+
+
+def test_only_groups_of_processed_scans_are_reported():
+    output = io.StringIO()
+    stored = {"RW/U00001/23": {"DWS_documents": [], "WZ_documents": ["001/01/23/6"], "items": [{"index": 2167, "quantity": 1}]}}
+    checker = pipeline.StreamingChecker(WZ_DATA, output, rw_data=stored)
+    checker.add_rw(make_rw("RW/U00002/23", ["001/01/23/6"], [(2167, 1)]))
+    # The earlier RW completes the group at once.
+    assert output.getvalue().count(pipeline.PROVISIONAL_HEADER) == 1
+    checker.finish()
+    final = output.getvalue()
+    assert pipeline.CONFIRMED_LINE.format("001/01/23/6", "RW/U00001/23, RW/U00002/23") in final
+    assert "002/01/23/6" not in final
+    assert "RÓŻNICA" not in final
+
+
+def recognize_or_crash(filename: str, **kwargs) -> tuple:
+    if "crash" in filename:
+        os._exit(3)
+    return "miss", "RW/U00001/23\nWZ 001/01/23/6\n"
+
+
+def test_broken_pool_stops_the_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pipeline, "recognize_file", recognize_or_crash)
+    os.makedirs("RW_jpeg")
+    for i in range(6):
+        open(f"RW_jpeg/{'crash' if i == 0 else i}.jpg", "w").close()
+    result = CliRunner().invoke(pipeline.main, ["--workers", "1", "--queue-size", "1", "--no-cache"])
+    assert "RW_jpeg/crash.jpg" in result.output
+    assert result.exit_code == 1
+    assert "Przetwarzanie przerwane" in result.output
+
+
+def test_decode_error_ends_both_stages(monkeypatch):
+    def fail_save(filename: str, text: str) -> None:
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pipeline, "save_txt", fail_save)
+    text_queue, rw_queue = queue.Queue(), queue.Queue()
+    slots, stop = threading.Semaphore(1), threading.Event()
+    failed, errors = [], []
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        stages = [
+            threading.Thread(target=pipeline.ocr_stage, args=(["a.jpg", "b.jpg", "c.jpg"], pool, recognize_or_crash, text_queue, slots, stop, errors)),
+            threading.Thread(target=pipeline.decode_stage, args=(text_queue, rw_queue, slots, stop, True, False, failed, errors)),
+        ]
+        for stage in stages:
+            stage.start()
+        assert rw_queue.get(timeout=10) is None
+        for stage in stages:
+            stage.join(timeout=10)
+            assert not stage.is_alive()
+    assert [str(error) for error in errors] == ["disk full"]
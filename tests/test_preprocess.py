@@ -0,0 +1,38 @@
+import struct
+
+import cv2
+import numpy as np
+
+from benchmarks.bench_preprocess import remove_horizontal, thresholding_inv
+import preprocess
+
+
+def make_scan(dpi: int, width=400, height=300) -> bytes:
+    page = np.full((height, width, 3), 255, dtype=np.uint8)
+    cv2.putText(page, "2167 PLYTA 2 SZT", (20, 80), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 0), 2)
+    cv2.line(page, (10, 150), (390, 150), (0, 0, 0), 3)
+    raw = cv2.imencode(".jpg", page)[1].tobytes()
+    return raw[:13] + struct.pack(">BHH", 1, dpi, dpi) + raw[18:]
+
+
+def test_get_jpeg_dpi():
+    assert preprocess.get_jpeg_dpi(make_scan(600)) == 600
+    assert preprocess.get_jpeg_dpi(b"not a jpeg file") == 0
+
+
+def test_decode_grey_normalises_resolution():
+    assert preprocess.decode_grey(make_scan(300)).shape == (300, 400)
+    assert preprocess.decode_grey(make_scan(600)).shape == (150, 200)
+    assert preprocess.decode_grey(make_scan(450)).shape == (200, 267)
+    assert preprocess.decode_grey(make_scan(600), target_dpi=0).shape == (300, 400)
+
+
+def test_prepare_page_matches_legacy_chain():
+    raw = make_scan(300)
+    image = cv2.imdecode(np.frombuffer(raw, dtype=np.uint8), cv2.IMREAD_COLOR)
+    thresh = thresholding_inv(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY))
+    legacy = thresholding_inv(remove_horizontal(thresh, thresh))
+    page, detected_lines = preprocess.prepare_page(preprocess.decode_grey(raw))
+    assert page.shape == legacy.shape
+    assert np.count_nonzero(page != legacy) < 0.01 * page.size
+    assert page[150, 200] == 255
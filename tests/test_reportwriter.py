@@ -0,0 +1,51 @@
+import csv
+import json
+
+from click.testing import CliRunner
+import pytest
+
+import reportwriter
+import rwchecker
+
+
+WZ_DATA = {"001/01/23/6": {"DWS_number": "001/23", "items": [{"index": 2167, "name": "PŁYTA", "quantity": 2}]}}
+RW_DATA = {"RW/U00001/23": {"DWS_documents": [], "WZ_documents": ["001/01/23/6"], "items": [{"index": 2167, "quantity": 1}]}}
+
+
+def write_report(report_format: str, output: str) -> None:
+    writer = reportwriter.open_report_writer(report_format, output)
+    writer.write_group(rwchecker.CompareSet(["001/01/23/6"], ["RW/U00001/23"], WZ_DATA, RW_DATA))
+    writer.close()
+
+
+def test_text_writer_matches_compare(tmp_path):
+    output = tmp_path / "report.txt"
+    write_report("text", str(output))
+    compare_set = rwchecker.CompareSet(["001/01/23/6"], ["RW/U00001/23"], WZ_DATA, RW_DATA)
+    assert output.read_text(encoding="utf-8") == compare_set.compare() + "\n"
+
+
+def test_csv_writer(tmp_path):
+    output = tmp_path / "report.csv"
+    write_report("csv", str(output))
+    with open(output, encoding="utf-8", newline="") as stream:
+        rows = list(csv.reader(stream))
+    assert rows == [reportwriter.COLUMNS, ["001/23", "001/01/23/6", "RW/U00001/23", "RÓŻNICA", "2167", "2", "1", "PŁYTA"]]
+
+
+def test_jsonl_writer(tmp_path):
+    output = tmp_path / "report.jsonl"
+    write_report("jsonl", str(output))
+    [line] = output.read_text(encoding="utf-8").splitlines()
+    group = json.loads(line)
+    assert group["RW_numbers"] == ["RW/U00001/23"]
+    assert group["items"] == [{"status": "RÓŻNICA", "index": 2167, "wz_quantity": 2, "rw_quantity": 1, "name": "PŁYTA"}]
+
+
+@pytest.mark.parametrize("arguments", [["--format", "xlsx"], ["--format", "xlsx", "--output", "wynik.xlsx", "--delta", "-"]])
+def test_xlsx_without_output_file_is_a_usage_error(tmp_path, monkeypatch, arguments):
+    monkeypatch.chdir(tmp_path)
+    result = CliRunner().invoke(rwchecker.main, arguments)
+    assert result.exit_code == 2
+    assert "format xlsx wymaga podania pliku" in result.output
+    assert not (tmp_path / "wynik.xlsx").exists()
@@ -0,0 +1,182 @@
+import random
+
+import pytest
+
+import rwchecker
+
+
+def make_comparator(wz_numbers: list, rw_links: dict) -> rwchecker.RWComparator:
+    comparator = rwchecker.RWComparator([], [])
+    comparator.wz_data = {wz: {"DWS_number": "001/23", "items": []} for wz in wz_numbers}
+    comparator.rw_data = {rw: {"DWS_documents": [], "WZ_documents": wz_list, "items": []} for rw, wz_list in rw_links.items()}
+    return comparator
+
+
+def reference_groups(comparator: rwchecker.RWComparator) -> list:
+    """
+    Grouping done by the previous, recursive implementation of get_dependencies.
+    """
+    comparator.generate_RW_references()
+    comparator.generate_WZ_references()
+
+    def aggregate_indexes(wz_num):
+        result_WZ_list = [wz_num]
+        comparator.wz_references[wz_num]["checked"] = True
+        tmp_RW_set = {rw for rw in comparator.wz_references[wz_num]["items"] if not comparator.rw_references[rw]["checked"]}
+        result_RW_list = list(tmp_RW_set)
+        for rw in tmp_RW_set:
+            comparator.rw_references[rw]["checked"] = True
+            tmp_WZ_set = {wz for wz in comparator.rw_references[rw]["items"] if not comparator.wz_references[wz]["checked"]}
+            for wz in tmp_WZ_set:
+                [wz_res, rw_res] = aggregate_indexes(wz)
+                result_WZ_list.extend(wz_res)
+                result_RW_list.extend(rw_res)
+        return [result_WZ_list, result_RW_list]
+
+    return [aggregate_indexes(wz) for wz in comparator.wz_references if not comparator.wz_references[wz]["checked"]]
+
+
+def as_sets(references: list) -> list:
+    return [(frozenset(wz_list), frozenset(rw_list)) for wz_list, rw_list in references]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_get_dependencies_matches_recursive_grouping(seed):
+    rng = random.Random(seed)
+    wz_numbers = [f"{i:03}/01/23/6" for i in range(60)]
+    rw_links = {f"RW/U{i:05}/23": rng.sample(wz_numbers + ["999/99/29/6"], rng.randint(0, 3)) for i in range(80)}
+    comparator = make_comparator(wz_numbers, rw_links)
+    comparator.get_dependencies()
+    expected = reference_groups(make_comparator(wz_numbers, rw_links))
+    assert as_sets(comparator.references) == as_sets(expected)
+
+
+def test_rw_without_wz_is_not_grouped():
+    comparator = make_comparator(["001/01/23/6"], {"RW/U00001/23": []})
+    comparator.get_dependencies()
+    assert comparator.references == [[["001/01/23/6"], []]]
+
+
+def test_long_chain_does_not_hit_recursion_limit():
+    count = 100_000
+    wz_numbers = [f"WZ{i}" for i in range(count)]
+    rw_links = {f"RW{i}": [wz_numbers[i], wz_numbers[i + 1]] for i in range(count - 1)}
+    comparator = make_comparator(wz_numbers, rw_links)
+    comparator.get_dependencies()
+    assert len(comparator.references) == 1
+    assert len(comparator.references[0][0]) == count
+    assert len(comparator.references[0][1]) == count - 1
+
+
+class CountingDisjointSet(rwchecker.DisjointSet):
+    steps = 0
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            CountingDisjointSet.steps += 1
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+
+def test_get_dependencies_work_grows_near_linearly(monkeypatch):
+    """
+    Counts parent hops of the disjoint set instead of timing it (wall clock ratios are measured by benchmarks/bench_stages.py).
+    """
+    monkeypatch.setattr(rwchecker, "DisjointSet", CountingDisjointSet)
+
+    def run(count):
+        rng = random.Random(count)
+        wz_numbers = [f"WZ{i}" for i in range(count)]
+        rw_links = {f"RW{i}": rng.sample(wz_numbers, 2) for i in range(count)}
+        comparator = make_comparator(wz_numbers, rw_links)
+        CountingDisjointSet.steps = 0
+        comparator.get_dependencies()
+        return CountingDisjointSet.steps
+
+    # 100k WZ and 100k RW documents, five times more than the small run.
+    small = run(20_000)
+    large = run(100_000)
+    assert large < 100_000 * 10
+    assert large / small < 5 * 1.5
+
+
+WZ_DATA = {
+    "001/01/23/6": {"DWS_number": "002/23", "items": [{"index": 2167, "name": "PŁYTA", "quantity": 2},
+                                                       {"index": 1815, "name": "LATARNIA", "quantity": 4}]},
+    "002/01/23/6": {"DWS_number": "001/23", "items": [{"index": 2167, "name": "PŁYTA", "quantity": 1}]},
+}
+RW_DATA = {
+    "RW/U00001/23": {"DWS_documents": [], "WZ_documents": ["001/01/23/6", "002/01/23/6", "003/01/23/6"],
+                     "items": [{"index": 2167, "quantity": 3}, {"index": 2405, "quantity": 1}]},
+}
+
+
+def test_compare_set_rows():
+    compare_set = rwchecker.CompareSet(["002/01/23/6", "001/01/23/6", "003/01/23/6"], ["RW/U00001/23"], WZ_DATA, RW_DATA)
+    assert list(compare_set.rows()) == [
+        ("RÓŻNICA", 1815, 4, 0, "LATARNIA"),
+        ("OK", 2167, 3, 3, "PŁYTA"),
+        ("RÓŻNICA", 2405, 0, 1, ""),
+    ]
+    assert compare_set.wz_dict["WZ_numbers"] == ["001/01/23/6", "002/01/23/6", "Nie znaleziono WZ: 003/01/23/6"]
+    assert not compare_set.is_matching()
+    text = compare_set.compare()
+    assert text.splitlines()[1:4] == [
+        "WZ-ty  : ['001/01/23/6', '002/01/23/6', 'Nie znaleziono WZ: 003/01/23/6']",
+        "DWSygn : ['001/23', '002/23']",
+        "RW     : ['RW/U00001/23']",
+    ]
+    assert "  OK       2167            3           3  PŁYTA\n" in text
+    assert text.endswith("*\n\n")
+
+
+def test_sort_references_matches_sort_compared_list():
+    references = [[["001/01/23/6"], []], [["003/01/23/6"], []], [["002/01/23/6"], ["RW/U00001/23"]]]
+    compared = [rwchecker.CompareSet(wz, rw, WZ_DATA, RW_DATA) for wz, rw in references]
+    expected = [c.wz_dict["WZ_numbers"] for c in rwchecker.sort_compared_list(compared)]
+    result = [sorted(wz) for wz, _ in rwchecker.sort_references(references, WZ_DATA)]
+    assert [[wz.replace("Nie znaleziono WZ: ", "") for wz in group] for group in expected] == result
+
+
+def random_documents(seed: int) -> tuple:
+    rng = random.Random(seed)
+    indexes = [rng.randint(1000, 9999) for _ in range(30)]
+    wz_data = {
+        f"{i:03}/01/23/6": {
+            "DWS_number": f"{rng.randint(1, 50):03}/23",
+            "items": [{"index": index, "name": f"TOWAR {index} {i}", "quantity": rng.randint(0, 5)}
+                      for index in rng.sample(indexes, rng.randint(0, 6))],
+        }
+        for i in range(40)
+    }
+    wz_numbers = list(wz_data) + ["999/99/29/6"]
+    rw_data = {
+        f"RW/U{i:05}/23": {
+            "DWS_documents": [],
+            "WZ_documents": rng.sample(wz_numbers, rng.randint(0, 3)),
+            "items": [{"index": index, "quantity": rng.randint(0, 5)} for index in rng.sample(indexes, rng.randint(0, 6))],
+        }
+        for i in range(50)
+    }
+    return wz_data, rw_data
+
+
+@pytest.mark.parametrize("chunk_size", [0, 1, 7])
+def test_compare_in_pool_keeps_order_and_results(chunk_size):
+    wz_data, rw_data = random_documents(1)
+    comparator = rwchecker.RWComparator([], [])
+    comparator.wz_data, comparator.rw_data = wz_data, rw_data
+    comparator.get_dependencies()
+    references = rwchecker.sort_references(comparator.references, wz_data)
+    expected = [rwchecker.CompareSet(wz_list, rw_list, wz_data, rw_data) for wz_list, rw_list in references]
+    result = list(rwchecker.compare_in_pool(references, wz_data, rw_data, jobs=2, chunk_size=chunk_size))
+    assert [c.wz_dict["WZ_numbers"] for c in result] == [c.wz_dict["WZ_numbers"] for c in expected]
+    assert [list(c.rows()) for c in result] == [list(c.rows()) for c in expected]
+
+
+def test_make_chunk_sends_only_needed_documents():
+    references = [[["001/01/23/6", "003/01/23/6"], []]]
+    _, wz_data, rw_data = rwchecker.make_chunk(references, WZ_DATA, RW_DATA)
+    assert list(wz_data) == ["001/01/23/6"]
+    assert rw_data == {}
@@ -0,0 +1,50 @@
+import random
+
+import pytest
+
+import rwimage2txt
+import synthdata
+
+
+DATASET = synthdata.Dataset(3, seed=5, assortment_size=50)
+GOOD_TEXT = next(DATASET.rw_texts())
+
+
+@pytest.fixture
+def scan_file(tmp_path):
+    filename = str(tmp_path / "Scan_0001.jpg")
+    with open(filename, "wb") as stream:
+        stream.write(synthdata.make_scan(GOOD_TEXT, dpi=150, rng=random.Random(1)))
+    return filename
+
+
+@pytest.fixture
+def full_pages(monkeypatch):
+    pages = []
+
+    def recognize_full(filename, raw, *args):
+        pages.append(filename)
+        return "FULL"
+
+    monkeypatch.setattr(rwimage2txt, "recognize_full", recognize_full)
+    return pages
+
+
+def test_weakness_of_first_tier_text():
+    assert rwimage2txt.get_weakness(GOOD_TEXT, 90) == ""
+    assert rwimage2txt.get_weakness(GOOD_TEXT, 50) == "LOW CONFIDENCE"
+    assert rwimage2txt.get_weakness(GOOD_TEXT.replace("RW/U", "RW U"), 90) == "NO RW"
+    assert rwimage2txt.get_weakness(GOOD_TEXT.replace("INDEKS NAZWA TOWARU ILOŚĆ JM CENA", ""), 90) == "NO ITEMS"
+
+
+def test_good_first_tier_skips_full_ocr(monkeypatch, scan_file, full_pages):
+    monkeypatch.setattr(rwimage2txt, "recognize_fast", lambda grey, backend: (GOOD_TEXT, 91.0))
+    assert rwimage2txt.recognize_file(scan_file, adaptive=True) == ("fast", GOOD_TEXT)
+    assert full_pages == []
+
+
+def test_weak_first_tier_needs_full_ocr(monkeypatch, scan_file, full_pages):
+    monkeypatch.setattr(rwimage2txt, "recognize_fast", lambda grey, backend: (GOOD_TEXT, 40.0))
+    assert rwimage2txt.recognize_file(scan_file, adaptive=True) == ("full", "FULL")
+    assert rwimage2txt.recognize_file(scan_file) == ("miss", "FULL")
+    assert full_pages == [scan_file, scan_file]
@@ -0,0 +1,133 @@
+import os
+import time
+
+from click.testing import CliRunner
+import pytest
+
+import rwimage2txt
+import scheduler
+
+
+def square(item: int) -> int:
+    return item * item
+
+
+def fail_once(item: str) -> str:
+    # The marker file counts attempts across worker processes.
+    if os.path.exists(item):
+        return "ok"
+    open(item, "w").close()
+    raise ValueError("first attempt")
+
+
+def hang_or_crash(item: str) -> str:
+    if item == "hang":
+        time.sleep(60)
+    if item == "crash":
+        os._exit(3)
+    if item == "error":
+        raise ValueError("bad image")
+    return item
+
+
+def recognize_or_crash(filename: str, **kwargs) -> tuple:
+    if "crash" in filename:
+        os._exit(3)
+    return "miss", f"text of {filename}\n"
+
+
+def recognize_or_raise(filename: str, **kwargs) -> tuple:
+    if "bad" in filename:
+        raise RuntimeError("corrupt image")
+    return "miss", f"text of {filename}\n"
+
+
+def recognize_name(filename: str, **kwargs) -> tuple:
+    return "miss", f"text of {filename}\n"
+
+
+def test_all_items_are_finished():
+    results = {item: (ok, result, attempts) for item, ok, result, attempts in scheduler.run_scheduled(range(10), square, workers=2)}
+    assert results == {item: (True, item * item, 1) for item in range(10)}
+
+
+def test_failed_item_is_retried(tmp_path):
+    items = [str(tmp_path / "a"), str(tmp_path / "b")]
+    results = list(scheduler.run_scheduled(items, fail_once, workers=1, backoff=0.01))
+    assert sorted(results) == [(item, True, "ok", 2) for item in items]
+
+
+def test_hung_and_crashed_workers_are_replaced():
+    start = time.monotonic()
+    results = {item: (ok, attempts) for item, ok, _, attempts in scheduler.run_scheduled(
+        ["hang", "crash", "error", "a", "b"], hang_or_crash, workers=2, timeout=0.5, retries=1, backoff=0.01)}
+    assert time.monotonic() - start < 10
+    assert results == {"hang": (False, 2), "crash": (False, 2), "error": (False, 2), "a": (True, 1), "b": (True, 1)}
+
+
+@pytest.mark.parametrize("cut", [True, False])
+def test_journal_resume(tmp_path, cut):
+    filename = str(tmp_path / "journal.jsonl")
+    with scheduler.Journal(filename) as journal:
+        journal.record("a.jpg", "done")
+        journal.record("b.jpg", "failed", error="timeout")
+        journal.record("b.jpg", "done", attempts=2)
+        journal.record("c.jpg", "failed", error="crash")
+    if cut:
+        with open(filename, "a", encoding="utf-8") as stream:
+            stream.write('{"source": "d.jpg", "sta')
+    with scheduler.Journal(filename, resume=True) as journal:
+        assert journal.finished() == {"a.jpg", "b.jpg"}
+        assert journal.failed() == {"c.jpg": "crash"}
+        journal.record("d.jpg", "done")
+        journal.record("c.jpg", "done", attempts=2)
+    with scheduler.Journal(filename, resume=True) as journal:
+        assert journal.finished() == {"a.jpg", "b.jpg", "c.jpg", "d.jpg"}
+        assert journal.failed() == {}
+    with scheduler.Journal(filename) as journal:
+        assert journal.finished() == set()
+
+
+def test_main_lists_failed_images_and_resumes(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rwimage2txt, "recognize_file", recognize_or_crash)
+    os.makedirs("RW_jpeg")
+    for name in ("a", "crash", "b"):
+        open(f"RW_jpeg/{name}.jpg", "w").close()
+    arguments = ["--workers", "2", "--no-cache", "--retries", "1", "--backoff", "0.01"]
+    result = CliRunner().invoke(rwimage2txt.main, arguments)
+    assert result.exit_code == 0, result.output
+    assert sorted(os.listdir("RW_txt")) == ["a.txt", "b.txt"]
+    with open(rwimage2txt.OCR_FAILED_FILE, encoding="utf-8") as stream:
+        assert stream.read().startswith("RW_jpeg/crash.jpg\tproces roboczy")
+    open("RW_jpeg/c.jpg", "w").close()
+    os.remove("RW_txt/a.txt")
+    result = CliRunner().invoke(rwimage2txt.main, arguments + ["--resume"])
+    assert result.exit_code == 0, result.output
+    assert "pominięto 2 obrazów" in result.output
+    assert sorted(os.listdir("RW_txt")) == ["b.txt", "c.txt"]
+    assert "RW_jpeg/crash.jpg" in result.output
+    # A failed image passed by name is retried without losing the journal of the other images.
+    monkeypatch.setattr(rwimage2txt, "recognize_file", recognize_name)
+    result = CliRunner().invoke(rwimage2txt.main, arguments + ["RW_jpeg/crash.jpg"])
+    assert result.exit_code == 0, result.output
+    assert "Nie rozpoznano" not in result.output
+    with scheduler.Journal(rwimage2txt.OCR_JOURNAL_FILE, resume=True) as journal:
+        assert journal.finished() == {f"RW_jpeg/{name}.jpg" for name in ("a", "b", "c", "crash")}
+
+
+def test_main_uses_pool_without_timeout_and_retries(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rwimage2txt, "recognize_file", recognize_or_raise)
+    monkeypatch.setattr(rwimage2txt, "run_scheduled", None)
+    os.makedirs("RW_jpeg")
+    for name in ("a", "bad", "b"):
+        open(f"RW_jpeg/{name}.jpg", "w").close()
+    result = CliRunner().invoke(rwimage2txt.main, ["--workers", "1", "--no-cache"])
+    assert result.exit_code == 0, result.output
+    # An image which raises doesn't stop the batch and is journaled as failed.
+    assert sorted(os.listdir("RW_txt")) == ["a.txt", "b.txt"]
+    with open(rwimage2txt.OCR_FAILED_FILE, encoding="utf-8") as stream:
+        assert stream.read() == "RW_jpeg/bad.jpg\tRuntimeError: corrupt image\n"
+    with scheduler.Journal(rwimage2txt.OCR_JOURNAL_FILE, resume=True) as journal:
+        assert set(journal.failed()) == {"RW_jpeg/bad.jpg"}
@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import os
+import random
+
+from click.testing import CliRunner
+import numpy as np
+import pytest
+
+import rwimage2txt
+import shmpool
+import synthdata
+
+
+def fill(value: int, slot: int, slots: shmpool.PageSlots = None) -> tuple:
+    if slots is None:
+        return np.full((40, 30), value, dtype=np.uint8)
+    slots.arrays(slot, [(40, 30)])[0][...] = value
+    return (40, 30)
+
+
+def total(produced, slot: int, slots: shmpool.PageSlots = None) -> int:
+    if slots is None:
+        return int(produced.sum())
+    if produced == "fail":
+        raise ValueError("fail")
+    return int(slots.arrays(slot, [produced])[0].sum())
+
+
+def fill_or_fail(value: int, slot: int, slots: shmpool.PageSlots = None):
+    return "fail" if value == 3 else fill(value, slot, slots)
+
+
+def crash_on(value: int, produced, slot: int = None):
+    if produced == value:
+        os._exit(3)
+    return produced
+
+
+def count_pixels(page, detected_lines, backend: str = "", roi: str = "off") -> str:
+    return f"{page.shape} {detected_lines is not None}"
+
+
+@pytest.mark.parametrize("use_slots", [True, False])
+def test_pages_are_handed_over_between_processes(use_slots):
+    with shmpool.PageSlots(2, 40 * 30) as slots:
+        slots = slots if use_slots else None
+        with ProcessPoolExecutor(max_workers=2) as producers, ProcessPoolExecutor(max_workers=2) as consumers:
+            results = dict(shmpool.run_handoff(list(range(10)), partial(fill, slots=slots), partial(total, slots=slots),
+                                               producers, consumers, slots))
+    assert results == {value: value * 40 * 30 for value in range(10)}
+
+
+def test_failure_is_yielded_and_slot_released():
+    with shmpool.PageSlots(1, 40 * 30) as slots:
+        with ThreadPoolExecutor(max_workers=2) as producers, ThreadPoolExecutor(max_workers=2) as consumers:
+            results = dict(shmpool.run_handoff(list(range(6)), partial(fill_or_fail, slots=slots), partial(total, slots=slots),
+                                               producers, consumers, slots))
+        assert isinstance(results.pop(3), ValueError)
+        assert results == {value: value * 40 * 30 for value in [0, 1, 2, 4, 5]}
+        assert slots.free == [0]
+
+
+@pytest.mark.parametrize("stage", ["produce", "consume"])
+def test_crashed_worker_fails_the_remaining_items(stage):
+    crash = partial(crash_on, 2)
+    identity = partial(crash_on, None)
+    with ProcessPoolExecutor(max_workers=1) as producers, ProcessPoolExecutor(max_workers=1) as consumers:
+        results = dict(shmpool.run_handoff(list(range(8)), crash if stage == "produce" else identity,
+                                           crash if stage == "consume" else identity, producers, consumers))
+    assert sorted(results) == list(range(8))
+    assert isinstance(results[2], Exception)
+
+
+@pytest.mark.parametrize("slot_count", [2, 0])
+def test_recognize_staged(monkeypatch, tmp_path, slot_count):
+    monkeypatch.setattr(rwimage2txt, "page_to_text", count_pixels)
+    rng = random.Random(0)
+    filenames = []
+    for i, text in enumerate(synthdata.Dataset(3, seed=2, assortment_size=30).rw_texts()):
+        filenames.append(str(tmp_path / f"Scan_{i}.jpg"))
+        with open(filenames[-1], "wb") as stream:
+            stream.write(synthdata.make_scan(text, dpi=100, rng=rng))
+    filenames.append(str(tmp_path / "missing.jpg"))
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        results = dict(rwimage2txt.recognize_staged(filenames, pool, 1, slot_count, target_dpi=0, roi="regions"))
+    assert results.pop(filenames[-1]) == ("error", None)
+    assert set(results.values()) == {("miss", "(1169, 827) True")}
+
+
+def test_slot_size_follows_resolution():
+    assert rwimage2txt.get_slot_mb(300) == 9
+    assert rwimage2txt.get_slot_mb(300, roi="rows") == 18
+    assert rwimage2txt.get_slot_mb(0) == shmpool.DEFAULT_SLOT_MB
+
+
+@pytest.mark.parametrize("free, handoff", [(None, "shm"), (10 * 1024 * 1024, "copy")])
+def test_small_shared_memory_falls_back_to_copy(monkeypatch, tmp_path, free, handoff):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(rwimage2txt, "page_to_text", count_pixels)
+    monkeypatch.setattr(shmpool, "get_shm_free", lambda: free)
+    os.makedirs("RW_jpeg")
+    with open("RW_jpeg/Scan_0.jpg", "wb") as stream:
+        stream.write(synthdata.make_scan("RW/U00001/23\n", dpi=100, rng=random.Random(0)))
+    result = CliRunner().invoke(rwimage2txt.main, ["--workers", "1", "--preprocess-workers", "1", "--no-cache"])
+    assert result.exit_code == 0, result.output
+    assert ("--handoff copy" in result.output) == (handoff == "copy")
+    assert os.listdir("RW_txt") == ["Scan_0.txt"]
@@ -0,0 +1,42 @@
+import decodetxt2rw
+import decodexls2wz
+import preprocess
+import rwchecker
+import synthdata
+
+
+DATASET = synthdata.Dataset(300, seed=3, assortment_size=200)
+
+
+def test_rw_texts_decode_to_rw_documents():
+    for rw, text in zip(DATASET.rw_documents, DATASET.rw_texts()):
+        assert decodetxt2rw.compose_rw(text) == rw
+
+
+def test_dws_book_extracts_to_wz_documents():
+    book = synthdata.make_dws_book(DATASET.wz_documents)
+    assortment = decodexls2wz.get_assortment(synthdata.make_assortment_book(DATASET.assortment))
+    extracted = [wz for name in decodexls2wz.get_dws_sheet_list(book) for wz in decodexls2wz.extract_sheet_wz(assortment, book, name)]
+    assert sorted(extracted, key=lambda wz: wz["WZ_number"]) == sorted(DATASET.wz_documents, key=lambda wz: wz["WZ_number"])
+
+
+def test_documents_form_groups_with_differences():
+    comparator = rwchecker.RWComparator([], [])
+    comparator.wz_data, comparator.rw_data = DATASET.wz_data(), DATASET.rw_data()
+    comparator.get_dependencies()
+    compared = [rwchecker.CompareSet(wz_list, rw_list, comparator.wz_data, comparator.rw_data) for wz_list, rw_list in comparator.references]
+    assert any(len(rw_list) > 1 for _, rw_list in comparator.references)
+    matching = sum(compare_set.is_matching() for compare_set in compared)
+    assert 0 < matching < len(compared)
+
+
+def test_wz_numbers_are_unique_and_valid():
+    numbers = [synthdata.get_wz_number(number) for number in range(1, 200_001)]
+    assert len(set(numbers)) == len(numbers)
+    assert all(decodexls2wz.WZ_NUMBER_REGEX.fullmatch(number) for number in numbers[::997])
+
+
+def test_scan_has_resolution_and_size():
+    raw = synthdata.make_scan(next(DATASET.rw_texts()), dpi=150)
+    assert preprocess.get_jpeg_dpi(raw) == 150
+    assert preprocess.decode_grey(raw, 150).shape == (int(11.69 * 150), int(8.27 * 150))
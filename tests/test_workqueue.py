@@ -0,0 +1,125 @@
+import multiprocessing
+import os
+import time
+
+from click.testing import CliRunner
+
+import decodetxt2rw
+import rwimage2txt
+import workqueue
+
+
+def take_all(filename: str, names: list, connection) -> None:
+    with workqueue.WorkQueue(filename, "ocr") as queue:
+        queue.add(names)
+        taken = []
+        for batch in queue.batches(3):
+            for name in batch:
+                time.sleep(0.001)
+                assert queue.record(name, "done")
+                taken.append(name)
+    connection.send(taken)
+
+
+def recognize_name(filename: str, **kwargs) -> tuple:
+    return "miss", f"text of {filename}\n"
+
+
+def run_ocr(directory: str) -> None:
+    os.chdir(directory)
+    result = CliRunner().invoke(rwimage2txt.main, ["--queue", "--workers", "1", "--batch", "2", "--no-cache"])
+    os._exit(result.exit_code)
+
+
+def test_processes_split_the_queue(tmp_path):
+    filename = str(tmp_path / "queue.sqlite")
+    names = [f"RW_jpeg/Scan_{i:03}.jpg" for i in range(60)]
+    context = multiprocessing.get_context("fork")
+    pipes, processes = [], []
+    for _ in range(4):
+        receiver, sender = context.Pipe(duplex=False)
+        processes.append(context.Process(target=take_all, args=(filename, names, sender)))
+        processes[-1].start()
+        pipes.append(receiver)
+    taken = [receiver.recv() for receiver in pipes]
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert sorted(name for names_taken in taken for name in names_taken) == names
+    with workqueue.WorkQueue(filename) as queue:
+        assert workqueue.get_depth(queue.connection) == {"ocr": {"pending": 0, "leased": 0, "done": 60, "failed": 0}}
+        throughput = workqueue.get_throughput(queue.connection)
+        assert sum(item["done"] for item in throughput) == 60
+        assert "GOTOWE" in workqueue.print_status(queue.connection)
+
+
+def test_expired_lease_is_taken_over(tmp_path, monkeypatch):
+    filename = str(tmp_path / "queue.sqlite")
+    monkeypatch.setattr(workqueue, "MAX_ATTEMPTS", 2)
+    with workqueue.WorkQueue(filename, worker="a", lease=0.05) as first, workqueue.WorkQueue(filename, worker="b", lease=0.05) as second:
+        first.add(["x.jpg", "y.jpg"])
+        assert first.claim(1) == ["x.jpg"]
+        assert second.claim(1) == ["y.jpg"]
+        assert second.record("y.jpg", "done")
+        time.sleep(0.1)
+        assert second.claim(5) == ["x.jpg"]
+        assert not first.record("x.jpg", "done")
+        time.sleep(0.1)
+        assert first.claim(5) == []
+        assert second.failed() == {"x.jpg": "przekroczono czas dzierżawy"}
+
+
+def test_ocr_workers_share_the_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr(rwimage2txt, "recognize_file", recognize_name)
+    os.makedirs(tmp_path / "RW_jpeg")
+    for i in range(12):
+        open(tmp_path / "RW_jpeg" / f"Scan_{i:02}.jpg", "w").close()
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_ocr, args=(str(tmp_path),)) for _ in range(3)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    assert len(os.listdir(tmp_path / "RW_txt")) == 12
+    with workqueue.WorkQueue(str(tmp_path / workqueue.DEFAULT_QUEUE_FILE)) as queue:
+        assert workqueue.get_depth(queue.connection)["ocr"]["done"] == 12
+
+
+def write_text(filename: str, rw_number: str) -> None:
+    with open(filename, "w", encoding="utf-8") as stream:
+        stream.write(f"{rw_number}\nDWS 123/24\nWZ 123/45/24/6\n")
+
+
+def test_decode_with_queue(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("RW_txt")
+    write_text("RW_txt/Scan_01.txt", "RW/U123/24")
+    result = CliRunner().invoke(decodetxt2rw.main, ["--queue", "--report"])
+    assert result.exit_code == 0, result.output
+    assert os.listdir("RW_json") == ["RW_U123_24.json"]
+    assert not os.path.exists(decodetxt2rw.MANIFEST_FILE)
+    result = CliRunner().invoke(decodetxt2rw.main, ["--queue", "--report"])
+    assert "dodano 0 z 1 plików" in result.output
+    assert "Razem dokumentów RW: 0" in result.output
+    result = CliRunner().invoke(decodetxt2rw.main, ["--queue", "--report", "--force"])
+    assert "dodano 1 z 1 plików" in result.output
+    result = CliRunner().invoke(workqueue.main, [])
+    assert "decode" in result.output
+
+
+def test_changed_and_vanished_sources_are_queued_again(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("RW_txt")
+    write_text("RW_txt/Scan_01.txt", "RW/U123/24")
+    write_text("RW_txt/Scan_02.txt", "RW/U200/24")
+    CliRunner().invoke(decodetxt2rw.main, ["--queue"])
+    assert sorted(os.listdir("RW_json")) == ["RW_U123_24.json", "RW_U200_24.json"]
+    # Re-OCRed text with another RW number: the stale document is removed.
+    write_text("RW_txt/Scan_01.txt", "RW/U124/24")
+    os.utime("RW_txt/Scan_01.txt", ns=(1, 1))
+    os.remove("RW_txt/Scan_02.txt")
+    result = CliRunner().invoke(decodetxt2rw.main, ["--queue", "--report"])
+    assert result.exit_code == 0, result.output
+    assert "dodano 1 z 1 plików" in result.output
+    assert os.listdir("RW_json") == ["RW_U124_24.json"]
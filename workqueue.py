@@ -0,0 +1,268 @@
+import os
+import socket
+import sqlite3
+import time
+
+import click
+
+from globals import RW_TEMP_FOLDER
+
+
+DEFAULT_QUEUE_FILE = os.path.join(RW_TEMP_FOLDER, "work_queue.sqlite")
+DEFAULT_LEASE = 600
+DEFAULT_BATCH = 8
+# A task whose lease expired this many times (its workers died or hung) is failed instead of handed out again.
+MAX_ATTEMPTS = 3
+LOCK_TIMEOUT = 60
+
+QUEUE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS task (
+    queue TEXT NOT NULL,
+    name TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    claimed REAL,
+    lease_until REAL,
+    finished REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    version TEXT,
+    output TEXT,
+    PRIMARY KEY (queue, name)
+);
+CREATE INDEX IF NOT EXISTS task_state ON task (queue, state, lease_until);
+"""
+
+
+def get_worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def get_file_version(filename: str) -> str:
+    """
+    Version of a source file from its mtime and size; a changed file is queued again.
+    """
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+class WorkQueue():
+    """
+    Shared queue of tasks (source file names) in a SQLite file, e.g. on a share mounted by several hosts.
+    Every claim is a transaction under the lock of the database file, so any number of workers can take
+    batches of tasks at once; a claimed task is leased for lease seconds and handed out again when its
+    worker didn't finish it in time. Finished tasks are recorded like in scheduler.Journal, together
+    with the version of the source they were made from and the document they produced.
+    """
+
+    def __init__(self, filename: str = DEFAULT_QUEUE_FILE, queue: str = "ocr", worker: str = None, lease: float = DEFAULT_LEASE) -> None:
+        self.filename = filename
+        self.queue = queue
+        self.worker = worker or get_worker_name()
+        self.lease = lease
+        os.makedirs(os.path.dirname(filename) or ".", exist_ok=True)
+        # Rollback journal (not WAL): WAL needs memory shared by all processes, so it doesn't work on network shares.
+        self.connection = sqlite3.connect(filename, timeout=LOCK_TIMEOUT, isolation_level=None)
+        self.connection.executescript(QUEUE_SCHEMA)
+
+
+    def __enter__(self) -> "WorkQueue":
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+    def transaction(self) -> sqlite3.Connection:
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self.connection
+
+
+    def commit(self) -> None:
+        self.connection.execute("COMMIT")
+
+
+    def add(self, names: list, versions: list = None, force: bool = False) -> int:
+        """
+        Adds tasks not yet in the queue, so every worker may add the whole folder, and queues again
+        tasks whose source version changed (all tasks with force). Versions default to mtime and size
+        of the files. Returns the number of new and queued again tasks.
+        """
+        if versions is None:
+            versions = [get_file_version(name) for name in names]
+        connection = self.transaction()
+        before = connection.total_changes
+        connection.executemany(
+            "INSERT INTO task (queue, name, version) VALUES (?, ?, ?) "
+            "ON CONFLICT (queue, name) DO UPDATE SET state = 'pending', version = excluded.version, worker = NULL, "
+            "lease_until = NULL, attempts = 0, error = NULL WHERE ? OR task.version IS NOT excluded.version",
+            [(self.queue, name, version, force) for name, version in zip(names, versions)])
+        self.commit()
+        return connection.total_changes - before
+
+
+    def claim(self, count: int = DEFAULT_BATCH) -> list:
+        now = time.time()
+        connection = self.transaction()
+        connection.execute(
+            "UPDATE task SET state = 'failed', error = 'przekroczono czas dzierżawy', finished = ? "
+            "WHERE queue = ? AND state = 'leased' AND lease_until < ? AND attempts >= ?",
+            (now, self.queue, now, MAX_ATTEMPTS))
+        names = [row[0] for row in connection.execute(
+            "SELECT name FROM task WHERE queue = ? AND (state = 'pending' OR (state = 'leased' AND lease_until < ?)) "
+            "ORDER BY name LIMIT ?", (self.queue, now, count))]
+        connection.executemany(
+            "UPDATE task SET state = 'leased', worker = ?, claimed = ?, lease_until = ?, attempts = attempts + 1 "
+            "WHERE queue = ? AND name = ?", [(self.worker, now, now + self.lease, self.queue, name) for name in names])
+        self.commit()
+        return names
+
+
+    def batches(self, count: int = DEFAULT_BATCH):
+        """
+        Claims batches of tasks until the queue has no tasks left to hand out.
+        """
+        while True:
+            names = self.claim(count)
+            if not names:
+                return
+            yield names
+
+
+    def record(self, source: str, status: str, attempts: int = 1, error: str = None, output: str = None) -> bool:
+        """
+        Marks a task claimed by this worker done or failed. Returns False when the lease expired
+        and the task was claimed by another worker (or queued again) in the meantime.
+        """
+        cursor = self.connection.execute(
+            "UPDATE task SET state = ?, error = ?, output = ?, finished = ? WHERE queue = ? AND name = ? AND worker = ? AND state = 'leased'",
+            (status, error, output, time.time(), self.queue, source, self.worker))
+        return cursor.rowcount > 0
+
+
+    def get_output(self, source: str) -> str:
+        row = self.connection.execute("SELECT output FROM task WHERE queue = ? AND name = ?", (self.queue, source)).fetchone()
+        return row[0] if row else None
+
+
+    def is_output_used(self, output: str, source: str = None) -> bool:
+        """
+        True when a task other than source produced output.
+        """
+        return self.connection.execute(
+            "SELECT 1 FROM task WHERE queue = ? AND output = ? AND name IS NOT ?", (self.queue, output, source)).fetchone() is not None
+
+
+    def remove_vanished(self, current_sources: list) -> list:
+        """
+        Removes tasks whose source is gone, returning (source, output) of every removed task.
+        """
+        current = set(current_sources)
+        connection = self.transaction()
+        vanished = [(name, output) for name, output in connection.execute("SELECT name, output FROM task WHERE queue = ?", (self.queue,))
+                    if name not in current]
+        connection.executemany("DELETE FROM task WHERE queue = ? AND name = ?", [(self.queue, name) for name, _ in vanished])
+        self.commit()
+        return vanished
+
+
+    def failed(self) -> dict:
+        """
+        Tasks failed by this worker.
+        """
+        return dict(self.connection.execute(
+            "SELECT name, error FROM task WHERE queue = ? AND worker = ? AND state = 'failed'", (self.queue, self.worker)))
+
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_depth(connection: sqlite3.Connection) -> dict:
+    """
+    Number of tasks in every state, per queue.
+    """
+    depth = {}
+    for queue, state, count in connection.execute("SELECT queue, state, COUNT(*) FROM task GROUP BY queue, state"):
+        depth.setdefault(queue, {"pending": 0, "leased": 0, "done": 0, "failed": 0})[state] = count
+    return depth
+
+
+def get_throughput(connection: sqlite3.Connection) -> list:
+    """
+    Per worker and queue: done, failed and leased tasks, tasks per minute from its first claim
+    to its last finished task and seconds since that task.
+    """
+    now = time.time()
+    rows = connection.execute(
+        "SELECT worker, queue, SUM(state = 'done'), SUM(state = 'failed'), SUM(state = 'leased'), MIN(claimed), MAX(finished) "
+        "FROM task WHERE worker IS NOT NULL GROUP BY worker, queue ORDER BY queue, worker")
+    throughput = []
+    for worker, queue, done, failed, leased, first, last in rows:
+        span = (last - first) if last is not None and first is not None else 0
+        throughput.append({
+            "worker": worker,
+            "queue": queue,
+            "done": done,
+            "failed": failed,
+            "leased": leased,
+            "per_minute": done / span * 60 if span > 0 else 0.0,
+            "idle_seconds": now - last if last is not None else None,
+        })
+    return throughput
+
+
+def print_status(connection: sqlite3.Connection) -> str:
+    output = "KOLEJKA       OCZEKUJE  W TOKU  GOTOWE  BŁĘDY\n"
+    for queue, depth in sorted(get_depth(connection).items()):
+        output += f"{queue:12} {depth['pending']:>9} {depth['leased']:>7} {depth['done']:>7} {depth['failed']:>6}\n"
+    output += "\nPROCES                          KOLEJKA       GOTOWE  BŁĘDY  W TOKU  NA MINUTĘ  OSTATNIE [s]\n"
+    for item in get_throughput(connection):
+        idle = f"{item['idle_seconds']:.0f}" if item["idle_seconds"] is not None else "-"
+        output += (f"{item['worker']:30}  {item['queue']:12} {item['done']:>7} {item['failed']:>6} {item['leased']:>7} "
+                   f"{item['per_minute']:>10.1f} {idle:>13}\n")
+    return output
+
+
+@click.command()
+@click.option("--queue-file", show_default=True, default=DEFAULT_QUEUE_FILE, help="Plik SQLite wspólnej kolejki zadań.")
+@click.option("--watch", type=click.FloatRange(min=0), show_default=True, default=0, help="Odświeża stan co podaną liczbę sekund (0 - jednorazowo).")
+@click.option("--requeue-failed", is_flag=True, show_default=True, default=False, help="Przywraca zadania zakończone błędem do kolejki.")
+@click.option("--clear", "clear_queue", default=None, help="Usuwa wszystkie zadania podanej kolejki (ocr lub decode), np. przed ponownym przetworzeniem katalogu.")
+def main(queue_file: str, watch: float, requeue_failed: bool, clear_queue: str):
+    """
+    Program pokazuje stan wspólnej kolejki zadań, z której pobierają pliki procesy rwimage2txt.py --queue
+    i decodetxt2rw.py --queue, uruchomione na jednym lub wielu komputerach: liczbę zadań oczekujących, w toku,
+    gotowych i zakończonych błędem oraz wydajność każdego procesu.\n
+    Przykład:\n
+    >python workqueue.py       <- wyświetla stan kolejki.\n
+    >python workqueue.py --watch 10       <- odświeża stan co 10 s.\n
+    >python workqueue.py --requeue-failed       <- ponownie kolejkuje zadania zakończone błędem.\n
+    >python workqueue.py --clear ocr       <- usuwa zadania OCR.\n
+    v1.0.0
+    """
+    if not os.path.exists(queue_file):
+        print(f"Kolejka {queue_file} nie istnieje.")
+        return
+    connection = sqlite3.connect(queue_file, timeout=LOCK_TIMEOUT, isolation_level=None)
+    connection.executescript(QUEUE_SCHEMA)
+    if requeue_failed:
+        count = connection.execute("UPDATE task SET state = 'pending', worker = NULL, attempts = 0, error = NULL WHERE state = 'failed'").rowcount
+        print(f"Ponownie zakolejkowano {count} zadań.")
+    if clear_queue is not None:
+        count = connection.execute("DELETE FROM task WHERE queue = ?", (clear_queue,)).rowcount
+        print(f"Usunięto {count} zadań kolejki {clear_queue}.")
+    while True:
+        print(print_status(connection))
+        if not watch:
+            break
+        time.sleep(watch)
+    connection.close()
+
+
+if __name__ == "__main__":
+    main()